@@ -0,0 +1,76 @@
+# benchmarks/_harness.py
+"""
+Shared setup for the in-process benchmarks.
+
+install_memory_db() registers a `models.database` module whose pred_col /
+household_col are services.memory_store.InMemoryCollection instances. It must
+be called before anything imports the routes or main.
+"""
+import os
+import sys
+import types
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+
+def install_memory_db():
+    """Replace models.database with in-memory collections; returns the stand-in module."""
+    from services.memory_store import InMemoryCollection
+
+    existing = sys.modules.get("models.database")
+    if existing is not None and isinstance(getattr(existing, "pred_col", None), InMemoryCollection):
+        return existing
+
+    db = types.ModuleType("models.database")
+    db.pred_col = InMemoryCollection("predictions")
+    db.household_col = InMemoryCollection("household")
+    if "models" not in sys.modules:
+        pkg = types.ModuleType("models")
+        pkg.__path__ = []
+        sys.modules["models"] = pkg
+    sys.modules["models"].database = db
+    sys.modules["models.database"] = db
+    return db
+
+
+def make_rows(n: int, houses: int = 500, days: int = 30, seed: int = 0):
+    """Synthetic daily smart-meter readings shaped like HouseholdIn payloads."""
+    import random
+
+    rnd = random.Random(seed)
+    appliances = ["Fan", "Refrigerator", "AirConditioner", "Television", "Monitor", "MotorPump"]
+    rows = []
+    for i in range(n):
+        usage = {a: round(rnd.uniform(0, 12), 2) for a in rnd.sample(appliances, rnd.randint(2, 6))}
+        rows.append({
+            "house_id": f"house_{i % houses}",
+            "date": f"2024-{(i // houses // 28) % 12 + 1:02d}-{(i // houses) % 28 + 1:02d}",
+            "appliance_usage": usage,
+            "total_consumption_kwh": round(sum(usage.values()) * rnd.uniform(0.8, 1.2), 3),
+        })
+    return rows
+
+
+def install_synthetic_models(model_dir: str, n_rows: int = 3000, n_features: int = 12):
+    """
+    Train small linear / RF / XGBoost stand-ins (see bench_compiled_engine.synthetic_artifacts)
+    and write them, the scaler and a feature_order.json into `model_dir` under the
+    MODEL_REGISTRY filenames. Returns the feature names.
+    """
+    import json
+    import joblib
+
+    from bench_compiled_engine import synthetic_artifacts
+    from services.ai_service import MODEL_REGISTRY
+
+    os.makedirs(model_dir, exist_ok=True)
+    models, scaler, _ = synthetic_artifacts(n_rows, n_features)
+    for key, model in models.items():
+        joblib.dump(model, os.path.join(model_dir, MODEL_REGISTRY[key]["file"]))
+    joblib.dump(scaler, os.path.join(model_dir, "scaler.pkl"))
+    names = [f"f{i}" for i in range(n_features)]
+    with open(os.path.join(model_dir, "feature_order.json"), "w") as fh:
+        json.dump({"feature_order": names}, fh)
+    return names
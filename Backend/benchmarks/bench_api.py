@@ -0,0 +1,239 @@
+# benchmarks/bench_api.py
+"""
+Load / latency benchmark for the FastAPI app, driven in-process through an ASGI
+client (httpx.ASGITransport) with the Mongo collections replaced by in-memory
+stand-ins (see _harness.install_memory_db).
+
+Scenarios:
+  predict_<model>   POST /predict/ for every available model (distinct vectors, so no cache hits;
+                    every concurrency level gets new ones)
+  history           GET /predict/history?limit=50 over a seeded prediction collection
+  household_insert  POST /household/
+  solar             POST /api/solar/
+
+Every scenario runs at each --concurrency level: that many client tasks share
+--requests requests. Throughput, mean / p50 / p95 / p99 / max latency and the
+error count are printed and written to --json, together with the git commit, so
+runs from different commits can be compared with --compare:
+
+    python benchmarks/bench_api.py --json base.json
+    git checkout other-branch
+    python benchmarks/bench_api.py --json new.json --compare base.json --threshold 10
+
+--compare exits with status 1 when a scenario's p95 latency or throughput is more
+than --threshold percent worse than in the baseline file.
+
+Without --model-dir, small synthetic models are trained into a temporary directory.
+
+Run from Backend/:
+    python benchmarks/bench_api.py --requests 2000 --concurrency 1,8,32
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from _harness import BACKEND_DIR, install_memory_db, make_rows  # noqa: E402
+
+ALL_SCENARIOS = ["predict", "history", "household_insert", "solar"]
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+
+def seed_predictions(pred_col, n: int, models, width: int):
+    rng = np.random.default_rng(1)
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc).timestamp()
+    docs = [{
+        "house_id": f"house_{i % 500}",
+        "model": models[i % len(models)],
+        "predicted_value_kwh": float(v),
+        "features": rng.normal(size=width).round(4).tolist(),
+        "meta": {},
+        "timestamp": datetime.fromtimestamp(start + i * 60, tz=timezone.utc).replace(tzinfo=None).isoformat(),
+    } for i, v in enumerate(rng.uniform(50, 500, size=n))]
+    pred_col.insert_many(docs)
+
+
+def build_requests(scenario: str, n: int, width: int, model=None, seed: int = 0):
+    """(method, url, json body or None) for each request of a scenario; another `seed` gives other vectors."""
+    rng = np.random.default_rng(seed)
+    if scenario == "predict":
+        vectors = rng.normal(size=(n, width)).round(6).tolist()
+        return [("POST", "/predict/", {"house_id": f"bench_{i % 500}", "model": model, "features": v})
+                for i, v in enumerate(vectors)]
+    if scenario == "history":
+        return [("GET", "/predict/history?limit=50", None)] * n
+    if scenario == "household_insert":
+        return [("POST", "/household/", r) for r in make_rows(n)]
+    if scenario == "solar":
+        return [("POST", "/api/solar/", {"daily_kwh": float(d), "sun_hours": float(s), "panel_watt": float(w)})
+                for d, s, w in zip(rng.uniform(5, 40, n), rng.uniform(3, 7, n), rng.choice([330, 400, 450, 550], n))]
+    raise ValueError(scenario)
+
+
+async def run_load(client, requests, concurrency: int):
+    """Send `requests` from `concurrency` tasks; returns (latencies in seconds, errors, wall seconds)."""
+    latencies = np.empty(len(requests))
+    errors = []
+    position = 0
+
+    async def worker():
+        nonlocal position
+        while position < len(requests):
+            i = position
+            position += 1
+            method, url, body = requests[i]
+            t0 = time.perf_counter()
+            resp = await client.request(method, url, json=body)
+            latencies[i] = time.perf_counter() - t0
+            if resp.status_code >= 400:
+                errors.append(f"{resp.status_code} {url}: {resp.text[:200]}")
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, errors, time.perf_counter() - t0
+
+
+def summarize(name: str, concurrency: int, latencies, errors, wall: float) -> dict:
+    ms = latencies * 1000.0
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {
+        "scenario": name, "concurrency": concurrency, "requests": len(latencies), "errors": len(errors),
+        "seconds": round(wall, 3), "rps": round(len(latencies) / wall, 1),
+        "mean_ms": round(float(ms.mean()), 3), "p50_ms": round(float(p50), 3), "p95_ms": round(float(p95), 3),
+        "p99_ms": round(float(p99), 3), "max_ms": round(float(ms.max()), 3),
+        "first_error": errors[0] if errors else None,
+    }
+
+
+async def run_all(args, db, width: int):
+    import httpx
+    import main as app_main
+    import services.ai_service as ai_service
+
+    results = []
+    async with app_main.lifespan(app_main.app):
+        models = sorted(ai_service.available_models())
+        if "predict" in args.scenarios and not models:
+            raise SystemExit(f"No models found in MODEL_DIR={ai_service.MODEL_DIR}")
+        if "history" in args.scenarios:
+            seed_predictions(db.pred_col, args.seed_history, models or ["xgb"], width)
+
+        plan = []
+        for scenario in args.scenarios:
+            if scenario == "predict":
+                plan.extend((f"predict_{m}", "predict", m) for m in models)
+            else:
+                plan.append((scenario, scenario, None))
+
+        transport = httpx.ASGITransport(app=app_main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for name, scenario, model in plan:
+                warmup = build_requests(scenario, args.warmup, width, model, seed=0)
+                await run_load(client, warmup, min(4, max(args.concurrency)))
+                for level, concurrency in enumerate(args.concurrency, start=1):
+                    # fresh vectors per level: reusing them would serve later levels from the prediction cache
+                    requests = build_requests(scenario, args.requests, width, model, seed=level)
+                    latencies, errors, wall = await run_load(client, requests, concurrency)
+                    row = summarize(name, concurrency, latencies, errors, wall)
+                    results.append(row)
+                    print(f"{name:<18}{concurrency:>5}{row['rps']:>10.1f}{row['p50_ms']:>10.2f}{row['p95_ms']:>10.2f}"
+                          f"{row['p99_ms']:>10.2f}{row['errors']:>8}")
+    return results
+
+
+def compare(results, baseline_path: str, threshold: float) -> int:
+    with open(baseline_path) as fh:
+        baseline = {(r["scenario"], r["concurrency"]): r for r in json.load(fh)["results"]}
+    regressions = 0
+    print(f"\nvs {baseline_path} (threshold {threshold:.0f}%)")
+    print(f"{'scenario':<18}{'conc':>5}{'rps Δ%':>10}{'p95 Δ%':>10}")
+    for r in results:
+        base = baseline.get((r["scenario"], r["concurrency"]))
+        if base is None:
+            continue
+        rps_delta = (r["rps"] - base["rps"]) / base["rps"] * 100.0
+        p95_delta = (r["p95_ms"] - base["p95_ms"]) / base["p95_ms"] * 100.0 if base["p95_ms"] else 0.0
+        bad = rps_delta < -threshold or p95_delta > threshold
+        regressions += bad
+        print(f"{r['scenario']:<18}{r['concurrency']:>5}{rps_delta:>+10.1f}{p95_delta:>+10.1f}"
+              + ("  REGRESSION" if bad else ""))
+    return 1 if regressions else 0
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--requests", type=int, default=1000, help="requests per scenario and concurrency level")
+    ap.add_argument("--concurrency", default="1,8,32", help="comma-separated concurrency levels")
+    ap.add_argument("--scenarios", default=",".join(ALL_SCENARIOS), help=f"subset of {ALL_SCENARIOS}")
+    ap.add_argument("--warmup", type=int, default=20, help="untimed requests before each scenario")
+    ap.add_argument("--seed-history", type=int, default=20000, help="prediction records inserted before history runs")
+    ap.add_argument("--model-dir", help="real model artifacts; default trains synthetic ones")
+    ap.add_argument("--json", dest="json_path")
+    ap.add_argument("--compare", help="baseline JSON from an earlier run")
+    ap.add_argument("--threshold", type=float, default=10.0, help="allowed regression in percent for --compare")
+    args = ap.parse_args()
+    args.concurrency = [int(c) for c in args.concurrency.split(",") if c]
+    args.scenarios = [s for s in args.scenarios.split(",") if s]
+    unknown = set(args.scenarios) - set(ALL_SCENARIOS)
+    if unknown:
+        ap.error(f"unknown scenarios {sorted(unknown)}")
+
+    os.environ.setdefault("ENSURE_INDEXES", "0")
+    os.environ.setdefault("ROLLUP_SNAPSHOT_PATH", "")
+    os.environ.setdefault("PRELOAD_MODELS", "1")
+    tmp = None
+    if args.model_dir:
+        os.environ["MODEL_DIR"] = args.model_dir
+    else:
+        tmp = tempfile.TemporaryDirectory(prefix="bench_api_models_")
+        os.environ["MODEL_DIR"] = tmp.name
+    db = install_memory_db()
+    if tmp is not None:
+        from _harness import install_synthetic_models
+        install_synthetic_models(tmp.name)
+
+    import services.ai_service as ai_service
+    width = len(ai_service.get_feature_order() or []) or 12
+
+    print(f"{'scenario':<18}{'conc':>5}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    results = asyncio.run(run_all(args, db, width))
+
+    report = {
+        "meta": {
+            "commit": git_commit(), "created_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count(),
+            "requests": args.requests, "concurrency": args.concurrency, "model_dir": args.model_dir or "synthetic",
+            "env": {k: os.environ[k] for k in sorted(os.environ)
+                    if k.startswith(("PREDICT_", "PERSIST_", "INFERENCE_", "MODEL_", "PREDICTION_CACHE", "METRICS_"))},
+        },
+        "results": results,
+    }
+    if args.json_path:
+        with open(args.json_path, "w") as fh:
+            json.dump(report, fh, indent=2)
+        print("Saved results to", args.json_path)
+    if tmp is not None:
+        tmp.cleanup()
+    if args.compare:
+        sys.exit(compare(results, args.compare, args.threshold))
+
+
+if __name__ == "__main__":
+    main()
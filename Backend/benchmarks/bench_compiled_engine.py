@@ -0,0 +1,133 @@
+# benchmarks/bench_compiled_engine.py
+"""
+Accuracy and latency comparison: sklearn/xgboost `predict` vs services.tree_engine.
+
+For every model it checks that the compiled engine reproduces the library output
+(max absolute / relative difference) and times both paths at several batch sizes.
+The library path includes scaler.transform, exactly like ai_service's sklearn backend.
+
+Run from Backend/:
+    python benchmarks/bench_compiled_engine.py --model-dir data
+    python benchmarks/bench_compiled_engine.py --synthetic --rows 20000 --json engine.json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.tree_engine import compile_model  # noqa: E402
+
+
+def load_artifacts(model_dir: str):
+    import joblib
+    from services.ai_service import MODEL_REGISTRY
+
+    scaler_path = os.path.join(model_dir, "scaler.pkl")
+    scaler = joblib.load(scaler_path) if os.path.exists(scaler_path) else None
+    models = {}
+    for key, entry in MODEL_REGISTRY.items():
+        path = os.path.join(model_dir, entry["file"])
+        if os.path.exists(path):
+            models[key] = joblib.load(path)
+    return models, scaler
+
+
+def synthetic_artifacts(n_rows: int, n_features: int = 12, seed: int = 42):
+    """Small stand-ins trained like train_with_noise_and_save.py, for machines without the real data."""
+    from sklearn.ensemble import RandomForestRegressor
+    from sklearn.linear_model import LinearRegression
+    from sklearn.preprocessing import StandardScaler
+    from xgboost import XGBRegressor
+
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(n_rows, n_features)) * rng.uniform(1, 100, size=n_features)
+    y = X @ rng.normal(size=n_features) + 10 * np.sin(X[:, 0]) + rng.normal(scale=5.0, size=n_rows)
+    scaler = StandardScaler().fit(X)
+    Xs = scaler.transform(X)
+    models = {
+        "linear": LinearRegression().fit(Xs, y),
+        "rf": RandomForestRegressor(n_estimators=200, random_state=seed, n_jobs=-1).fit(Xs, y),
+        "xgb": XGBRegressor(n_estimators=300, learning_rate=0.05, random_state=seed, verbosity=0, n_jobs=-1).fit(Xs, y),
+    }
+    return models, scaler, X
+
+
+def time_call(fn, X, repeats: int) -> float:
+    fn(X)  # warm-up
+    best = float("inf")
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn(X)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--model-dir", default=os.getenv("MODEL_DIR", "data"))
+    ap.add_argument("--synthetic", action="store_true", help="train small synthetic models instead of loading MODEL_DIR")
+    ap.add_argument("--rows", type=int, default=10000, help="rows used for the accuracy check / synthetic training")
+    ap.add_argument("--batch-sizes", default="1,16,256,4096")
+    ap.add_argument("--repeats", type=int, default=20)
+    ap.add_argument("--json", dest="json_path")
+    args = ap.parse_args()
+
+    if args.synthetic:
+        models, scaler, X = synthetic_artifacts(args.rows)
+    else:
+        models, scaler = load_artifacts(args.model_dir)
+        if not models:
+            raise SystemExit(f"No models found in {args.model_dir} (use --synthetic)")
+        n_features = int(getattr(scaler, "n_features_in_", 0) or next(iter(models.values())).n_features_in_)
+        mean = getattr(scaler, "mean_", np.zeros(n_features))
+        scale = getattr(scaler, "scale_", np.ones(n_features))
+        X = np.random.default_rng(0).normal(size=(args.rows, n_features)) * scale + mean
+
+    batch_sizes = [int(b) for b in args.batch_sizes.split(",")]
+    results = []
+    for key, model in models.items():
+        engine = compile_model(model, scaler)
+
+        def library(batch, model=model):
+            return model.predict(scaler.transform(batch) if scaler is not None else batch)
+
+        ref = np.asarray(library(X), dtype=np.float64).ravel()
+        got = engine.predict(X)
+        abs_diff = np.abs(ref - got)
+        row = {
+            "model": key,
+            "max_abs_diff": float(abs_diff.max()),
+            "max_rel_diff": float((abs_diff / np.maximum(np.abs(ref), 1e-9)).max()),
+            "latency": [],
+        }
+        for bs in batch_sizes:
+            batch = X[:bs]
+            lib_s = time_call(library, batch, args.repeats)
+            eng_s = time_call(engine.predict, batch, args.repeats)
+            row["latency"].append({
+                "batch_size": bs,
+                "library_ms": round(lib_s * 1000.0, 4),
+                "compiled_ms": round(eng_s * 1000.0, 4),
+                "speedup": round(lib_s / eng_s, 2) if eng_s > 0 else None,
+            })
+        results.append(row)
+
+    for row in results:
+        print(f"\n{row['model']}: max |diff| = {row['max_abs_diff']:.3g} (relative {row['max_rel_diff']:.3g})")
+        print(f"  {'batch':>6}{'library ms':>14}{'compiled ms':>14}{'speedup':>10}")
+        for lat in row["latency"]:
+            print(f"  {lat['batch_size']:>6}{lat['library_ms']:>14.3f}{lat['compiled_ms']:>14.3f}{lat['speedup']:>9}x")
+
+    if args.json_path:
+        with open(args.json_path, "w") as fh:
+            json.dump(results, fh, indent=2)
+        print("\nSaved results to", args.json_path)
+
+
+if __name__ == "__main__":
+    main()
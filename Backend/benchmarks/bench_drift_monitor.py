@@ -0,0 +1,153 @@
+# benchmarks/bench_drift_monitor.py
+"""
+Cost and accuracy of the drift monitor (services.drift_monitor).
+
+  observe       µs per drift_monitor.observe() call with a 12-float list, as
+                POST /predict/ makes it, against binning every row into the
+                histograms as it arrives (searchsorted per column, no staging buffer)
+  observe_many  µs per row for batches of --batch rows
+  report        ms for one model_report() (PSI + KS over all columns)
+  accuracy      worst |sketch quantile rank - true rank| over p1..p99 and
+                |sketch KS - exact KS| against the reference, for --rows rows, with
+                the sketch's memory
+
+The reference profile is built from synthetic training data with mixed continuous and
+discrete columns. Live rows come from the same distribution with one shifted column.
+
+Run from Backend/:
+    python benchmarks/bench_drift_monitor.py --rows 1000000
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from _harness import BACKEND_DIR  # noqa: E402,F401
+
+
+def synthetic(n: int, rng, shift: float = 0.0) -> np.ndarray:
+    X = np.empty((n, 12))
+    X[:, 0:4] = rng.normal(size=(n, 4)) * [10, 50, 3, 100]
+    X[:, 4:7] = rng.lognormal(mean=2.0, sigma=0.8, size=(n, 3))
+    X[:, 7] = rng.integers(1, 13, n)        # month
+    X[:, 8] = rng.integers(0, 5, n)         # city code
+    X[:, 9] = rng.exponential(30.0, n)
+    X[:, 10] = rng.uniform(0, 24, n)
+    X[:, 11] = rng.integers(0, 3, n)
+    X[:, 3] += shift * 100
+    return X
+
+
+def exact_ks(live: np.ndarray, ref_q: np.ndarray, ref_cdf) -> float:
+    v = np.sort(live)
+    points = np.concatenate([ref_q, v])
+    live_cdf = np.searchsorted(v, points, side="right") / len(v)
+    return float(np.max(np.abs(live_cdf - ref_cdf(ref_q, points))))
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--rows", type=int, default=1_000_000, help="rows fed to the sketch for the accuracy check")
+    ap.add_argument("--calls", type=int, default=50_000, help="single observe() calls timed")
+    ap.add_argument("--batch", type=int, default=1000)
+    ap.add_argument("--json", dest="json_path")
+    args = ap.parse_args()
+
+    tmp = tempfile.TemporaryDirectory(prefix="bench_drift_")
+    os.environ["MODEL_DIR"] = tmp.name
+    os.environ.setdefault("DRIFT_WINDOW_SECONDS", "0")
+    from services import drift_monitor
+
+    rng = np.random.default_rng(0)
+    names = [f"f{i}" for i in range(12)]
+    X_ref = synthetic(200_000, rng)
+    pred_ref = X_ref @ rng.normal(size=12)
+    coef = rng.normal(size=12)
+    with open(os.path.join(tmp.name, drift_monitor.REFERENCE_PROFILE_FILE), "w") as fh:
+        json.dump(drift_monitor.build_reference_profile(X_ref, names, {"m": X_ref @ coef}), fh)
+    del pred_ref
+
+    results = {"sketch_k": drift_monitor.DRIFT_SKETCH_K}
+
+    # --- per-request cost ---
+    rows = [list(map(float, r)) for r in synthetic(args.calls, rng)]
+    preds = [float(sum(r)) for r in rows]
+    drift_monitor.reset()
+    t0 = time.perf_counter()
+    for r, p in zip(rows, preds):
+        drift_monitor.observe("m", r, p)
+    results["observe_us"] = (time.perf_counter() - t0) / args.calls * 1e6
+
+    ref, _ = drift_monitor._reference()
+    layout = ref.layout("m")
+    edges = [np.asarray(c["edges"]) for c in layout["columns"]]
+    counts = [np.zeros(len(e) + 1, dtype=np.int64) for e in edges]
+    t0 = time.perf_counter()
+    for r, p in zip(rows, preds):
+        row = np.asarray(r + [p])
+        for i, e in enumerate(edges):
+            counts[i][np.searchsorted(e, row[i])] += 1
+    results["unbuffered_us"] = (time.perf_counter() - t0) / args.calls * 1e6
+
+    batch = synthetic(args.batch * 20, rng)
+    bpred = batch @ coef
+    drift_monitor.reset()
+    t0 = time.perf_counter()
+    for i in range(0, len(batch), args.batch):
+        drift_monitor.observe_many("m", batch[i:i + args.batch], bpred[i:i + args.batch])
+    results["observe_many_us_per_row"] = (time.perf_counter() - t0) / len(batch) * 1e6
+
+    # --- accuracy and memory at --rows ---
+    drift_monitor.reset()
+    live = synthetic(args.rows, rng, shift=0.3)
+    live_pred = live @ coef
+    for i in range(0, args.rows, 100_000):
+        drift_monitor.observe_many("m", live[i:i + 100_000], live_pred[i:i + 100_000])
+    t0 = time.perf_counter()
+    report = drift_monitor.model_report("m")
+    results["report_ms"] = (time.perf_counter() - t0) * 1000.0
+
+    w = drift_monitor._windows["m"]["current"]
+    values, cum, total = w.sketch()
+    pct = np.arange(1, 100) / 100.0
+    worst_rank, worst_ks = 0.0, 0.0
+    full = np.column_stack([live, live_pred])
+    for i, name in enumerate(names + [drift_monitor.PREDICTION_COLUMN]):
+        col = np.sort(full[:, i])
+        q = values[np.minimum(np.searchsorted(cum[:, i], pct * total), len(values) - 1), i]
+        # true rank interval of each sketch quantile (ties in discrete columns span a range)
+        lo = np.searchsorted(col, q, side="left") / len(col)
+        hi = np.searchsorted(col, q, side="right") / len(col)
+        worst_rank = max(worst_rank, float(np.max(np.maximum(lo - pct, pct - hi).clip(0))))
+        ref_q = np.asarray(layout["columns"][i]["quantiles"])
+        scores = report["prediction"] if i == 12 else report["features"][name]
+        worst_ks = max(worst_ks, abs(scores["ks"] - exact_ks(col, ref_q, drift_monitor._ref_cdf)))
+    results.update({"rows": args.rows, "levels": len(w.levels), "memory_bytes": w.memory_bytes(),
+                    "raw_bytes": full.nbytes, "max_rank_error": worst_rank, "max_ks_error": worst_ks,
+                    "shifted_psi": report["features"]["f3"]["psi"], "shifted_ks": report["features"]["f3"]["ks"],
+                    "max_other_psi": max(s["psi"] for n, s in report["features"].items() if n != "f3")})
+
+    print(f"observe():          {results['observe_us']:.2f} µs/call   (unbuffered per-row binning: {results['unbuffered_us']:.2f} µs)")
+    print(f"observe_many():     {results['observe_many_us_per_row']:.3f} µs/row  (batches of {args.batch})")
+    print(f"model_report():     {results['report_ms']:.2f} ms")
+    print(f"sketch @ {args.rows} rows: {results['levels']} levels, {results['memory_bytes'] / 1024:.0f} KB "
+          f"(raw rows {results['raw_bytes'] / 2**20:.0f} MB); max rank error {results['max_rank_error']:.4f}, "
+          f"max KS error {results['max_ks_error']:.4f}")
+    print(f"shifted column: PSI {results['shifted_psi']:.3f} KS {results['shifted_ks']:.3f}; "
+          f"largest PSI of the others {results['max_other_psi']:.4f}")
+
+    if args.json_path:
+        with open(args.json_path, "w") as fh:
+            json.dump({"args": vars(args), "results": results}, fh, indent=2)
+        print("Saved results to", args.json_path)
+    tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+# benchmarks/bench_fast_path.py
+"""
+Per-request CPU cost of POST /predict/ vs POST /predict/fast (services.fast_validation).
+
+Two measurements:
+  - validation only: decoding + validating one 12-float body the way each route does
+    (pydantic PredictIn + float() pass + available_models() + get_feature_order(),
+    vs fast_validation.parse_predict), in microseconds of CPU per call;
+  - end to end: --requests distinct vectors sent through the app in-process (httpx
+    ASGITransport, in-memory collections, synthetic models), CPU time per request
+    (time.process_time, so threadpool and inference work is included).
+
+Run from Backend/:
+    python benchmarks/bench_fast_path.py --requests 3000 --model linear
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from _harness import BACKEND_DIR, install_memory_db, install_synthetic_models  # noqa: E402
+
+REPO_DIR = os.path.dirname(BACKEND_DIR)
+
+
+def cpu_per_call_us(fn, n: int) -> float:
+    t0 = time.process_time()
+    for _ in range(n):
+        fn()
+    return (time.process_time() - t0) / n * 1e6
+
+
+def sample_vectors(n: int, width: int):
+    """Vectors inside the validation_rules.json ranges (MonthlyHours etc.)."""
+    rng = np.random.default_rng(0)
+    X = rng.uniform(1, 200, size=(n, width))
+    X[:, 3] = rng.uniform(250, 780, size=n)    # MonthlyHours
+    X[:, 7] = rng.uniform(0, 300, size=n)      # GridConsumption_kWh
+    X[:, 0] = rng.uniform(0, 70, size=n)       # total_appliance_power
+    return X.round(4).tolist()
+
+
+def bench_validation(model: str, vectors, n: int):
+    import services.ai_service as ai_service
+    from routes.prediction_routes import PredictIn
+    from services import fast_validation
+
+    bodies = [json.dumps({"house_id": "h1", "model": model, "features": v}).encode() for v in vectors[:64]]
+
+    def regular():
+        for body in bodies:
+            payload = PredictIn(**json.loads(body))
+            features = [float(x) for x in payload.features]
+            ok = payload.model in ai_service.available_models() and len(features) == len(ai_service.get_feature_order())
+            assert ok
+
+    def fast():
+        for body in bodies:
+            fast_validation.parse_predict(body)
+
+    rounds = max(1, n // len(bodies))
+    return {
+        "regular_us": round(cpu_per_call_us(regular, rounds) / len(bodies), 2),
+        "fast_us": round(cpu_per_call_us(fast, rounds) / len(bodies), 2),
+    }
+
+
+async def bench_routes(model: str, vectors):
+    import httpx
+    import main as app_main
+
+    out = {}
+    async with app_main.lifespan(app_main.app):
+        transport = httpx.ASGITransport(app=app_main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for route in ("/predict/", "/predict/fast"):
+                for v in vectors[:50]:  # warm-up
+                    await client.post(route, json={"house_id": "w", "model": model, "features": v})
+            for route in ("/predict/", "/predict/fast"):
+                # shift the vectors so neither route hits the prediction cache
+                shift = 0.5 if route == "/predict/fast" else 0.25
+                t0, c0 = time.perf_counter(), time.process_time()
+                for v in vectors:
+                    resp = await client.post(route, json={"house_id": "h1", "model": model,
+                                                          "features": [x + shift for x in v]})
+                    assert resp.status_code == 200, resp.text
+                wall, cpu = time.perf_counter() - t0, time.process_time() - c0
+                out[route] = {"requests": len(vectors), "cpu_us_per_request": round(cpu / len(vectors) * 1e6, 1),
+                              "rps": round(len(vectors) / wall, 1)}
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--requests", type=int, default=3000, help="requests per route (end to end)")
+    ap.add_argument("--calls", type=int, default=20000, help="validation-only calls per variant")
+    ap.add_argument("--model", default="linear")
+    ap.add_argument("--json", dest="json_path")
+    args = ap.parse_args()
+
+    tmp = tempfile.TemporaryDirectory(prefix="bench_fast_")
+    os.environ.update(MODEL_DIR=tmp.name, ENSURE_INDEXES=os.getenv("ENSURE_INDEXES", "0"),
+                      ROLLUP_SNAPSHOT_PATH=os.getenv("ROLLUP_SNAPSHOT_PATH", ""))
+    install_memory_db()
+    install_synthetic_models(tmp.name)
+    # real feature names and limits, so the range checks have columns to act on
+    for name in ("feature_order.json", "validation_rules.json"):
+        with open(os.path.join(REPO_DIR, "FrontEnd", "models", name)) as src, \
+                open(os.path.join(tmp.name, name), "w") as dst:
+            dst.write(src.read())
+
+    vectors = sample_vectors(args.requests, 12)
+    results = {"validation": bench_validation(args.model, vectors, args.calls),
+               "routes": asyncio.run(bench_routes(args.model, vectors))}
+
+    v = results["validation"]
+    print(f"validation only:  regular {v['regular_us']:.1f} us   fast {v['fast_us']:.1f} us   "
+          f"({v['regular_us'] / v['fast_us']:.1f}x)")
+    print(f"{'route':<16}{'cpu us/req':>12}{'rps':>10}")
+    for route, r in results["routes"].items():
+        print(f"{route:<16}{r['cpu_us_per_request']:>12.1f}{r['rps']:>10.1f}")
+    base, fast = results["routes"]["/predict/"], results["routes"]["/predict/fast"]
+    print(f"CPU saved per request: {base['cpu_us_per_request'] - fast['cpu_us_per_request']:.1f} us")
+
+    if args.json_path:
+        with open(args.json_path, "w") as fh:
+            json.dump(results, fh, indent=2)
+        print("Saved results to", args.json_path)
+    tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
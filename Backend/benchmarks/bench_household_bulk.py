@@ -0,0 +1,80 @@
+# benchmarks/bench_household_bulk.py
+"""
+Household ingestion throughput: POST /household/ (one record per request) vs
+POST /household/bulk (JSON array and NDJSON bodies).
+
+Drives the FastAPI app in-process through Starlette's TestClient, with the Mongo
+collections replaced by in-memory stand-ins, and reports rows per second.
+
+Run from Backend/:
+    python benchmarks/bench_household_bulk.py --rows 20000 --single-rows 2000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from _harness import install_memory_db, make_rows  # noqa: E402
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--rows", type=int, default=20000, help="rows sent through the bulk route")
+    ap.add_argument("--single-rows", type=int, default=2000, help="rows sent through the single-record route")
+    ap.add_argument("--request-size", type=int, default=5000, help="rows per bulk request")
+    ap.add_argument("--json", dest="json_path")
+    args = ap.parse_args()
+
+    os.environ.setdefault("PRELOAD_MODELS", "0")
+    os.environ.setdefault("ENSURE_INDEXES", "0")
+    os.environ.setdefault("ROLLUP_SNAPSHOT_PATH", "")  # never write benchmark rollups to disk
+    db = install_memory_db()
+    from fastapi.testclient import TestClient
+    import main as app_main
+
+    rows = make_rows(max(args.rows, args.single_rows))
+    results = {}
+
+    with TestClient(app_main.app) as client:
+        t0 = time.perf_counter()
+        for r in rows[:args.single_rows]:
+            resp = client.post("/household/", json=r)
+            assert resp.status_code == 201, resp.text
+        elapsed = time.perf_counter() - t0
+        results["single"] = {"rows": args.single_rows, "seconds": round(elapsed, 3),
+                             "rows_per_sec": round(args.single_rows / elapsed, 1)}
+
+        for fmt in ("json", "ndjson"):
+            db.household_col.delete_many({})
+            inserted = 0
+            t0 = time.perf_counter()
+            for start in range(0, args.rows, args.request_size):
+                chunk = rows[start:start + args.request_size]
+                if fmt == "json":
+                    resp = client.post("/household/bulk", content=json.dumps(chunk),
+                                       headers={"Content-Type": "application/json"})
+                else:
+                    resp = client.post("/household/bulk", content="\n".join(json.dumps(r) for r in chunk),
+                                       headers={"Content-Type": "application/x-ndjson"})
+                assert resp.status_code == 200, resp.text
+                inserted += resp.json()["inserted"]
+            elapsed = time.perf_counter() - t0
+            results[f"bulk_{fmt}"] = {"rows": args.rows, "inserted": inserted, "seconds": round(elapsed, 3),
+                                      "rows_per_sec": round(args.rows / elapsed, 1)}
+
+    base = results["single"]["rows_per_sec"]
+    print(f"{'route':<14}{'rows':>8}{'seconds':>10}{'rows/s':>12}{'speedup':>10}")
+    for name, r in results.items():
+        print(f"{name:<14}{r['rows']:>8}{r['seconds']:>10.2f}{r['rows_per_sec']:>12.1f}{r['rows_per_sec'] / base:>9.1f}x")
+
+    if args.json_path:
+        with open(args.json_path, "w") as fh:
+            json.dump(results, fh, indent=2)
+        print("Saved results to", args.json_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+# benchmarks/bench_inference_pool.py
+"""
+Latency of cheap endpoints while CPU-heavy predictions run, with the inference
+executor inline (scaler + model on the request thread) vs in the process pool
+(INFERENCE_EXECUTOR=process, see ai_service.InferencePool).
+
+For --seconds, --heavy client tasks keep sending POST /predict/batch (--rows rows,
+persist=false) for --model, while one probe task alternates GET / and
+POST /api/solar/ and records their latency. The app runs in-process behind
+httpx.ASGITransport with in-memory collections, so the probes share the event
+loop and threadpool with the heavy requests exactly as in a server worker.
+
+Each executor mode runs in a fresh interpreter (the settings are read at import).
+Reported per mode: heavy rows/s, heavy requests shed with 503, and probe p50 / p99 / max.
+
+Run from Backend/:
+    python benchmarks/bench_inference_pool.py --seconds 20 --heavy 8 --workers 4
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from _harness import BACKEND_DIR, install_memory_db  # noqa: E402
+
+
+async def heavy_loop(client, deadline: float, body: dict, counts: dict):
+    while time.perf_counter() < deadline:
+        resp = await client.post("/predict/batch", json=body)
+        if resp.status_code == 200:
+            counts["rows"] += len(body["house_ids"])
+        elif resp.status_code == 503:
+            counts["shed"] += 1
+        else:
+            counts["errors"] += 1
+
+
+async def probe_loop(client, deadline: float, latencies: dict):
+    solar = {"daily_kwh": 12.5, "sun_hours": 5.0, "panel_watt": 400}
+    while time.perf_counter() < deadline:
+        for name, call in (("root", lambda: client.get("/")),
+                           ("solar", lambda: client.post("/api/solar/", json=solar))):
+            t0 = time.perf_counter()
+            resp = await call()
+            if resp.status_code == 200:
+                latencies[name].append(time.perf_counter() - t0)
+        await asyncio.sleep(0.005)
+
+
+async def run_mode(args) -> dict:
+    import httpx
+    import main as app_main
+    import services.ai_service as ai_service
+
+    width = len(ai_service.get_feature_order() or []) or 12
+    rng = np.random.default_rng(0)
+    counts = {"rows": 0, "shed": 0, "errors": 0}
+    latencies = {"root": [], "solar": []}
+    async with app_main.lifespan(app_main.app):
+        transport = httpx.ASGITransport(app=app_main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            bodies = [{"model": args.model, "house_ids": [f"h{i}" for i in range(args.rows)],
+                       "features": (rng.normal(size=(args.rows, width)) * 10).tolist(), "persist": False}
+                      for _ in range(args.heavy)]
+            t0 = time.perf_counter()
+            deadline = t0 + args.seconds
+            await asyncio.gather(probe_loop(client, deadline, latencies),
+                                 *(heavy_loop(client, deadline, b, counts) for b in bodies))
+            wall = time.perf_counter() - t0
+    out = {"mode": ai_service.INFERENCE_EXECUTOR, "rows_per_s": counts["rows"] / wall,
+           "shed": counts["shed"], "errors": counts["errors"]}
+    for name, lat in latencies.items():
+        ms = np.sort(np.asarray(lat or [float("nan")])) * 1000.0
+        out[name] = {"n": len(lat), "p50_ms": float(np.percentile(ms, 50)),
+                     "p99_ms": float(np.percentile(ms, 99)), "max_ms": float(ms.max())}
+    return out
+
+
+def child(args):
+    install_memory_db()
+    print(json.dumps(asyncio.run(run_mode(args))))
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--seconds", type=float, default=15.0)
+    ap.add_argument("--heavy", type=int, default=8, help="concurrent clients sending heavy batch predictions")
+    ap.add_argument("--rows", type=int, default=200, help="rows per heavy batch request")
+    ap.add_argument("--model", default="rf")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="INFERENCE_WORKERS for process mode")
+    ap.add_argument("--max-pending", type=int, default=0, help="INFERENCE_MAX_PENDING (0 = 4 x workers)")
+    ap.add_argument("--model-dir", help="real model artifacts; default trains synthetic ones")
+    ap.add_argument("--modes", default="inline,process")
+    ap.add_argument("--json", dest="json_path")
+    ap.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.child:
+        return child(args)
+
+    tmp = None
+    model_dir = args.model_dir
+    if model_dir is None:
+        tmp = tempfile.TemporaryDirectory(prefix="bench_pool_models_")
+        model_dir = tmp.name
+        from _harness import install_synthetic_models
+        install_synthetic_models(model_dir)
+
+    results = []
+    print(f"{'mode':<9}{'rows/s':>10}{'shed':>7}{'root p50':>10}{'root p99':>10}{'solar p50':>11}{'solar p99':>11}{'max ms':>9}")
+    for mode in [m for m in args.modes.split(",") if m]:
+        env = dict(os.environ, MODEL_DIR=model_dir, INFERENCE_EXECUTOR=mode, INFERENCE_WORKERS=str(args.workers),
+                   INFERENCE_MAX_PENDING=str(args.max_pending), ENSURE_INDEXES="0", PREDICTION_CACHE_SIZE="0",
+                   ROLLUP_SNAPSHOT_PATH="")
+        cmd = [sys.executable, os.path.abspath(__file__), "--child", "--seconds", str(args.seconds),
+               "--heavy", str(args.heavy), "--rows", str(args.rows), "--model", args.model]
+        proc = subprocess.run(cmd, cwd=BACKEND_DIR, env=env, capture_output=True, text=True)
+        if proc.returncode != 0:
+            raise SystemExit(f"{mode} run failed:\n{proc.stderr[-2000:]}")
+        r = json.loads(proc.stdout.strip().splitlines()[-1])
+        results.append(r)
+        print(f"{mode:<9}{r['rows_per_s']:>10.0f}{r['shed']:>7}{r['root']['p50_ms']:>10.2f}{r['root']['p99_ms']:>10.2f}"
+              f"{r['solar']['p50_ms']:>11.2f}{r['solar']['p99_ms']:>11.2f}"
+              f"{max(r['root']['max_ms'], r['solar']['max_ms']):>9.1f}")
+
+    if args.json_path:
+        with open(args.json_path, "w") as fh:
+            json.dump({"cpus": os.cpu_count(), "args": vars(args), "results": results}, fh, indent=2)
+        print("Saved results to", args.json_path)
+    if tmp is not None:
+        tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
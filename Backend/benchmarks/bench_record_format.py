@@ -0,0 +1,110 @@
+# benchmarks/bench_record_format.py
+"""
+Storage size and scan cost of prediction records in the "full" and "compact"
+formats (services.record_codec).
+
+--records synthetic prediction records shaped like the ones /predict/ writes
+(12-feature vectors, the default meta) are encoded in both formats. Reported per
+format:
+  - BSON bytes per document and in total (what MongoDB stores before compression
+    and sends over the wire on a scan),
+  - scan: bson.decode_all over the concatenated documents, i.e. the client-side
+    decoding a cursor over the collection does,
+  - scan + matrix: the same, then all feature vectors as one (n, 12) array
+    (np.array over the lists vs np.frombuffer over the joined blobs),
+  - history page: decoding --page documents into the API shape (record_codec.decode_many).
+Index sizes are not included; both formats index the same fields.
+
+Run from Backend/:
+    python benchmarks/bench_record_format.py --records 200000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+import bson
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import _harness  # noqa: E402,F401  (puts Backend/ on sys.path)
+from services import record_codec  # noqa: E402
+
+
+def make_records(n: int, width: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    features = np.round(rng.normal(size=(n, width)) * rng.uniform(1, 500, size=width), 2)
+    start = datetime(2024, 1, 1)
+    out = []
+    for i in range(n):
+        out.append({
+            "_id": bson.ObjectId(),
+            "house_id": f"house_{i % 5000}",
+            "model": ("linear", "rf", "xgb")[i % 3],
+            "model_version": "file-0123456789ab",
+            "predicted_value_kwh": float(rng.normal(300, 80)),
+            "features": features[i].tolist(),
+            "meta": {},
+            "timestamp": (start + timedelta(seconds=37 * i)).isoformat(),
+        })
+    return out
+
+
+def best_of(fn, repeats: int) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--records", type=int, default=100000)
+    ap.add_argument("--width", type=int, default=12)
+    ap.add_argument("--page", type=int, default=50)
+    ap.add_argument("--repeats", type=int, default=3)
+    ap.add_argument("--json", dest="json_path")
+    args = ap.parse_args()
+
+    full = make_records(args.records, args.width)
+    compact = [record_codec.encode(d, "0123456789abcdef") for d in full]
+    results = {}
+    for name, docs in (("full", full), ("compact", compact)):
+        encoded = [bson.encode(d) for d in docs]
+        blob = b"".join(encoded)
+        if name == "full":
+            def to_matrix(ds):
+                return np.array([d["features"] for d in ds], dtype=np.float64)
+        else:
+            def to_matrix(ds):
+                return np.frombuffer(b"".join(d["fv"] for d in ds), dtype=record_codec.FEATURES_DTYPE).reshape(len(ds), -1)
+        page = blob[:sum(len(e) for e in encoded[:args.page])]
+        results[name] = {
+            "bytes_per_doc": len(blob) / len(docs),
+            "total_mb": len(blob) / 1e6,
+            "scan_s": best_of(lambda: bson.decode_all(blob), args.repeats),
+            "scan_matrix_s": best_of(lambda: to_matrix(bson.decode_all(blob)), args.repeats),
+            "page_ms": best_of(lambda: record_codec.decode_many(bson.decode_all(page)), args.repeats * 20) * 1000.0,
+        }
+
+    print(f"{args.records} records, {args.width} features")
+    print(f"{'format':<9}{'bytes/doc':>11}{'total MB':>10}{'scan s':>9}{'scan+matrix s':>15}{'page ms':>9}")
+    for name, r in results.items():
+        print(f"{name:<9}{r['bytes_per_doc']:>11.1f}{r['total_mb']:>10.1f}{r['scan_s']:>9.3f}"
+              f"{r['scan_matrix_s']:>15.3f}{r['page_ms']:>9.3f}")
+    f, c = results["full"], results["compact"]
+    print(f"compact: {(1 - c['bytes_per_doc'] / f['bytes_per_doc']) * 100:.1f}% smaller, scan {f['scan_s'] / c['scan_s']:.2f}x, "
+          f"scan+matrix {f['scan_matrix_s'] / c['scan_matrix_s']:.2f}x")
+    if args.json_path:
+        with open(args.json_path, "w") as fh:
+            json.dump({"records": args.records, "width": args.width, "results": results}, fh, indent=2)
+        print("Saved results to", args.json_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+# benchmarks/bench_worker_rss.py
+"""
+Per-worker memory benchmark for the model loading strategies in services.ai_service.
+
+Forks N worker processes the way a pre-fork server does and reports each worker's
+RSS, PSS (proportional share: shared pages are split between the processes using
+them) and USS (private pages) after every model has been loaded and warmed up.
+
+Strategies:
+  per-worker : every worker joblib-loads its own copy (uvicorn --workers default)
+  mmap       : every worker loads with MODEL_MMAP_MODE=r (arrays mapped from the page cache)
+  preload    : the parent loads once, calls gc.freeze(), then forks
+               (gunicorn --preload / PRELOAD_IN_MASTER=1)
+
+Linux only (reads /proc/self/smaps_rollup). Run from Backend/:
+    python benchmarks/bench_worker_rss.py --workers 4 --model-dir data
+    python benchmarks/bench_worker_rss.py --modes per-worker,preload --json rss.json
+"""
+import argparse
+import gc
+import json
+import multiprocessing as mp
+import os
+import subprocess
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+MODES = ("per-worker", "mmap", "preload")
+
+
+def read_memory_kb() -> dict:
+    """Rss / Pss / Uss (private clean + dirty) of the current process in kB."""
+    out = {"rss_kb": 0, "pss_kb": 0, "uss_kb": 0}
+    with open("/proc/self/smaps_rollup") as fh:
+        for line in fh:
+            parts = line.split()
+            # skip the "[rollup]" mapping header line
+            if len(parts) < 2 or not parts[1].isdigit():
+                continue
+            name, value = parts[0].rstrip(":"), int(parts[1])
+            if name == "Rss":
+                out["rss_kb"] = value
+            elif name == "Pss":
+                out["pss_kb"] = value
+            elif name in ("Private_Clean", "Private_Dirty"):
+                out["uss_kb"] += value
+    return out
+
+
+def _worker(mode, loaded_barrier, done_barrier, results):
+    import services.ai_service as ai_service
+
+    if mode != "preload":
+        ai_service.MODEL_MMAP_MODE = "r" if mode == "mmap" else None
+        ai_service.preload_models()
+    else:
+        # inherited models: a warm-up prediction is what a real request would touch
+        for key in ai_service.available_models():
+            width = ai_service._warmup_width(ai_service.get_model_version(key))
+            if width:
+                ai_service.predict(key, [0.0] * width)
+
+    # measure only once every worker holds its models, so shared pages are accounted for
+    loaded_barrier.wait()
+    results.put(dict(read_memory_kb(), pid=os.getpid()))
+    done_barrier.wait()
+
+
+def run_mode(mode: str, workers: int) -> dict:
+    import services.ai_service as ai_service
+
+    parent_before = read_memory_kb()
+    if mode == "preload":
+        report = ai_service.preload_models()
+        gc.freeze()
+        if not report["models"]:
+            raise SystemExit(f"No models found in MODEL_DIR={ai_service.MODEL_DIR}")
+
+    ctx = mp.get_context("fork")
+    loaded_barrier = ctx.Barrier(workers)
+    done_barrier = ctx.Barrier(workers)
+    results = ctx.Queue()
+    procs = [ctx.Process(target=_worker, args=(mode, loaded_barrier, done_barrier, results))
+             for _ in range(workers)]
+    for p in procs:
+        p.start()
+    per_worker = [results.get(timeout=600) for _ in procs]
+    for p in procs:
+        p.join()
+
+    def mean(field):
+        return round(sum(w[field] for w in per_worker) / len(per_worker) / 1024.0, 1)
+
+    return {
+        "mode": mode,
+        "workers": workers,
+        "parent_rss_mb": round(read_memory_kb()["rss_kb"] / 1024.0, 1),
+        "parent_rss_before_mb": round(parent_before["rss_kb"] / 1024.0, 1),
+        "mean_worker_rss_mb": mean("rss_kb"),
+        "mean_worker_pss_mb": mean("pss_kb"),
+        "mean_worker_uss_mb": mean("uss_kb"),
+        "total_pss_mb": round(sum(w["pss_kb"] for w in per_worker) / 1024.0, 1),
+        "per_worker": per_worker,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--workers", type=int, default=4)
+    ap.add_argument("--model-dir", default=os.getenv("MODEL_DIR", "data"))
+    ap.add_argument("--modes", default=",".join(MODES), help="comma-separated subset of " + ",".join(MODES))
+    ap.add_argument("--json", dest="json_path", help="also write the results to this file")
+    ap.add_argument("--single-mode", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    os.environ["MODEL_DIR"] = args.model_dir
+
+    if args.single_mode:
+        # child invocation: one mode in a fresh interpreter so modes don't share parent state
+        print(json.dumps(run_mode(args.single_mode, args.workers)))
+        return
+
+    results = []
+    for mode in [m.strip() for m in args.modes.split(",") if m.strip()]:
+        if mode not in MODES:
+            raise SystemExit(f"Unknown mode '{mode}', choose from {MODES}")
+        proc = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--single-mode", mode,
+             "--workers", str(args.workers), "--model-dir", args.model_dir],
+            capture_output=True, text=True, check=True,
+        )
+        results.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+
+    print(f"{'mode':<12}{'workers':>8}{'RSS/worker':>12}{'PSS/worker':>12}{'USS/worker':>12}{'total PSS':>12}")
+    for r in results:
+        print(f"{r['mode']:<12}{r['workers']:>8}{r['mean_worker_rss_mb']:>10.1f}MB"
+              f"{r['mean_worker_pss_mb']:>10.1f}MB{r['mean_worker_uss_mb']:>10.1f}MB{r['total_pss_mb']:>10.1f}MB")
+
+    if args.json_path:
+        with open(args.json_path, "w") as fh:
+            json.dump(results, fh, indent=2)
+        print("Saved results to", args.json_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,71 @@
+import gc
+import os
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
-from routes import household_routes, prediction_routes, solar_routes
+from fastapi.responses import JSONResponse, Response
+from starlette.concurrency import run_in_threadpool
+from routes import (analytics_routes, drift_routes, export_routes, forecast_routes, household_routes,
+                    prediction_routes, solar_routes)
+from services import indexes, metrics, persistence, rollup_service
+import services.ai_service as ai_service
+
+# set PRELOAD_MODELS=0 to fall back to lazy loading on the first request
+PRELOAD_MODELS = os.getenv("PRELOAD_MODELS", "1").lower() in ("1", "true", "yes")
+
+# set ENSURE_INDEXES=0 to skip creating the MongoDB indexes on startup
+ENSURE_INDEXES = os.getenv("ENSURE_INDEXES", "1").lower() in ("1", "true", "yes")
+
+# set LOAD_ROLLUPS=0 to skip loading (or rebuilding) the analytics rollups on startup;
+# inserts are still folded in from then on
+LOAD_ROLLUPS = os.getenv("LOAD_ROLLUPS", "1").lower() in ("1", "true", "yes")
+
+# PRELOAD_IN_MASTER=1 loads the models while this module is imported. Under a pre-fork
+# server that imports the app once before forking, e.g.
+#   gunicorn main:app --preload -w 4 -k uvicorn.workers.UvicornWorker
+# the workers inherit the loaded models and share their pages copy-on-write
+# instead of each holding a private copy.
+PRELOAD_IN_MASTER = os.getenv("PRELOAD_IN_MASTER", "0").lower() in ("1", "true", "yes")
+
+if PRELOAD_IN_MASTER:
+    ai_service.preload_models()
+    # move everything allocated so far out of the GC's generations so collections
+    # in the workers don't write to (and thereby un-share) the model objects' pages
+    gc.freeze()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # --- startup: indexes backing history / household pagination (no-op if they exist) ---
+    if ENSURE_INDEXES:
+        from models.database import household_col, pred_col
+        created = await run_in_threadpool(indexes.ensure_indexes, pred_col, household_col)
+        print(f"[indexes] {created}")
+    # --- startup: analytics rollups from the last snapshot plus newer records (or a full rebuild) ---
+    if LOAD_ROLLUPS:
+        result = await run_in_threadpool(rollup_service.start)
+        print(f"[rollups] {result}")
+    # --- startup: load + warm up every available model before serving traffic ---
+    if PRELOAD_MODELS and ai_service.preload_report() is None:
+        report = await run_in_threadpool(ai_service.preload_models)
+        for key, entry in report["models"].items():
+            print(f"[preload] {key}: load={entry.get('load_ms')}ms warmup={entry.get('warmup_ms')}ms"
+                  + (f" error={entry['error']}" if "error" in entry else ""))
+        print(f"[preload] done in {report['total_ms']}ms, ready={report['ready']}")
+    # --- startup: INFERENCE_EXECUTOR=process starts the inference workers (each preloads the models) ---
+    workers = await run_in_threadpool(ai_service.start_inference_pool)
+    if workers is not None:
+        print(f"[inference-pool] {len(workers)} workers ready: {sorted(workers)}")
+    yield
+    # --- shutdown: drain the write-behind queues (PERSIST_MODE=async) before the process exits ---
+    persistence.shutdown()
+    ai_service.shutdown_inference_pool()
+    if LOAD_ROLLUPS:
+        rollup_service.shutdown()
+
 
 # --- create app ---
-app = FastAPI(title="AIRES Backend API")
+app = FastAPI(title="AIRES Backend API", lifespan=lifespan)
 
 # --- CORS middleware (allow your frontend origins during development) ---
 from fastapi.middleware.cors import CORSMiddleware
@@ -35,9 +98,33 @@ app.add_middleware(
 app.include_router(household_routes.router)
 app.include_router(prediction_routes.router)
 app.include_router(solar_routes.router)
+app.include_router(export_routes.router)
+app.include_router(forecast_routes.router)
+app.include_router(analytics_routes.router)
+app.include_router(drift_routes.router)
 
 
 @app.get("/")
 async def root():
     return {"message": "AIRES Backend running"}
 
+
+
+@app.get("/metrics")
+def get_metrics():
+    """Prometheus text exposition of the prediction metrics (request/error counters, stage histograms)."""
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
+@app.get("/ready")
+def ready():
+    """
+    Readiness probe: 200 once startup preloading has loaded and warmed up every
+    available model, 503 otherwise. Includes per-model load / warm-up timings.
+    """
+    report = ai_service.preload_report()
+    if not PRELOAD_MODELS:
+        return {"ready": True, "preload": None}
+    if report is None or not report.get("ready"):
+        return JSONResponse(status_code=503, content={"ready": False, "preload": report})
+    return {"ready": True, "preload": report}
@@ -0,0 +1,87 @@
+# routes/analytics_routes.py
+"""
+Per-house consumption analytics answered from the incremental rollups
+(services.rollup_service): monthly totals and averages of the household readings,
+prediction statistics per model and prediction-vs-actual error. No raw records
+are read on these routes.
+"""
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query
+
+from services import rollup_service
+
+router = APIRouter(prefix="/analytics", tags=["Analytics"])
+
+
+def _month_param(name: str, value: Optional[str]) -> Optional[str]:
+    if value is None:
+        return None
+    try:
+        rollup_service.month_index(value)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail=f"`{name}` must be a month as YYYY-MM.")
+    return value
+
+
+@router.get("/houses")
+def list_houses(offset: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=1000)):
+    """
+    Running totals per house, in house_id order.
+    Response: {"total": n_houses, "data": [{"house_id", "readings", "actual_kwh", "avg_daily_kwh",
+               "predictions", "months", "first_month", "last_month"}, ...]}
+    """
+    rollup_service.maybe_refresh()
+    total, data = rollup_service.list_houses(offset, limit)
+    return {"total": total, "data": data}
+
+
+@router.get("/houses/{house_id}/summary")
+def get_house_summary(house_id: str):
+    """Running totals of one house (constant time)."""
+    rollup_service.maybe_refresh()
+    summary = rollup_service.house_summary(house_id)
+    if summary is None:
+        raise HTTPException(status_code=404, detail=f"No records for house '{house_id}'")
+    return summary
+
+
+@router.get("/houses/{house_id}")
+def get_house_analytics(house_id: str, start: Optional[str] = None, end: Optional[str] = None,
+                        model: Optional[str] = None):
+    """
+    Monthly aggregates of one house, optionally limited to months start..end (YYYY-MM)
+    and to one model's predictions.
+    Each month: {"month", "readings", "actual_kwh", "avg_daily_kwh", "min_daily_kwh",
+    "max_daily_kwh", "estimated_month_kwh", "complete", "predictions": {model: {"count",
+    "mean_kwh", "min_kwh", "max_kwh"}}, "error": {model: {"error_kwh", "abs_error_kwh", "pct_error"}}}
+    (reading fields only for months with readings, "error" only where both exist).
+    """
+    start, end = _month_param("start", start), _month_param("end", end)
+    rollup_service.maybe_refresh()
+    summary = rollup_service.house_summary(house_id)
+    months = rollup_service.house_months(house_id, start, end, model)
+    if summary is None or months is None:
+        raise HTTPException(status_code=404, detail=f"No records for house '{house_id}'")
+    return {**summary, "monthly": months}
+
+
+@router.get("/stats")
+def get_rollup_stats():
+    """Houses / months tracked, ingest watermarks and snapshot state."""
+    return rollup_service.stats()
+
+
+@router.post("/refresh")
+def refresh_rollups(full: bool = False):
+    """Fold in records other processes inserted since the watermarks; full=true rebuilds from the collections."""
+    return rollup_service.rebuild() if full else rollup_service.refresh()
+
+
+@router.post("/snapshot")
+def snapshot_rollups():
+    """Write the rollups to ROLLUP_SNAPSHOT_PATH now."""
+    result = rollup_service.save_snapshot()
+    if result is None:
+        raise HTTPException(status_code=400, detail="Snapshots are disabled (ROLLUP_SNAPSHOT_PATH is empty).")
+    return result
@@ -0,0 +1,59 @@
+# routes/drift_routes.py
+"""
+Drift of the live prediction inputs and outputs against the training data
+(services.drift_monitor): PSI and KS per feature and for the predictions, per model,
+over the current and the previous window.
+"""
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException
+
+from services import drift_monitor
+
+router = APIRouter(prefix="/drift", tags=["Drift"])
+
+
+@router.get("")
+def get_drift_summary():
+    """
+    Per model and window: rows, status (ok / warn / drift / insufficient_data / unknown),
+    the largest feature PSI and which feature has it, the prediction PSI and the features
+    whose KS statistic exceeds the critical value. Includes the reference profile in use.
+    """
+    return drift_monitor.summary()
+
+
+@router.get("/reference")
+def get_reference_profile():
+    """The loaded reference profile (etag, creation time, rows, columns)."""
+    info = drift_monitor.reference_info()
+    if info is None:
+        raise HTTPException(status_code=404, detail=f"{drift_monitor.REFERENCE_PROFILE_FILE} not found or invalid")
+    return info
+
+
+@router.get("/stats")
+def get_drift_stats():
+    """Monitor settings, rows / sketch levels / memory per window and reference reloads."""
+    return drift_monitor.stats()
+
+
+@router.get("/{model}")
+def get_model_drift(model: str, window: str = "current", histograms: bool = False):
+    """
+    Per feature and for the predictions of one model: psi, ks, ks_critical, ks_reject,
+    status, live and reference mean / p1..p99; histograms=true adds the bin edges with
+    the reference and live shares.
+    """
+    if window not in ("current", "previous"):
+        raise HTTPException(status_code=400, detail="`window` must be 'current' or 'previous'.")
+    report = drift_monitor.model_report(model, window, histograms)
+    if report is None:
+        raise HTTPException(status_code=404, detail=f"No {window} drift window for model '{model}'")
+    return report
+
+
+@router.post("/reset")
+def reset_drift(model: Optional[str] = None):
+    """Start new windows for one model (or all), dropping the current and previous statistics."""
+    return {"reset": drift_monitor.reset(model)}
@@ -0,0 +1,188 @@
+# routes/export_routes.py
+"""
+Streaming exports of prediction history and household data.
+
+Rows are read from a Mongo cursor in batches of `batch_size` and written to the
+response as NDJSON (one JSON object per line) or CSV as they arrive. Memory use
+therefore stays constant regardless of how many rows match.
+"""
+import csv
+import io
+import json
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+
+from bson import ObjectId
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+
+import services.ai_service as ai_service
+from models.database import household_col, pred_col
+from services import record_codec
+
+router = APIRouter(prefix="/export", tags=["Export"])
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def _json_default(v: Any):
+    if isinstance(v, ObjectId):
+        return str(v)
+    if isinstance(v, datetime):
+        return v.isoformat()
+    raise TypeError(f"Object of type {type(v).__name__} is not JSON serializable")
+
+
+def _parse_bound(name: str, value: Optional[str]) -> Optional[str]:
+    """Validate an ISO date/datetime query parameter; returns it in the stored isoformat()."""
+    if value is None:
+        return None
+    try:
+        return datetime.fromisoformat(value).isoformat()
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"`{name}` must be ISO format (YYYY-MM-DD or full ISO).")
+
+
+def _range_query(field: str, start: Optional[str], end: Optional[str]) -> Dict[str, Any]:
+    bounds = {}
+    if start:
+        bounds["$gte"] = start
+    if end:
+        bounds["$lt"] = end
+    return {field: bounds} if bounds else {}
+
+
+def _timestamp_range_query(start: Optional[str], end: Optional[str]) -> Dict[str, Any]:
+    """Prediction timestamps are ISO strings (full records) or datetimes (compact records); match both."""
+    as_string = _range_query("timestamp", start, end)
+    if not as_string:
+        return {}
+    as_date = _range_query("timestamp", start and datetime.fromisoformat(start), end and datetime.fromisoformat(end))
+    return {"$or": [as_string, as_date]}
+
+
+def _iter_docs(collection, query: Dict[str, Any], sort_field: str, projection: Optional[Dict[str, int]],
+               batch_size: int, decode=None) -> Iterator[List[Dict[str, Any]]]:
+    """Yield lists of at most `batch_size` documents, following the server-side cursor; `decode` is applied per batch."""
+    cursor = collection.find(query, projection).sort([(sort_field, 1), ("_id", 1)]).batch_size(batch_size)
+    batch: List[Dict[str, Any]] = []
+    for doc in cursor:
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            yield decode(batch) if decode else batch
+            batch = []
+    if batch:
+        yield decode(batch) if decode else batch
+
+
+def _ndjson_stream(batches: Iterator[List[Dict[str, Any]]]) -> Iterator[str]:
+    for batch in batches:
+        yield "".join(json.dumps(d, default=_json_default, separators=(",", ":")) + "\n" for d in batch)
+
+
+def _csv_stream(batches: Iterator[List[Dict[str, Any]]], columns: List[str], row_fn) -> Iterator[str]:
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(columns)
+    yield buf.getvalue()
+    for batch in batches:
+        buf.seek(0)
+        buf.truncate()
+        writer.writerows(row_fn(d) for d in batch)
+        yield buf.getvalue()
+
+
+def _check_format(fmt: str):
+    if fmt not in MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail=f"`format` must be one of {list(MEDIA_TYPES)}")
+
+
+def _streaming_response(body: Iterator[str], fmt: str, filename: str) -> StreamingResponse:
+    return StreamingResponse(
+        body,
+        media_type=MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{fmt}"'},
+    )
+
+
+@router.get("/predictions")
+def export_predictions(
+    format: str = "ndjson",
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    model: Optional[str] = None,
+    house_id: Optional[str] = None,
+    include_features: bool = True,
+    batch_size: int = Query(1000, ge=1, le=10000),
+):
+    """
+    Stream prediction records in timestamp order.
+    Query params:
+      - format: "ndjson" (default) or "csv"
+      - start / end: ISO timestamps, start inclusive, end exclusive
+      - model, house_id: optional filters
+      - include_features: false drops the features vector
+      - batch_size: rows fetched and flushed per batch
+    CSV output expands `features` into one column per feature_order.json entry.
+    """
+    _check_format(format)
+    q = _timestamp_range_query(_parse_bound("start", start), _parse_bound("end", end))
+    if model:
+        q["model"] = model
+    if house_id:
+        q["house_id"] = house_id
+    projection = None if include_features else {"features": 0}
+    batches = _iter_docs(pred_col, q, "timestamp", record_codec.storage_projection(projection), batch_size,
+                         decode=record_codec.decode_many)
+
+    if format == "ndjson":
+        return _streaming_response(_ndjson_stream(batches), format, "predictions")
+
+    feature_names = (ai_service.get_feature_order() or []) if include_features else []
+    columns = ["_id", "house_id", "model", "model_version", "predicted_value_kwh", "timestamp", "meta"] + feature_names
+
+    def row(d):
+        out = [str(d.get("_id", "")), d.get("house_id"), d.get("model"), d.get("model_version"), d.get("predicted_value_kwh"),
+               _json_default(d["timestamp"]) if isinstance(d.get("timestamp"), datetime) else d.get("timestamp"),
+               json.dumps(d.get("meta") or {}, default=_json_default)]
+        if feature_names:
+            feats = list(d.get("features") or [])
+            out.extend((feats + [None] * len(feature_names))[:len(feature_names)])
+        return out
+
+    return _streaming_response(_csv_stream(batches, columns, row), format, "predictions")
+
+
+@router.get("/household")
+def export_household(
+    format: str = "ndjson",
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    house_id: Optional[str] = None,
+    batch_size: int = Query(1000, ge=1, le=10000),
+):
+    """
+    Stream household records in date order.
+    Query params:
+      - format: "ndjson" (default) or "csv"
+      - start / end: ISO dates, start inclusive, end exclusive
+      - house_id: optional filter
+      - batch_size: rows fetched and flushed per batch
+    CSV output keeps appliance_usage as a JSON column.
+    """
+    _check_format(format)
+    q = _range_query("date", _parse_bound("start", start), _parse_bound("end", end))
+    if house_id:
+        q["house_id"] = house_id
+    batches = _iter_docs(household_col, q, "date", None, batch_size)
+
+    if format == "ndjson":
+        return _streaming_response(_ndjson_stream(batches), format, "household")
+
+    columns = ["_id", "house_id", "date", "total_consumption_kwh", "appliance_usage"]
+
+    def row(d):
+        return [str(d.get("_id", "")), d.get("house_id"), d.get("date"), d.get("total_consumption_kwh"),
+                json.dumps(d.get("appliance_usage") or {})]
+
+    return _streaming_response(_csv_stream(batches, columns, row), format, "household")
@@ -0,0 +1,84 @@
+# routes/forecast_routes.py
+"""
+Horizon forecasts (next N months per house) built from stored household history.
+See services.forecast_service for the feature pipeline and caching.
+"""
+import traceback
+from typing import Dict, List, Optional
+
+from fastapi import APIRouter, HTTPException, Query
+from pydantic import BaseModel
+
+from services import forecast_service
+from services.ai_service import InferenceOverloaded, available_models
+
+router = APIRouter(prefix="/forecast", tags=["Forecast"])
+
+
+class ForecastIn(BaseModel):
+    model: str  # "linear", "rf", or "xgb"
+    house_ids: Optional[List[str]] = None  # None = every house with history
+    horizon: int = 12
+    version: Optional[str] = None  # pin a published model version
+    # feature values the history does not contain (TariffRate, SolarGeneration_kWh, City_code, ...)
+    profile: Dict[str, float] = {}
+    profiles: Dict[str, Dict[str, float]] = {}  # per-house overrides of `profile`
+    refresh: bool = True  # read household records added since the last forecast first
+
+
+def _run_forecast(model: str, **kwargs):
+    models = available_models()
+    if model not in models:
+        raise HTTPException(status_code=400, detail=f"Model '{model}' not available. Available: {list(models.keys())}")
+    try:
+        return forecast_service.forecast(model, **kwargs)
+    except InferenceOverloaded as e:
+        raise HTTPException(status_code=503, detail=f"Inference is saturated, retry later: {str(e)}",
+                            headers={"Retry-After": "1"})
+    except (KeyError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    except Exception as e:
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"Forecast error: {str(e)}")
+
+
+@router.post("/")
+def create_forecast(payload: ForecastIn):
+    """
+    Forecast `horizon` months after each house's last recorded month.
+    All houses and horizons are predicted as one batched matrix; houses without new
+    records since their last forecast (same model version, horizon and profile) are
+    served from the cache.
+    Response: {"model", "model_version", "horizon", "count", "recomputed", "cached",
+               "missing", "unfilled_features", "forecasts": [{"house_id", "last_month",
+               "months", "predicted_kwh"}, ...]}
+    """
+    return _run_forecast(
+        payload.model, house_ids=payload.house_ids, horizon=payload.horizon, version=payload.version,
+        profile=payload.profile, profiles=payload.profiles, refresh_history=payload.refresh,
+    )
+
+
+@router.get("/stats")
+def get_forecast_stats():
+    """Houses / months accumulated from history, cached forecasts and the ingest watermark."""
+    return forecast_service.stats()
+
+
+@router.post("/refresh")
+def refresh_history(full: bool = False):
+    """Read new household records now; full=true drops the accumulated state and rescans everything."""
+    if full:
+        forecast_service.reset()
+    return forecast_service.refresh()
+
+
+@router.get("/{house_id}")
+def get_house_forecast(house_id: str, model: str, horizon: int = Query(12, ge=1), version: Optional[str] = None):
+    """Forecast one house with the default profile."""
+    result = _run_forecast(model, house_ids=[house_id], horizon=horizon, version=version)
+    if not result["forecasts"]:
+        raise HTTPException(status_code=404, detail=f"No household history for house '{house_id}'")
+    return result
@@ -1,9 +1,14 @@
 # routes/household_routes.py
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, HTTPException, Query, Request, status
 from pydantic import BaseModel, Field, condecimal, constr
-from typing import Dict, Any
+from starlette.concurrency import run_in_threadpool
+from typing import Dict, Any, List, Optional
 from datetime import datetime
+import json
+import os
+import numpy as np
 from models.database import household_col
+from services import pagination, persistence, rollup_service
 from bson import ObjectId
 
 router = APIRouter(prefix="/household", tags=["Household"])
@@ -18,16 +23,20 @@ class HouseholdIn(BaseModel):
     total_consumption_kwh: float
 
 
+def _parse_date(value: str) -> datetime:
+    """Parse ISO-like YYYY-MM-DD or full ISO; raises ValueError if invalid."""
+    # first try full ISO, then date-only
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        return datetime.strptime(value, "%Y-%m-%d")
+
+
 @router.post("/", status_code=status.HTTP_201_CREATED)
 def create_record(payload: HouseholdIn):
     # validate date string (ISO-like YYYY-MM-DD or allow full ISO)
     try:
-        # try parsing common formats; raises ValueError if invalid
-        # first try full ISO, then date-only
-        try:
-            parsed = datetime.fromisoformat(payload.date)
-        except ValueError:
-            parsed = datetime.strptime(payload.date, "%Y-%m-%d")
+        parsed = _parse_date(payload.date)
     except Exception:
         raise HTTPException(status_code=400, detail="`date` must be ISO format (YYYY-MM-DD or full ISO).")
 
@@ -43,24 +52,244 @@ def create_record(payload: HouseholdIn):
     }
 
     try:
-        res = household_col.insert_one(doc)
+        inserted_id = persistence.save(household_col, doc)
+    except persistence.PersistenceBackpressure as e:
+        raise HTTPException(status_code=503, detail=f"Household store is busy, retry later: {e}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database insert failed: {e}")
 
-    return {"inserted_id": str(res.inserted_id)}
+    rollup_service.add_household(doc, inserted_id)
+    return {"inserted_id": inserted_id}
+
+
+# --- bulk ingestion ---
+BULK_MAX_ROWS = int(os.getenv("HOUSEHOLD_BULK_MAX_ROWS", "100000"))
+BULK_CHUNK_SIZE = int(os.getenv("HOUSEHOLD_BULK_CHUNK_SIZE", "1000"))
+# at most this many per-row errors are echoed back (the counts are always complete)
+BULK_MAX_REPORTED_ERRORS = 1000
+
+
+def _parse_bulk_body(body: bytes, content_type: str):
+    """
+    Return (rows, errors) from a JSON array or NDJSON body.
+    NDJSON lines that are not valid JSON become per-row errors instead of failing the request.
+    """
+    text = body.decode("utf-8")
+    if "ndjson" in content_type or "jsonlines" in content_type:
+        rows, errors = [], []
+        for line in text.splitlines():
+            if not line.strip():
+                continue
+            try:
+                rows.append(json.loads(line))
+            except ValueError as e:
+                errors.append({"row": len(rows), "error": f"invalid JSON: {e}"})
+                rows.append(None)
+        return rows, errors
+    data = json.loads(text)
+    if isinstance(data, dict) and isinstance(data.get("records"), list):
+        data = data["records"]
+    if not isinstance(data, list):
+        raise ValueError("Body must be a JSON array of records, {\"records\": [...]}, or NDJSON.")
+    return data, []
+
+
+def _as_number(v) -> float:
+    if isinstance(v, bool) or v is None:
+        return np.nan
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def validate_records(rows: List[Any]):
+    """
+    Validate a batch of raw household records in one pass.
+
+    Dates are parsed once per distinct string (daily meter readings share few dates),
+    and all numeric checks (total_consumption_kwh and every appliance_usage value) run
+    as NumPy array operations over the whole batch instead of per-row Python loops.
+
+    Returns (docs, doc_rows, errors): the valid documents, the input row index of each
+    document, and a list of {"row", "error"} for invalid rows.
+    """
+    n = len(rows)
+    errors: Dict[int, str] = {}
+    house_ids: List[Any] = [None] * n
+    dates: List[Any] = [None] * n
+    usages: List[Dict[str, Any]] = [{}] * n
+    totals = np.full(n, np.nan)
+
+    # structural checks + flattening of appliance_usage for the vectorized pass
+    usage_values: List[float] = []
+    usage_rows: List[int] = []
+    for i, r in enumerate(rows):
+        if not isinstance(r, dict):
+            errors[i] = "record must be a JSON object"
+            continue
+        hid = r.get("house_id")
+        if not isinstance(hid, str) or not hid.strip():
+            errors[i] = "`house_id` must be a non-empty string"
+            continue
+        house_ids[i] = hid.strip()
+        date_value = r.get("date")
+        if not isinstance(date_value, str):
+            errors[i] = "`date` must be ISO format (YYYY-MM-DD or full ISO)."
+            continue
+        dates[i] = date_value.strip()
+        usage = r.get("appliance_usage")
+        if not isinstance(usage, dict):
+            errors[i] = "`appliance_usage` must be an object of appliance -> usage"
+            continue
+        usages[i] = usage
+        usage_values.extend(_as_number(v) for v in usage.values())
+        usage_rows.extend([i] * len(usage))
+        totals[i] = _as_number(r.get("total_consumption_kwh"))
+
+    # numeric validation over the whole batch
+    bad_total = ~np.isfinite(totals)
+    if usage_values:
+        values = np.asarray(usage_values, dtype=np.float64)
+        bad_value = ~np.isfinite(values) | (values < 0)
+        bad_usage = np.bincount(np.asarray(usage_rows)[bad_value], minlength=n) > 0
+    else:
+        bad_usage = np.zeros(n, dtype=bool)
+    for i in np.flatnonzero(bad_usage):
+        errors.setdefault(int(i), "All appliance_usage values must be non-negative numbers.")
+    for i in np.flatnonzero(bad_total):
+        errors.setdefault(int(i), "`total_consumption_kwh` must be a number.")
+
+    # dates: parse each distinct string once
+    parsed_dates: Dict[str, Optional[str]] = {}
+    for d in set(d for i, d in enumerate(dates) if d is not None and i not in errors):
+        try:
+            parsed_dates[d] = _parse_date(d).isoformat()
+        except ValueError:
+            parsed_dates[d] = None
+
+    docs, doc_rows = [], []
+    for i in range(n):
+        if i in errors:
+            continue
+        iso = parsed_dates.get(dates[i])
+        if iso is None:
+            errors[i] = "`date` must be ISO format (YYYY-MM-DD or full ISO)."
+            continue
+        docs.append({
+            "house_id": house_ids[i],
+            "date": iso,
+            "appliance_usage": {str(k): float(v) for k, v in usages[i].items()},
+            "total_consumption_kwh": float(totals[i]),
+        })
+        doc_rows.append(i)
+
+    return docs, doc_rows, [{"row": i, "error": errors[i]} for i in sorted(errors)]
+
+
+def ingest_records(rows: List[Any]) -> Dict[str, Any]:
+    """
+    Validate `rows` and write the valid ones with unordered insert_many in chunks of
+    BULK_CHUNK_SIZE. Invalid rows and rows rejected by the database are reported
+    individually; they never fail the rest of the batch.
+    """
+    docs, doc_rows, errors = validate_records(rows)
+    inserted = 0
+    for start in range(0, len(docs), BULK_CHUNK_SIZE):
+        chunk = docs[start:start + BULK_CHUNK_SIZE]
+        try:
+            res = household_col.insert_many(chunk, ordered=False)
+            inserted += len(res.inserted_ids)
+            rollup_service.add_households(chunk, res.inserted_ids)
+        except Exception as e:
+            details = getattr(e, "details", None) or {}
+            write_errors = details.get("writeErrors")
+            if write_errors is None:
+                # whole chunk failed (e.g. connection error)
+                errors.extend({"row": doc_rows[start + j], "error": f"Database insert failed: {e}"}
+                              for j in range(len(chunk)))
+                continue
+            inserted += int(details.get("nInserted", len(chunk) - len(write_errors)))
+            # insert_many set `_id` on every document it was given
+            failed = {int(w["index"]) for w in write_errors}
+            stored = [d for j, d in enumerate(chunk) if j not in failed and "_id" in d]
+            rollup_service.add_households(stored, [d["_id"] for d in stored])
+            errors.extend({"row": doc_rows[start + int(w["index"])], "error": w.get("errmsg", "write error")}
+                          for w in write_errors)
+
+    errors.sort(key=lambda e: e["row"])
+    return {
+        "received": len(rows),
+        "inserted": inserted,
+        "failed": len(errors),
+        "errors": errors[:BULK_MAX_REPORTED_ERRORS],
+    }
+
+
+@router.post("/bulk")
+async def create_records_bulk(request: Request):
+    """
+    Ingest many household records in one request.
+    Body: a JSON array of HouseholdIn-shaped objects (or {"records": [...]}), or NDJSON
+    with Content-Type: application/x-ndjson.
+    Response: {"received", "inserted", "failed", "errors": [{"row", "error"}, ...]}
+    Rows are validated as a batch; invalid rows are reported and skipped.
+    """
+    body = await request.body()
+    try:
+        rows, parse_errors = _parse_bulk_body(body, request.headers.get("content-type", ""))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Could not parse body: {e}")
+    if len(rows) > BULK_MAX_ROWS:
+        raise HTTPException(status_code=413, detail=f"Too many records: {len(rows)} (max {BULK_MAX_ROWS}).")
+
+    result = await run_in_threadpool(ingest_records, rows)
+    if parse_errors:
+        # unparsable NDJSON lines were passed through as None; report the JSON error instead
+        by_row = {e["row"]: e for e in parse_errors}
+        result["errors"] = sorted(
+            [by_row.get(e["row"], e) for e in result["errors"]], key=lambda e: e["row"]
+        )
+    return result
+
+
+HOUSE_SORT = [("date", 1), ("_id", 1)]
+HOUSE_FIELDS = {"_id", "house_id", "date", "appliance_usage", "total_consumption_kwh"}
 
 
 @router.get("/{house_id}")
-def get_by_house(house_id: str):
+def get_by_house(
+    house_id: str,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+):
+    """
+    Return a house's records in date order, one page at a time.
+    Query params:
+      - limit: page size (default 100, max 1000)
+      - cursor: `next_cursor` from the previous page
+      - fields: comma-separated projection, e.g. "date,total_consumption_kwh"
+    Response: {"data": [...], "next_cursor": str or null}
+    """
+    sort_fields = [f for f, _ in HOUSE_SORT]
     try:
-        docs = list(household_col.find({"house_id": house_id}))
+        projection = pagination.build_projection(fields, HOUSE_FIELDS, required=sort_fields)
+        requested = {f.strip() for f in fields.split(",")} if fields else set(sort_fields)
+        docs, next_cursor = pagination.paginate(
+            household_col, {"house_id": house_id}, HOUSE_SORT, limit, cursor=cursor,
+            projection=projection, hidden=[f for f in sort_fields if f not in requested],
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database query failed: {e}")
 
     # convert ObjectId to string and remove mongodb internals if desired
     out = []
     for d in docs:
-        d["_id"] = str(d.get("_id", ""))
+        if "_id" in d:
+            d["_id"] = str(d["_id"])
         out.append(d)
 
-    return {"data": out}
+    return {"data": out, "next_cursor": next_cursor}
@@ -1,122 +1,307 @@
 # routes/prediction_routes.py
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, Response
 from pydantic import BaseModel
-from typing import List, Dict, Any, Optional
+from starlette.concurrency import run_in_threadpool
+from typing import Callable, List, Dict, Any, Optional
 from datetime import datetime
 import traceback
 import os
 import json
+import time
 
 # import service functions
-from services.ai_service import predict, available_models
+from services.ai_service import predict, predict_batch, available_models
 import services.ai_service as ai_service
+from services import (drift_monitor, fast_validation, feature_builder, metrics, pagination, persistence,
+                      record_codec, rollup_service)
 
 # database collection (existing in repo)
 from models.database import pred_col
 
 router = APIRouter(prefix="/predict", tags=["Prediction"])
 
+# upper bound on rows accepted by POST /predict/batch in a single call
+MAX_BATCH_ROWS = int(os.getenv("PREDICT_BATCH_MAX_ROWS", "50000"))
+
+# Cache-Control max-age (seconds) for metadata endpoints; 0 = browsers revalidate with If-None-Match
+METADATA_MAX_AGE = int(os.getenv("METADATA_MAX_AGE", "0"))
+
+# feature_order.json next to the backend package (see get_feature_order_endpoint)
+_FEATURE_ORDER_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "feature_order.json")
+_feature_order_file = ai_service.MetadataFile(lambda: _FEATURE_ORDER_PATH, ai_service._parse_feature_order)
+
+
+def _cached_json(request: Request, content, etag: Optional[str]):
+    """
+    JSONResponse with ETag / Cache-Control headers, or an empty 304 when the
+    client's If-None-Match already carries the current ETag.
+    """
+    if not etag:
+        return JSONResponse(content=content, headers={"Cache-Control": "no-cache"})
+    quoted = f'"{etag}"'
+    headers = {"ETag": quoted, "Cache-Control": f"public, max-age={METADATA_MAX_AGE}, must-revalidate"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        tags = [t.strip().removeprefix("W/") for t in if_none_match.split(",")]
+        if quoted in tags or "*" in tags:
+            return Response(status_code=304, headers=headers)
+    return JSONResponse(content=content, headers=headers)
+
 
 # --- route: return feature order used for training ---
 @router.get("/feature_order")
-def get_feature_order_endpoint():
+def get_feature_order_endpoint(request: Request):
     """
     Return the feature_order list used when training models.
     The file is expected at AIRES_Backend/data/feature_order.json
     Format accepted: {"feature_order": [...]} or a plain list.
+    The parsed file is cached until its mtime changes; responses carry an ETag so
+    repeat fetches with If-None-Match get a 304.
     """
-    # path relative to this file: routes/ -> AIRES_Backend
-    base_dir = os.path.dirname(os.path.dirname(__file__))
-    path = os.path.join(base_dir, "data", "feature_order.json")
+    feature_order, etag = _feature_order_file.get()
+    if feature_order is None:
+        if not os.path.exists(_FEATURE_ORDER_PATH):
+            # helpful error for debugging
+            raise HTTPException(status_code=404, detail=f"feature_order.json not found at {_FEATURE_ORDER_PATH}")
+        raise HTTPException(status_code=500, detail="feature_order.json could not be read or has unexpected format")
 
-    if not os.path.exists(path):
-        # helpful error for debugging
-        raise HTTPException(status_code=404, detail=f"feature_order.json not found at {path}")
+    # normalize response: return dict with key "feature_order"
+    return _cached_json(request, {"feature_order": feature_order}, etag)
 
+
+@router.get("/validation_rules")
+def get_validation_rules_endpoint(request: Request):
+    """Return the numeric limits from validation_rules.json in MODEL_DIR (cached, with ETag)."""
+    rules, etag = ai_service.get_validation_rules_with_etag()
+    if rules is None:
+        raise HTTPException(status_code=404, detail="validation_rules.json not found or invalid")
+    return _cached_json(request, {"validation_rules": rules}, etag)
+
+
+class FeatureBuildIn(BaseModel):
+    records: List[Dict[str, Any]]
+
+
+@router.post("/features/build")
+def build_features(payload: FeatureBuildIn):
+    """
+    Turn named raw inputs into ordered feature vectors (the same builder `inputs` /
+    `records` on /predict/ and /predict/batch use), e.g. to check what a client sends.
+    Response: {"feature_order": [...], "features": [[...], ...]}
+    """
+    if len(payload.records) > MAX_BATCH_ROWS:
+        raise HTTPException(status_code=400, detail=f"Batch too large: {len(payload.records)} rows (max {MAX_BATCH_ROWS}).")
     try:
-        with open(path, "r") as fh:
-            payload = json.load(fh)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to read feature_order.json: {e}")
+        builder = feature_builder.builder()
+        return {"feature_order": builder.feature_order, "features": builder.build(payload.records).tolist()}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/cache/stats")
+def get_cache_stats():
+    """Prediction cache counters: hits, misses, evictions, expirations, invalidations, size."""
+    return {"prediction_cache": ai_service.prediction_cache_stats()}
+
+
+@router.get("/executor/stats")
+def get_executor_stats():
+    """Inference executor mode (inline / process) and the process pool's in-flight, completed and shed counts."""
+    return ai_service.inference_pool_stats()
 
-    # normalize response: return dict with key "feature_order"
-    if isinstance(payload, dict) and "feature_order" in payload:
-        return {"feature_order": payload["feature_order"]}
-    elif isinstance(payload, list):
-        return {"feature_order": payload}
-    else:
-        raise HTTPException(status_code=500, detail="feature_order.json has unexpected format")
+
+@router.post("/cache/clear")
+def clear_cache():
+    """Drop every cached prediction."""
+    ai_service.clear_prediction_cache()
+    return {"prediction_cache": ai_service.prediction_cache_stats()}
+
+
+@router.post("/metadata/reload")
+def reload_metadata():
+    """Drop cached feature order, validation rules and model listing so they are re-read on next use."""
+    ai_service.reload_metadata()
+    _feature_order_file.invalidate()
+    feature_builder.reload()
+    fast_validation.invalidate()
+    drift_monitor.invalidate()
+    return {"reloaded": True}
 
 
 # --- new route: history (recent predictions) ---
+HISTORY_SORT = [("timestamp", -1), ("_id", -1)]
+HISTORY_FIELDS = {"_id", "house_id", "model", "model_version", "predicted_value_kwh", "features", "meta", "timestamp"}
+
+
 @router.get("/history")
-def get_history(limit: int = Query(50, ge=1, le=1000), model: Optional[str] = None):
+def get_history(
+    limit: int = Query(50, ge=1, le=1000),
+    model: Optional[str] = None,
+    house_id: Optional[str] = None,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    include_features: bool = True,
+):
     """
     Return recent prediction records from the DB.
     Query params:
       - limit: maximum number of records to return (default 50)
       - model: optional model key to filter (e.g., 'xgb', 'rf', 'linear')
-    Response: {"history": [ ...records... ]}
-    Records are sorted newest-first.
+      - house_id: optional house filter
+      - cursor: `next_cursor` from the previous page (keyset pagination)
+      - fields: comma-separated projection, e.g. "house_id,predicted_value_kwh"
+      - include_features: set false to omit the `features` array
+    Response: {"history": [ ...records... ], "next_cursor": str or null}
+    Records are sorted newest-first; next_cursor is null on the last page.
     """
+    q = {}
+    if model:
+        q["model"] = model
+    if house_id:
+        q["house_id"] = house_id
+
+    sort_fields = [f for f, _ in HISTORY_SORT]
     try:
-        q = {}
-        if model:
-            q["model"] = model
-        cursor = pred_col.find(q).sort("timestamp", -1).limit(limit)
-        docs = []
-        for d in cursor:
-            # convert ObjectId and ensure JSON serializable fields
-            if "_id" in d:
-                d["_id"] = str(d["_id"])
-            docs.append(d)
-        return {"history": docs}
+        projection = pagination.build_projection(
+            fields, HISTORY_FIELDS, required=sort_fields,
+            exclude=[] if include_features else ["features"],
+        )
+        requested = {f.strip() for f in fields.split(",")} if fields else set(sort_fields)
+        # compact records keep their features in other fields and timestamps as datetimes
+        docs, next_cursor = pagination.paginate(
+            pred_col, q, HISTORY_SORT, limit, cursor=cursor, projection=record_codec.storage_projection(projection),
+            hidden=[f for f in sort_fields if f not in requested], mixed_types=["timestamp"],
+        )
+        record_codec.decode_many(docs)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Failed to read history: {e}")
 
+    for d in docs:
+        # convert ObjectId and ensure JSON serializable fields
+        if "_id" in d:
+            d["_id"] = str(d["_id"])
+    return {"history": docs, "next_cursor": next_cursor}
+
 
 class PredictIn(BaseModel):
     house_id: str
     model: str  # "linear", "rf", or "xgb"
-    features: List[float]
+    features: Optional[List[float]] = None  # in training feature order; or send `inputs`
+    inputs: Optional[Dict[str, Any]] = None  # named raw inputs, see services.feature_builder
     meta: Optional[Dict[str, Any]] = {}
+    version: Optional[str] = None  # pin a published model version (GET /predict/models/versions)
 
 
 @router.get("/models")
-def get_models():
-    """Return available model keys and labels."""
+def get_models(request: Request):
+    """Return available model keys and labels (with ETag / Cache-Control)."""
     try:
         models = available_models()
-        return {"models": models}
+        return _cached_json(request, {"models": models}, ai_service.available_models_etag())
     except Exception as e:
         # unexpected error while fetching available models
         raise HTTPException(status_code=500, detail=f"Error retrieving models: {str(e)}")
 
 
-@router.post("/")
-def get_prediction(payload: PredictIn):
-    # validate model exists
-    models = available_models()
-    if payload.model not in models:
-        raise HTTPException(
-            status_code=400,
-            detail=f"Model '{payload.model}' not available. Available: {list(models.keys())}"
-        )
+@router.get("/models/versions")
+def get_model_versions():
+    """Published versions per model (manifest.json), the version each model is served with, and the last reload."""
+    try:
+        return ai_service.list_model_versions()
+    except ValueError as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-    # validate features: must be list
-    if not isinstance(payload.features, list):
-        raise HTTPException(status_code=400, detail="`features` must be a list of numeric values in training feature order.")
 
-    # convert features to floats and validate numeric
+@router.post("/models/reload")
+def reload_models(wait: bool = False):
+    """
+    Load changed model versions in the background and swap them in atomically.
+    Requests keep being served by the current versions until each new one is
+    loaded and warmed up. wait=true blocks until the reload finished and returns its report.
+    """
+    return ai_service.reload_models(wait=wait)
+
+
+def _instrumented(route: str, model: str, response: Response, handler: Callable[[str], Any],
+                  label: Optional[str] = None):
+    """
+    Run a prediction handler with request / error counters, latency histogram and
+    per-stage timings (services.metrics); with METRICS_DEBUG_TIMINGS=1 the stage
+    timings are returned in a Server-Timing header. Callers that already checked
+    the model pass it as `label`.
+    """
+    # label values must stay bounded: model keys not being served share one series
+    if label is None:
+        label = model if model in available_models() else "unknown"
+    timings = metrics.begin_timings()
+    t0 = time.perf_counter()
+    status = 200
     try:
-        features_list = [float(x) for x in payload.features]
-    except Exception:
-        raise HTTPException(status_code=400, detail="All feature values must be numeric and convertible to float.")
+        return handler(label)
+    except HTTPException as e:
+        status = e.status_code
+        # HTTPExceptions raised in an `except` block keep the original error as __context__
+        cause = e.__context__
+        metrics.PREDICT_ERRORS.inc(route=route, model=label,
+                                   exception=type(cause).__name__ if cause is not None else "HTTPException")
+        raise
+    except Exception as e:
+        status = 500
+        metrics.PREDICT_ERRORS.inc(route=route, model=label, exception=type(e).__name__)
+        raise
+    finally:
+        metrics.PREDICT_REQUEST_SECONDS.observe(time.perf_counter() - t0, route=route, model=label)
+        metrics.PREDICT_REQUESTS.inc(route=route, model=label, status=str(status))
+        if metrics.DEBUG_TIMINGS:
+            response.headers["Server-Timing"] = metrics.server_timing(timings)
+        metrics.end_timings()
+
+
+@router.post("/")
+def get_prediction(payload: PredictIn, response: Response):
+    return _instrumented("/predict/", payload.model, response, lambda label: _predict_one(payload, label))
+
+
+def _predict_one(payload: PredictIn, label: str):
+    with metrics.stage("validate", label):
+        # validate model exists
+        models = available_models()
+        if payload.model not in models:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Model '{payload.model}' not available. Available: {list(models.keys())}"
+            )
+
+        if (payload.features is None) == (payload.inputs is None):
+            raise HTTPException(status_code=400, detail="Send either `features` (ordered vector) or `inputs` (named raw inputs).")
+
+        if payload.inputs is None:
+            # validate features: must be list
+            if not isinstance(payload.features, list):
+                raise HTTPException(status_code=400, detail="`features` must be a list of numeric values in training feature order.")
+
+            # convert features to floats and validate numeric
+            try:
+                features_list = [float(x) for x in payload.features]
+            except Exception:
+                raise HTTPException(status_code=400, detail="All feature values must be numeric and convertible to float.")
+
+    if payload.inputs is not None:
+        # ordered vector built server-side from the named inputs
+        try:
+            with metrics.stage("feature_build", label):
+                features_list = feature_builder.build_features([payload.inputs])[0].tolist()
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
 
     # optional: check feature length against feature_order.json if available
     try:
-        feature_order = ai_service.get_feature_order()  # should return list or None
+        with metrics.stage("feature_order", label):
+            feature_order = ai_service.get_feature_order()  # should return list or None
     except Exception:
         feature_order = None
 
@@ -128,9 +313,18 @@ def get_prediction(payload: PredictIn):
                 detail=f"Feature vector length mismatch: expected {expected_len} features in order {feature_order}."
             )
 
+    return _score_and_save(label, payload.house_id, payload.model, features_list, payload.meta, payload.version)
+
+
+def _score_and_save(label: str, house_id: str, model: str, features_list: List[float],
+                    meta: Optional[Dict[str, Any]], version: Optional[str]):
+    """Predict one validated vector and persist the prediction record (shared by /predict/ and /predict/fast)."""
     # perform prediction
     try:
-        value = predict(payload.model, features_list)
+        value = predict(model, features_list, version=version)
+    except ai_service.InferenceOverloaded as e:
+        raise HTTPException(status_code=503, detail=f"Inference is saturated, retry later: {str(e)}",
+                            headers={"Retry-After": "1"})
     except FileNotFoundError as e:
         # model file missing or incorrect path
         raise HTTPException(status_code=500, detail=str(e))
@@ -141,26 +335,202 @@ def get_prediction(payload: PredictIn):
         # generic prediction error
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Prediction error: {str(e)}")
+    drift_monitor.observe(model, features_list, value)
 
     # build record for persistence
     record = {
-        "house_id": payload.house_id,
-        "model": payload.model,
+        "house_id": house_id,
+        "model": model,
+        "model_version": version or ai_service.active_version(model),
         "predicted_value_kwh": value,
         "features": features_list,
-        "meta": payload.meta or {},
+        "meta": meta or {},
         "timestamp": datetime.utcnow().isoformat()
     }
 
-    # insert record into DB collection (if pred_col available)
+    # insert record into DB collection (if pred_col available);
+    # with PERSIST_MODE=async this only queues the write and returns immediately
     try:
-        res = pred_col.insert_one(record)
         # attach inserted id for client
-        record["_id"] = str(res.inserted_id)
+        with metrics.stage("db_insert", label):
+            record["_id"] = persistence.save(pred_col, record_codec.to_storage(record))
+    except persistence.PersistenceBackpressure as e:
+        raise HTTPException(status_code=503, detail=f"Prediction store is busy, retry later: {str(e)}")
     except Exception as e:
         # log error but still return prediction (or decide to fail)
         # Here, we return a 500 so caller knows persistence failed.
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Failed to save prediction record: {str(e)}")
+    rollup_service.add_prediction(record, record["_id"])
 
     return record
+
+
+@router.post("/fast")
+async def get_prediction_fast(request: Request):
+    """
+    Same request and response as POST /predict/ (with `features`), on a lighter path:
+    no pydantic model and no response encoding pass. The body is decoded into a
+    float64 buffer and checked against the cached feature count, served models and
+    value ranges from validation_rules.json (services.fast_validation), so
+    out-of-range vectors get a 400 before inference. Only the body is read on the
+    event loop; validation (which may re-read the metadata files), scoring and
+    persistence run on the threadpool.
+    """
+    body = await request.body()
+    timing = Response()  # collects the Server-Timing header set by _instrumented
+    record = await run_in_threadpool(_predict_fast, body, timing)
+    out = Response(content=json.dumps(record, separators=(",", ":")), media_type="application/json")
+    if "server-timing" in timing.headers:
+        out.headers["Server-Timing"] = timing.headers["server-timing"]
+    return out
+
+
+def _predict_fast(body: bytes, timing: Response):
+    route = "/predict/fast"
+    t0 = time.perf_counter()
+    try:
+        payload, features_list = fast_validation.parse_predict(body)
+    except fast_validation.RequestError as e:
+        metrics.PREDICT_ERRORS.inc(route=route, model="unknown", exception="RequestError")
+        metrics.PREDICT_REQUESTS.inc(route=route, model="unknown", status="400")
+        raise HTTPException(status_code=400, detail=str(e))
+    model = payload["model"]
+    metrics.observe_stage("validate", model, time.perf_counter() - t0)
+    return _instrumented(
+        route, model, timing,
+        lambda label: _score_and_save(label, payload["house_id"], model, features_list,
+                                      payload.get("meta"), payload.get("version")),
+        model,
+    )
+
+
+class PredictBatchIn(BaseModel):
+    model: str  # "linear", "rf", or "xgb"
+    house_ids: List[str]
+    features: Optional[List[List[float]]] = None  # one row per house_id, in training feature order
+    records: Optional[List[Dict[str, Any]]] = None  # or one named raw-input record per house_id
+    meta: Optional[Dict[str, Any]] = {}
+    persist: bool = True
+    version: Optional[str] = None  # pin a published model version
+
+
+@router.post("/batch")
+def get_batch_prediction(payload: PredictBatchIn, response: Response):
+    """
+    Predict many feature vectors in one call.
+    All rows go through ai_service as a single (n, n_features) matrix, so the
+    scaler and the model each run once per batch.
+    Response: {"model": ..., "count": n, "predictions": [{"house_id", "predicted_value_kwh"}, ...]}
+    """
+    return _instrumented("/predict/batch", payload.model, response, lambda label: _predict_many(payload, label))
+
+
+def _predict_many(payload: PredictBatchIn, label: str):
+    with metrics.stage("validate", label):
+        models = available_models()
+        if payload.model not in models:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Model '{payload.model}' not available. Available: {list(models.keys())}"
+            )
+
+        if (payload.features is None) == (payload.records is None):
+            raise HTTPException(status_code=400, detail="Send either `features` (ordered vectors) or `records` (named raw inputs).")
+        field = "features" if payload.features is not None else "records"
+        n_rows = len(payload.features if payload.features is not None else payload.records)
+        if n_rows == 0:
+            raise HTTPException(status_code=400, detail=f"`{field}` must contain at least one row.")
+        if n_rows > MAX_BATCH_ROWS:
+            raise HTTPException(status_code=400, detail=f"Batch too large: {n_rows} rows (max {MAX_BATCH_ROWS}).")
+        if len(payload.house_ids) != n_rows:
+            raise HTTPException(
+                status_code=400,
+                detail=f"`house_ids` has {len(payload.house_ids)} entries but `{field}` has {n_rows} rows."
+            )
+
+    if payload.records is not None:
+        # one vectorised pass over all records; the built matrix is already in feature order
+        try:
+            with metrics.stage("feature_build", label):
+                rows = feature_builder.build_features(payload.records)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return _finish_batch(payload, label, rows, rows.tolist())
+
+    try:
+        with metrics.stage("feature_order", label):
+            feature_order = ai_service.get_feature_order()
+    except Exception:
+        feature_order = None
+
+    if feature_order:
+        expected_len = len(feature_order)
+        bad = [i for i, row in enumerate(payload.features) if len(row) != expected_len]
+        if bad:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Feature vector length mismatch at rows {bad[:20]}: expected {expected_len} features in order {feature_order}."
+            )
+    return _finish_batch(payload, label, payload.features, payload.features)
+
+
+def _finish_batch(payload: PredictBatchIn, label: str, rows, features_lists: List[List[float]]):
+    n_rows = len(features_lists)
+    try:
+        values = predict_batch(payload.model, rows, version=payload.version)
+    except ai_service.InferenceOverloaded as e:
+        raise HTTPException(status_code=503, detail=f"Inference is saturated, retry later: {str(e)}",
+                            headers={"Retry-After": "1"})
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    except KeyError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"Prediction error: {str(e)}")
+    drift_monitor.observe_many(payload.model, rows, values)
+
+    timestamp = datetime.utcnow().isoformat()
+    predictions = [
+        {"house_id": house_id, "predicted_value_kwh": value}
+        for house_id, value in zip(payload.house_ids, values)
+    ]
+
+    model_version = payload.version or ai_service.active_version(payload.model)
+    inserted = 0
+    if payload.persist:
+        meta = payload.meta or {}
+        records = [
+            {
+                "house_id": house_id,
+                "model": payload.model,
+                "model_version": model_version,
+                "predicted_value_kwh": value,
+                "features": features_list,
+                "meta": meta,
+                "timestamp": timestamp,
+            }
+            for house_id, value, features_list in zip(payload.house_ids, values, features_lists)
+        ]
+        try:
+            with metrics.stage("db_insert", label):
+                ids = persistence.save_many(pred_col, record_codec.to_storage_many(records, rows))
+            inserted = len(ids)
+        except persistence.PersistenceBackpressure as e:
+            raise HTTPException(status_code=503, detail=f"Prediction store is busy, retry later: {str(e)}")
+        except Exception as e:
+            traceback.print_exc()
+            raise HTTPException(status_code=500, detail=f"Failed to save prediction records: {str(e)}")
+        rollup_service.add_predictions(records, ids)
+
+    return {
+        "model": payload.model,
+        "model_version": model_version,
+        "count": n_rows,
+        "inserted": inserted,
+        "timestamp": timestamp,
+        "predictions": predictions,
+    }
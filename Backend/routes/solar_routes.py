@@ -1,42 +1,171 @@
-# routes/solar_routes.py
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
-from typing import Optional
-
-router = APIRouter(prefix="/api/solar", tags=["Solar"])
-
-class SolarIn(BaseModel):
-    daily_kwh: float
-    sun_hours: float
-    panel_watt: float
-    efficiency: Optional[float] = 0.75   # optional override
-
-class SolarOut(BaseModel):
-    panels_required: int
-    estimated_daily_generation_kwh: float
-    panel_daily_wh: float
-    daily_kwh: float
-    sun_hours: float
-    panel_watt: float
-
-@router.post("/", response_model=SolarOut)
-def calc_solar(payload: SolarIn):
-    if payload.daily_kwh <= 0 or payload.sun_hours <= 0 or payload.panel_watt <= 0:
-        raise HTTPException(status_code=400, detail="daily_kwh, sun_hours and panel_watt must be > 0")
-
-    needed_wh = payload.daily_kwh * 1000.0
-    panel_daily_wh = payload.panel_watt * payload.sun_hours * payload.efficiency
-    if panel_daily_wh <= 0:
-        raise HTTPException(status_code=400, detail="panel_daily_wh computed as zero or negative")
-
-    panels_required = int((needed_wh + panel_daily_wh - 1) // panel_daily_wh)  # ceil integer
-    estimated_daily_generation_kwh = (panel_daily_wh * panels_required) / 1000.0
-
-    return SolarOut(
-        panels_required=panels_required,
-        estimated_daily_generation_kwh=round(estimated_daily_generation_kwh, 4),
-        panel_daily_wh=round(panel_daily_wh, 2),
-        daily_kwh=payload.daily_kwh,
-        sun_hours=payload.sun_hours,
-        panel_watt=payload.panel_watt
-    )
+# routes/solar_routes.py
+import csv
+import io
+import json
+from typing import Iterator, List, Optional
+
+import numpy as np
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+from services import solar_service
+
+router = APIRouter(prefix="/api/solar", tags=["Solar"])
+
+class SolarIn(BaseModel):
+    daily_kwh: float
+    sun_hours: float
+    panel_watt: float
+    efficiency: Optional[float] = 0.75   # optional override
+
+class SolarOut(BaseModel):
+    panels_required: int
+    estimated_daily_generation_kwh: float
+    panel_daily_wh: float
+    daily_kwh: float
+    sun_hours: float
+    panel_watt: float
+
+@router.post("/", response_model=SolarOut)
+def calc_solar(payload: SolarIn):
+    if payload.daily_kwh <= 0 or payload.sun_hours <= 0 or payload.panel_watt <= 0:
+        raise HTTPException(status_code=400, detail="daily_kwh, sun_hours and panel_watt must be > 0")
+
+    needed_wh = payload.daily_kwh * 1000.0
+    panel_daily_wh = payload.panel_watt * payload.sun_hours * payload.efficiency
+    if panel_daily_wh <= 0:
+        raise HTTPException(status_code=400, detail="panel_daily_wh computed as zero or negative")
+
+    panels_required = int((needed_wh + panel_daily_wh - 1) // panel_daily_wh)  # ceil integer
+    estimated_daily_generation_kwh = (panel_daily_wh * panels_required) / 1000.0
+
+    return SolarOut(
+        panels_required=panels_required,
+        estimated_daily_generation_kwh=round(estimated_daily_generation_kwh, 4),
+        panel_daily_wh=round(panel_daily_wh, 2),
+        daily_kwh=payload.daily_kwh,
+        sun_hours=payload.sun_hours,
+        panel_watt=payload.panel_watt
+    )
+
+
+# --- what-if sweep over households x sun_hours x panel_watt x efficiency ---
+SWEEP_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+SWEEP_COLUMNS = ["house_id", "daily_kwh", "sun_hours", "panel_watt", "efficiency", "panels_required",
+                 "estimated_daily_generation_kwh", "panel_daily_wh", "installed_w"]
+
+
+class SolarHousehold(BaseModel):
+    house_id: Optional[str] = None
+    daily_kwh: float
+
+
+class SolarSweepIn(BaseModel):
+    households: List[SolarHousehold]
+    sun_hours: List[float]
+    panel_watt: List[float]
+    efficiency: List[float] = [0.75]
+    mode: str = "grid"        # "grid": every combination; "pareto": non-dominated panel options per site
+    format: str = "ndjson"    # "ndjson" or "csv"
+
+
+def _formatted(values, fn=repr) -> np.ndarray:
+    """Object array of preformatted strings, so repeated axis values are formatted once."""
+    out = np.empty(len(values), dtype=object)
+    out[:] = [fn(v) for v in values]
+    return out
+
+
+def _sweep_rows(house_ids: np.ndarray, daily_kwh: np.ndarray, sun_hours: np.ndarray,
+                panel_watt: np.ndarray, efficiency: np.ndarray, pareto: bool) -> Iterator[List[tuple]]:
+    """
+    Yield lists of result rows (SWEEP_COLUMNS order, values already formatted as
+    strings), household chunk by household chunk. `house_ids` holds the encoded ids.
+    Floats use repr(), as json.dumps and csv do; the generation and panel output are
+    rounded like the single route's response.
+    """
+    s, w, e = len(sun_hours), len(panel_watt), len(efficiency)
+    per_house = s * w * e
+    step = max(1, solar_service.SWEEP_CHUNK_CELLS // per_house)
+    sun_s, watt_s, eff_s = _formatted(sun_hours.tolist()), _formatted(panel_watt.tolist()), _formatted(efficiency.tolist())
+    pdw_s = None
+    for start in range(0, len(daily_kwh), step):
+        kwh = daily_kwh[start:start + step]
+        grid = solar_service.size_grid(kwh, sun_hours, panel_watt, efficiency)
+        if pdw_s is None:
+            pdw_s = _formatted(grid["panel_daily_wh"].ravel().tolist(), lambda v: repr(round(v, 2))).reshape(s, w, e)
+        panels = grid["panels_required"]
+        if pareto:
+            # options of one (household, sun_hours) site are its panel_watt x efficiency cells
+            flat = (len(kwh), s, w * e)
+            mask = solar_service.pareto_mask(panels.reshape(flat), grid["installed_w"].reshape(flat))
+            hi, si, wi, ei = np.nonzero(mask.reshape(panels.shape))
+        else:
+            hi, si, wi, ei = (a.ravel() for a in np.indices(panels.shape))
+        ids_s = house_ids[start:start + step]
+        kwh_s = _formatted(kwh.tolist())
+        yield list(zip(
+            ids_s[hi].tolist(), kwh_s[hi].tolist(), sun_s[si].tolist(), watt_s[wi].tolist(), eff_s[ei].tolist(),
+            map(str, panels[hi, si, wi, ei].tolist()),
+            [repr(round(v, 4)) for v in grid["estimated_daily_generation_kwh"][hi, si, wi, ei].tolist()],
+            pdw_s[si, wi, ei].tolist(),
+            map(repr, grid["installed_w"][hi, si, wi, ei].tolist()),
+        ))
+
+
+# one line per row, from the preformatted values (no dict / json.dumps per row)
+_NDJSON_ROW = "{" + ",".join(f'"{c}":%s' for c in SWEEP_COLUMNS) + "}\n"
+
+
+def _sweep_ndjson(batches: Iterator[List[tuple]]) -> Iterator[str]:
+    for batch in batches:
+        yield "".join([_NDJSON_ROW % row for row in batch])
+
+
+def _sweep_csv(batches: Iterator[List[tuple]]) -> Iterator[str]:
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(SWEEP_COLUMNS)
+    yield buf.getvalue()
+    for batch in batches:
+        buf.seek(0)
+        buf.truncate()
+        writer.writerows(batch)
+        yield buf.getvalue()
+
+
+@router.post("/sweep")
+def solar_sweep(payload: SolarSweepIn):
+    """
+    Size every household across the full grid of sun_hours x panel_watt x efficiency
+    and stream the results (same ceil-division as POST /api/solar/).
+
+    - mode="grid" streams one row per combination, household-major.
+    - mode="pareto" streams, per household and sun_hours value, only the panel options
+      (panel_watt, efficiency) not dominated on panels_required and installed_w.
+    """
+    if payload.mode not in ("grid", "pareto"):
+        raise HTTPException(status_code=400, detail="`mode` must be 'grid' or 'pareto'")
+    if payload.format not in SWEEP_MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail=f"`format` must be one of {list(SWEEP_MEDIA_TYPES)}")
+    try:
+        daily_kwh = solar_service.as_axis("daily_kwh", [h.daily_kwh for h in payload.households])
+        sun_hours = solar_service.as_axis("sun_hours", payload.sun_hours)
+        panel_watt = solar_service.as_axis("panel_watt", payload.panel_watt)
+        efficiency = solar_service.as_axis("efficiency", payload.efficiency)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    cells = len(daily_kwh) * len(sun_hours) * len(panel_watt) * len(efficiency)
+    if cells > solar_service.SWEEP_MAX_CELLS:
+        raise HTTPException(status_code=413,
+                            detail=f"Sweep too large: {cells} combinations (max {solar_service.SWEEP_MAX_CELLS})")
+
+    # ids are encoded once per household: JSON strings/null for ndjson, raw text for csv
+    encode = json.dumps if payload.format == "ndjson" else (lambda h: "" if h is None else h)
+    house_ids = _formatted([h.house_id for h in payload.households], encode)
+    batches = _sweep_rows(house_ids, daily_kwh, sun_hours, panel_watt, efficiency, payload.mode == "pareto")
+    body = _sweep_ndjson(batches) if payload.format == "ndjson" else _sweep_csv(batches)
+    return StreamingResponse(body, media_type=SWEEP_MEDIA_TYPES[payload.format],
+                             headers={"X-Sweep-Combinations": str(cells)})
@@ -0,0 +1,100 @@
+# scripts/migrate_prediction_records.py
+"""
+Convert stored prediction records between the "full" and "compact" formats
+(services.record_codec).
+
+Documents are read in _id order in batches of --batch-size, converted, and written
+back with one unordered bulk_write of ReplaceOne per batch (the _id is kept). Only
+documents still in the other format are selected, so the migration can be stopped
+and rerun at any time.
+
+Records are tagged with the current feature_order.json version when their vector
+has its length; otherwise (or if the file is missing) with --feature-order-version,
+or left untagged. --dry-run only reports how many documents would change and their
+BSON size before / after.
+
+Run from Backend/:
+    python scripts/migrate_prediction_records.py --to compact --batch-size 1000
+    python scripts/migrate_prediction_records.py --to full
+"""
+import argparse
+import os
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+import bson
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services import record_codec  # noqa: E402
+import services.ai_service as ai_service  # noqa: E402
+
+
+def convert(docs: List[Dict[str, Any]], to: str, version: Optional[str], width: Optional[int],
+            fallback_version: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Converted copies of `docs` (which must all be in the other format)."""
+    if to == "full":
+        return [record_codec.to_full(d) for d in docs]
+    out = []
+    for d in docs:
+        matches = version is not None and len(d.get("features") or []) == width
+        out.append(record_codec.encode(d, version if matches else fallback_version))
+    return out
+
+
+def migrate(collection, to: str, batch_size: int = 1000, limit: Optional[int] = None,
+            feature_order_version: Optional[str] = None, dry_run: bool = False) -> Dict[str, Any]:
+    from pymongo import ReplaceOne
+
+    feature_order, version = ai_service.get_feature_order_with_etag()
+    width = len(feature_order) if feature_order else None
+    selector = {record_codec.BLOB_FIELD: {"$exists": to == "full"}}
+
+    stats = {"to": to, "converted": 0, "failed": 0, "bytes_before": 0, "bytes_after": 0, "dry_run": dry_run}
+    t0 = time.perf_counter()
+    last_id = None
+    while limit is None or stats["converted"] < limit:
+        query = selector if last_id is None else {"$and": [selector, {"_id": {"$gt": last_id}}]}
+        n = batch_size if limit is None else min(batch_size, limit - stats["converted"])
+        docs = list(collection.find(query).sort([("_id", 1)]).limit(n))
+        if not docs:
+            break
+        last_id = docs[-1]["_id"]
+        converted = convert(docs, to, version, width, feature_order_version)
+        stats["bytes_before"] += sum(len(bson.encode(d)) for d in docs)
+        stats["bytes_after"] += sum(len(bson.encode(d)) for d in converted)
+        if not dry_run:
+            try:
+                collection.bulk_write([ReplaceOne({"_id": d["_id"]}, d) for d in converted], ordered=False)
+            except Exception as e:
+                details = getattr(e, "details", None) or {}
+                failed = len(details.get("writeErrors") or converted)
+                stats["failed"] += failed
+                print(f"batch ending at {last_id}: {failed} writes failed: {e}")
+        stats["converted"] += len(converted)
+        print(f"{stats['converted']} converted ({stats['bytes_before'] / 1e6:.1f} MB -> {stats['bytes_after'] / 1e6:.1f} MB)")
+    stats["seconds"] = round(time.perf_counter() - t0, 2)
+    if stats["converted"]:
+        stats["avg_bytes_before"] = round(stats["bytes_before"] / stats["converted"], 1)
+        stats["avg_bytes_after"] = round(stats["bytes_after"] / stats["converted"], 1)
+    return stats
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--to", choices=["compact", "full"], required=True)
+    ap.add_argument("--batch-size", type=int, default=1000)
+    ap.add_argument("--limit", type=int, help="convert at most this many documents")
+    ap.add_argument("--feature-order-version", help="tag for vectors that do not match the current feature_order.json (or when it is missing)")
+    ap.add_argument("--dry-run", action="store_true")
+    args = ap.parse_args()
+
+    from models.database import pred_col
+
+    stats = migrate(pred_col, args.to, args.batch_size, args.limit, args.feature_order_version, args.dry_run)
+    print(stats)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,416 @@
+# scripts/score_batch.py
+"""
+Score a whole CSV / Parquet file offline with the models services.ai_service serves,
+without going through the HTTP API.
+
+The input is read in chunks of --chunk-rows rows. Only the feature_order.json columns
+(renamed with --map feature=column) and the --keep columns are read. Chunks are
+scored in a pool of --workers processes. Each worker loads the selected models once,
+at the versions resolved when the run started, and caps its estimators and BLAS at
+--threads-per-worker threads. --workers 1 scores in this process.
+
+Every chunk is written to its own part file in --out as soon as it is scored:
+    part-000000.parquet  (or .csv)
+        row                  global row number in the input
+        <--keep columns>
+        pred_<model>         one column per model, side by side
+The part is written to a temporary name and renamed when complete. _run.json holds
+the run's settings and progress. Rerunning the same command on an interrupted run
+skips the chunks that already have a part, provided the input file, models, versions
+and columns are unchanged. Any other non-empty --out is refused unless --overwrite
+is given. Rows with a missing or non-numeric feature get NaN predictions and are
+counted as invalid.
+
+The output directory reads back as one table:
+    pd.read_parquet("scores/")
+    pd.concat(map(pd.read_csv, sorted(glob.glob("scores/part-*.csv"))))
+
+Run from Backend/:
+    python scripts/score_batch.py data/households.parquet --out scores/ --workers 4
+    python scripts/score_batch.py data/households.csv --out scores/ --models xgb --format csv --keep house_id
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import services.ai_service as ai_service  # noqa: E402
+
+MANIFEST = "_run.json"
+# settings a resumed run must share with the interrupted one
+RESUME_KEYS = ("input", "input_size", "input_mtime", "chunk_rows", "models", "columns", "keep", "format")
+_THREAD_ENV_VARS = ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS")
+
+# models loaded in this process (pool worker or --workers 1): {key: ModelVersion}
+_loaded: Dict[str, Any] = {}
+# in a pool worker: the barrier the start-up ready-checks wait on
+_ready = None
+
+
+# --- reading ---
+def _is_parquet(path: str) -> bool:
+    return path.lower().endswith((".parquet", ".pq"))
+
+
+def input_columns(path: str) -> List[str]:
+    if _is_parquet(path):
+        import pyarrow.parquet as pq
+        return list(pq.ParquetFile(path).schema_arrow.names)
+    return list(pd.read_csv(path, nrows=0).columns)
+
+
+def count_rows(path: str) -> Optional[int]:
+    """Row count from the Parquet footer; None for CSV (not known without a full pass)."""
+    if _is_parquet(path):
+        import pyarrow.parquet as pq
+        return pq.ParquetFile(path).metadata.num_rows
+    return None
+
+
+def _rechunk(frames: Iterator[pd.DataFrame], chunk_rows: int) -> Iterator[pd.DataFrame]:
+    """Regroup frames of any size into frames of exactly `chunk_rows` rows (the last may be shorter)."""
+    pending: List[pd.DataFrame] = []
+    size = 0
+    for frame in frames:
+        pending.append(frame)
+        size += len(frame)
+        while size >= chunk_rows:
+            merged = pd.concat(pending, ignore_index=True) if len(pending) > 1 else pending[0]
+            yield merged.iloc[:chunk_rows].reset_index(drop=True)
+            rest = merged.iloc[chunk_rows:]
+            pending, size = ([rest], len(rest)) if len(rest) else ([], 0)
+    if size:
+        yield pd.concat(pending, ignore_index=True) if len(pending) > 1 else pending[0]
+
+
+def read_chunks(path: str, columns: List[str], chunk_rows: int, start_chunk: int = 0) -> Iterator[pd.DataFrame]:
+    """
+    Frames of `chunk_rows` rows with only `columns`, starting at chunk `start_chunk`.
+    Chunk i always covers input rows [i * chunk_rows, (i + 1) * chunk_rows), so
+    chunk numbers stay stable across resumed runs.
+    """
+    start_row = start_chunk * chunk_rows
+    if _is_parquet(path):
+        import pyarrow.parquet as pq
+        pf = pq.ParquetFile(path)
+        # skip whole row groups before start_row, then the rows left over in the first one read
+        groups, seen = [], 0
+        for i in range(pf.metadata.num_row_groups):
+            n = pf.metadata.row_group(i).num_rows
+            if seen + n <= start_row:
+                seen += n
+                continue
+            groups.append(i)
+        skip = start_row - seen
+
+        def frames():
+            to_skip = skip
+            for batch in pf.iter_batches(batch_size=chunk_rows, columns=columns, row_groups=groups):
+                frame = batch.to_pandas()
+                if to_skip:
+                    cut = min(to_skip, len(frame))
+                    frame, to_skip = frame.iloc[cut:], to_skip - cut
+                if len(frame):
+                    yield frame
+        yield from _rechunk(frames(), chunk_rows)
+    else:
+        skiprows = range(1, start_row + 1) if start_row else None
+        yield from pd.read_csv(path, usecols=columns, chunksize=chunk_rows, skiprows=skiprows)
+
+
+def feature_matrix(frame: pd.DataFrame, columns: List[str]) -> np.ndarray:
+    """The chunk's features as float64 in feature order; values that are not numbers become NaN."""
+    data = frame[columns]
+    if not all(pd.api.types.is_numeric_dtype(t) for t in data.dtypes):
+        data = data.apply(pd.to_numeric, errors="coerce")
+    return data.to_numpy(dtype=np.float64)
+
+
+# --- scoring (pool workers, or this process with --workers 1) ---
+def _limit_threads(threads: int):
+    try:
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(limits=threads)
+    except ImportError:
+        pass
+
+
+def load_models(settings: Dict[str, Any], models: Dict[str, str], threads: Optional[int] = None, ready=None):
+    """
+    Load every (key, version) in `models` once; estimators with n_jobs are capped at
+    `threads`. `ready` is the pool's start-up barrier (see _worker_ready).
+    """
+    global _ready
+    _ready = ready
+    for name, value in settings.items():
+        setattr(ai_service, name, value)
+    if threads:
+        _limit_threads(threads)
+    for key, version in models.items():
+        mv = ai_service.load_model_version(key, version)
+        if threads and hasattr(mv.model, "get_params") and "n_jobs" in mv.model.get_params():
+            mv.model.set_params(n_jobs=threads)
+        _loaded[key] = mv
+
+
+def _worker_ready(timeout: float):
+    # every worker waits until all have taken a check, so each check runs in a different worker
+    _ready.wait(timeout)
+    return os.getpid()
+
+
+def score_chunk(index: int, X: np.ndarray) -> Tuple[int, Dict[str, np.ndarray], Dict[str, float], int]:
+    """Predictions of every loaded model for X: (index, {key: values}, {key: seconds}, invalid rows)."""
+    valid = np.isfinite(X).all(axis=1)
+    n_invalid = int(len(X) - valid.sum())
+    rows = X[valid] if n_invalid else X
+    preds, seconds = {}, {}
+    for key, mv in _loaded.items():
+        t0 = time.perf_counter()
+        values = ai_service.predict_matrix(mv, rows) if len(rows) else np.empty(0)
+        if n_invalid:
+            full = np.full(len(X), np.nan)
+            full[valid] = values
+            values = full
+        preds[key] = values
+        seconds[key] = time.perf_counter() - t0
+    return index, preds, seconds, n_invalid
+
+
+# --- output ---
+def part_path(out_dir: str, index: int, fmt: str) -> str:
+    return os.path.join(out_dir, f"part-{index:06d}.{fmt}")
+
+
+def completed_chunks(out_dir: str, fmt: str) -> set:
+    done = set()
+    for name in os.listdir(out_dir):
+        if name.endswith(".tmp"):
+            os.remove(os.path.join(out_dir, name))  # left behind by an interrupted write
+        elif name.startswith("part-") and name.endswith(f".{fmt}"):
+            done.add(int(name[5:-len(fmt) - 1]))
+    return done
+
+
+def write_part(out_dir: str, index: int, fmt: str, frame: pd.DataFrame):
+    """Write one chunk's results under a temporary name, then rename it into place."""
+    path = part_path(out_dir, index, fmt)
+    tmp = path + ".tmp"
+    if fmt == "parquet":
+        frame.to_parquet(tmp, index=False)
+    else:
+        frame.to_csv(tmp, index=False)
+    os.replace(tmp, path)
+
+
+def _save_manifest(out_dir: str, manifest: Dict[str, Any]):
+    tmp = os.path.join(out_dir, MANIFEST + ".tmp")
+    with open(tmp, "w") as fh:
+        json.dump(manifest, fh, indent=2)
+    os.replace(tmp, os.path.join(out_dir, MANIFEST))
+
+
+def _resume_state(out_dir: str, manifest: Dict[str, Any], overwrite: bool) -> set:
+    """
+    Chunks already written by an earlier run with the same settings (an empty set for a
+    new run). A directory that holds anything but such a run is only used with --overwrite,
+    which deletes the part files and _run.json in it.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    path = os.path.join(out_dir, MANIFEST)
+    if not overwrite:
+        if os.path.exists(path):
+            with open(path) as fh:
+                previous = json.load(fh)
+            changed = [k for k in RESUME_KEYS if previous.get(k) != manifest.get(k)]
+            if changed:
+                raise SystemExit(f"{out_dir} holds a run with different {', '.join(changed)}; "
+                                 f"use another --out or --overwrite")
+            return completed_chunks(out_dir, manifest["format"])
+        if os.listdir(out_dir):
+            raise SystemExit(f"{out_dir} is not empty and holds no {MANIFEST}; use another --out or --overwrite")
+    for name in os.listdir(out_dir):
+        if name.startswith("part-") or name.startswith(MANIFEST):
+            os.remove(os.path.join(out_dir, name))
+    return set()
+
+
+# --- run ---
+def _resolve_models(selection: str, feature_order: List[str]) -> Dict[str, str]:
+    """{key: version} of the models to score with, pinned for the whole run."""
+    available = ai_service.available_models()
+    keys = list(available) if selection == "all" else [k.strip() for k in selection.split(",") if k.strip()]
+    missing = [k for k in keys if k not in available]
+    if missing or not keys:
+        raise SystemExit(f"Models {missing or selection!r} not available in {ai_service.MODEL_DIR}: {list(available)}")
+    models = {}
+    for key in keys:
+        resolved = ai_service.resolve_version(key)
+        if resolved["feature_order"] and list(resolved["feature_order"]) != feature_order:
+            raise SystemExit(f"{key} {resolved['version']} was trained on a different feature order than feature_order.json")
+        models[key] = resolved["version"]
+    return models
+
+
+def run(args) -> Dict[str, Any]:
+    feature_order = ai_service.get_feature_order()
+    if not feature_order:
+        raise SystemExit(f"feature_order.json not found or invalid in {ai_service.MODEL_DIR}")
+    mapping = dict(m.split("=", 1) for m in args.map)
+    columns = [mapping.get(name, name) for name in feature_order]
+    keep = [c.strip() for c in args.keep.split(",") if c.strip()] if args.keep else []
+    available = set(input_columns(args.input))
+    missing = [c for c in columns + keep if c not in available]
+    if missing:
+        raise SystemExit(f"Columns {missing} not found in {args.input} (use --map feature=column)")
+    fmt = args.format or "parquet"
+
+    models = _resolve_models(args.models, feature_order)
+    st = os.stat(args.input)
+    manifest = {"input": os.path.abspath(args.input), "input_size": st.st_size, "input_mtime": st.st_mtime_ns,
+                "chunk_rows": args.chunk_rows, "models": models, "columns": columns, "keep": keep, "format": fmt}
+    done = _resume_state(args.out, manifest, args.overwrite)
+    total_rows = count_rows(args.input)
+    manifest.update(status="running", started_at=datetime.now(timezone.utc).isoformat(),
+                    total_rows=total_rows, resumed_chunks=len(done))
+    _save_manifest(args.out, manifest)
+
+    workers = max(1, args.workers)
+    settings = {"MODEL_DIR": ai_service.MODEL_DIR, "COMPILED_DIR": ai_service.COMPILED_DIR,
+                "INFERENCE_BACKEND": ai_service.INFERENCE_BACKEND, "MODEL_MMAP_MODE": ai_service.MODEL_MMAP_MODE,
+                "MODEL_AUTO_RELOAD": False}
+    print(f"Scoring {args.input} ({total_rows if total_rows is not None else '?'} rows) with "
+          f"{', '.join(f'{k}@{v}' for k, v in models.items())} in chunks of {args.chunk_rows} on "
+          f"{workers} worker(s)" + (f"; {len(done)} chunks already done" if done else ""))
+
+    t_load = time.perf_counter()
+    pool = None
+    saved_env = {var: os.environ.get(var) for var in _THREAD_ENV_VARS}
+    if workers > 1:
+        # spawned workers read the thread settings at start-up, before numpy loads its pools
+        for var in _THREAD_ENV_VARS:
+            os.environ[var] = str(args.threads_per_worker)
+        import multiprocessing
+        ctx = multiprocessing.get_context("spawn")
+        ready = ctx.Barrier(workers)
+        pool = ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=load_models,
+                                   initargs=(settings, models, args.threads_per_worker, ready))
+        # start every worker now, so model loading is not counted as scoring time
+        for f in [pool.submit(_worker_ready, 600.0) for _ in range(workers)]:
+            f.result()
+    else:
+        load_models(settings, models)
+    load_seconds = time.perf_counter() - t_load
+
+    stats = {"rows": 0, "chunks": 0, "invalid_rows": 0, "model_seconds": {k: 0.0 for k in models}}
+    pending: Dict[Any, Tuple[int, pd.DataFrame]] = {}
+    t0 = last_report = time.perf_counter()
+
+    def finish(index: int, keep_frame: pd.DataFrame, preds, seconds, invalid: int):
+        out = pd.DataFrame({"row": np.arange(index * args.chunk_rows, index * args.chunk_rows + len(keep_frame))})
+        for c in keep:
+            out[c] = keep_frame[c].to_numpy()
+        for key, values in preds.items():
+            out[f"pred_{key}"] = values
+            stats["model_seconds"][key] += seconds[key]
+        write_part(args.out, index, fmt, out)
+        stats["rows"] += len(out)
+        stats["chunks"] += 1
+        stats["invalid_rows"] += invalid
+
+    def drain(block: bool):
+        nonlocal last_report
+        finished, _ = wait(list(pending), return_when=FIRST_COMPLETED) if block else (
+            [f for f in pending if f.done()], None)
+        for fut in finished:
+            index, keep_frame = pending.pop(fut)
+            _, preds, seconds, invalid = fut.result()
+            finish(index, keep_frame, preds, seconds, invalid)
+        now = time.perf_counter()
+        if now - last_report >= args.progress_seconds:
+            last_report = now
+            print(f"  {stats['rows']} rows in {stats['chunks']} chunks, {stats['rows'] / (now - t0):.0f} rows/s")
+
+    start_chunk = min(set(range(len(done) + 1)) - done)
+    interrupted = False
+    try:
+        for index, frame in enumerate(read_chunks(args.input, list(dict.fromkeys(columns + keep)),
+                                                  args.chunk_rows, start_chunk), start=start_chunk):
+            if index in done:
+                continue
+            X = feature_matrix(frame, columns)
+            keep_frame = frame[keep]
+            if pool is None:
+                finish(index, keep_frame, *score_chunk(index, X)[1:])
+                drain(block=False)
+                continue
+            while len(pending) >= workers * 2:
+                drain(block=True)
+            pending[pool.submit(score_chunk, index, X)] = (index, keep_frame)
+        while pending:
+            drain(block=True)
+    except KeyboardInterrupt:
+        interrupted = True
+        print("Interrupted; rerun the same command to resume.")
+    finally:
+        if pool is not None:
+            pool.shutdown(wait=not interrupted, cancel_futures=True)
+        for var, value in saved_env.items():
+            if value is None:
+                os.environ.pop(var, None)
+            else:
+                os.environ[var] = value
+
+    seconds = time.perf_counter() - t0
+    stats.update(seconds=round(seconds, 3), load_seconds=round(load_seconds, 3), workers=workers,
+                 rows_per_s=round(stats["rows"] / seconds, 1) if seconds > 0 else None)
+    stats["model_seconds"] = {k: round(v, 3) for k, v in stats["model_seconds"].items()}
+    manifest.update(status="interrupted" if interrupted else "complete",
+                    finished_at=datetime.now(timezone.utc).isoformat(), last_run=stats,
+                    chunks_written=len(completed_chunks(args.out, fmt)))
+    _save_manifest(args.out, manifest)
+    return stats
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("input", help=".csv or .parquet file")
+    ap.add_argument("--out", required=True, help="output directory for the part files and _run.json")
+    ap.add_argument("--format", choices=["parquet", "csv"], help="part file format (default: parquet)")
+    ap.add_argument("--models", default="all", help="comma-separated model keys, or 'all' available models")
+    ap.add_argument("--model-dir", help="MODEL_DIR with the models and feature_order.json (default: $MODEL_DIR or data)")
+    ap.add_argument("--chunk-rows", type=int, default=50_000)
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="scoring processes; 1 = this process")
+    ap.add_argument("--threads-per-worker", type=int, default=1, help="n_jobs / BLAS threads in each worker")
+    ap.add_argument("--keep", help="comma-separated input columns copied to the output, e.g. house_id")
+    ap.add_argument("--map", action="append", default=[], metavar="FEATURE=COLUMN",
+                    help="read a feature from a differently named input column (repeatable)")
+    ap.add_argument("--overwrite", action="store_true", help="use a non-empty --out, deleting the part files and _run.json in it")
+    ap.add_argument("--progress-seconds", type=float, default=5.0)
+    args = ap.parse_args()
+
+    if args.model_dir:
+        ai_service.MODEL_DIR = args.model_dir
+        ai_service.COMPILED_DIR = os.path.join(args.model_dir, "compiled")
+    if args.chunk_rows < 1:
+        raise SystemExit("--chunk-rows must be positive")
+    if args.map and any("=" not in m for m in args.map):
+        raise SystemExit("--map takes FEATURE=COLUMN")
+
+    stats = run(args)
+    print(f"{stats['rows']} rows ({stats['invalid_rows']} invalid) in {stats['chunks']} chunks: "
+          f"{stats['seconds']:.1f}s, {stats['rows_per_s']} rows/s on {stats['workers']} worker(s) "
+          f"(+{stats['load_seconds']:.1f}s model loading); predict seconds per model {stats['model_seconds']}")
+
+
+if __name__ == "__main__":
+    main()
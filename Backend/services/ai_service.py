@@ -1,149 +1,1227 @@
 # services/ai_service.py
 import os
+import hashlib
 import joblib
 import numpy as np
 import json
-from typing import Dict, List, Optional
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional
+
+from services import metrics, model_registry
 
 # location where backend will look for models (env var supported)
 # When uvicorn is started from AIRES_Backend/, MODEL_DIR="data" points to AIRES_Backend/data
 MODEL_DIR = os.getenv("MODEL_DIR", "data")
 
 # map short model keys to actual filenames + friendly names
-# These names match the files you produced during training
+# These names match the files you produced during training.
+# Keys listed in MODEL_DIR/manifest.json (services.model_registry) are served from their
+# published versions instead; a file here is the single implicit version of a key the
+# manifest does not (yet) list.
 MODEL_REGISTRY = {
     "linear": {"file": "linear_regression.pkl", "name": "Linear Regression"},
     "rf": {"file": "random_forest.pkl", "name": "Random Forest"},
     "xgb": {"file": "xgboost_regressor.pkl", "name": "XGBoost Regressor"},
 }
 
-# cache for loaded models
-_loaded_models: Dict[str, object] = {}
-_loaded_scaler = None
+# joblib mmap mode for model/scaler artifacts (e.g. "r"); unset = load into private memory.
+# Only arrays stored uncompressed (joblib.dump(..., compress=0), the training script's default)
+# can be memory-mapped; the OS page cache then shares them between worker processes.
+MODEL_MMAP_MODE = os.getenv("MODEL_MMAP_MODE") or None
 
+# inference backend: "sklearn" calls scaler.transform + model.predict on the pickled estimators;
+# "compiled" uses the flat NumPy engine from services.tree_engine (falls back to sklearn per
+# model if it cannot be compiled). Exports written by the training script live in
+# MODEL_DIR/compiled/<key>/; otherwise the engine is compiled from the loaded pickle.
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "sklearn").lower()
+COMPILED_DIR = os.getenv("COMPILED_MODEL_DIR", os.path.join(MODEL_DIR, "compiled"))
+# the NumPy traversal wins on small inputs; larger matrices go to the multi-threaded library code
+COMPILED_MAX_ROWS = int(os.getenv("COMPILED_MAX_ROWS", "16"))
 
-def available_models() -> Dict[str, str]:
+# serving version per model key (see ModelVersion); replaced by a single dict assignment on reload
+_active: Dict[str, "ModelVersion"] = {}
+# non-active versions loaded for requests that pin a version, least recently used first
+_pinned: "OrderedDict[tuple, ModelVersion]" = OrderedDict()
+MAX_PINNED_VERSIONS = int(os.getenv("MAX_PINNED_VERSIONS", "2"))
+# loaded scalers by content hash, shared by every version trained with the same scaler
+_scalers: Dict[str, object] = {}
+# serializes synchronous loads so concurrent first requests don't load the same pickle twice
+_load_lock = threading.RLock()
+
+# MODEL_AUTO_RELOAD=1: requests notice a changed manifest.json (or replaced model files) at most
+# once per METADATA_CHECK_INTERVAL and start a background reload; they keep being served by the
+# loaded version until the new one is loaded, warmed up and swapped in
+MODEL_AUTO_RELOAD = os.getenv("MODEL_AUTO_RELOAD", "1").lower() in ("1", "true", "yes")
+_registry_watch = {"signature": None, "checked_at": 0.0}
+_reload_lock = threading.Lock()
+_reload_thread: Optional[threading.Thread] = None
+_last_reload: Optional[Dict[str, object]] = None
+
+# in-process LRU/TTL cache of single-vector predictions (see PredictionCache); size 0 disables it
+PREDICTION_CACHE_SIZE = int(os.getenv("PREDICTION_CACHE_SIZE", "10000"))
+PREDICTION_CACHE_TTL = float(os.getenv("PREDICTION_CACHE_TTL", "600"))
+
+# metadata files (feature_order.json, validation_rules.json) and the model directory listing are
+# cached in memory; their mtime is re-checked at most once per METADATA_CHECK_INTERVAL seconds
+METADATA_CHECK_INTERVAL = float(os.getenv("METADATA_CHECK_INTERVAL", "1.0"))
+
+# opt-in micro-batching of concurrent single-vector predictions (see MicroBatcher)
+MICROBATCH_ENABLED = os.getenv("PREDICT_MICROBATCH", "0").lower() in ("1", "true", "yes")
+MICROBATCH_MAX_SIZE = int(os.getenv("PREDICT_MICROBATCH_MAX_SIZE", "64"))
+MICROBATCH_MAX_WAIT_MS = float(os.getenv("PREDICT_MICROBATCH_MAX_WAIT_MS", "2"))
+_microbatcher = None
+
+# INFERENCE_EXECUTOR=process runs scaler + model in a dedicated process pool (see InferencePool)
+# instead of on the calling request thread, so long GIL-holding RF / XGBoost predictions neither
+# block the event loop nor the threadpool that serves DB and history requests, and scale across
+# cores. Each worker loads and warms up the models once when it starts.
+INFERENCE_EXECUTOR = os.getenv("INFERENCE_EXECUTOR", "inline").lower()
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "0")) or (os.cpu_count() or 1)
+# predictions submitted to the pool and not yet finished (queued + running); beyond this,
+# requests are shed with InferenceOverloaded (HTTP 503) instead of queueing without bound
+INFERENCE_MAX_PENDING = int(os.getenv("INFERENCE_MAX_PENDING", "0")) or INFERENCE_WORKERS * 4
+# how long a request may wait for a free slot before it is shed; 0 = reject immediately
+INFERENCE_QUEUE_TIMEOUT_MS = float(os.getenv("INFERENCE_QUEUE_TIMEOUT_MS", "0"))
+# comma-separated model keys sent to the pool; empty = all (e.g. "rf,xgb" keeps linear inline)
+INFERENCE_POOL_MODELS = {k.strip() for k in os.getenv("INFERENCE_POOL_MODELS", "").split(",") if k.strip()}
+# "spawn" starts clean workers; "fork" is faster to start but forks a multi-threaded server
+INFERENCE_START_METHOD = os.getenv("INFERENCE_START_METHOD", "spawn")
+_inference_pool = None
+# in a pool worker: the barrier InferencePool.start() lines the ready-checks up on
+_pool_ready = None
+
+# filled by preload_models(); None until startup preloading has run
+_preload_report: Optional[Dict[str, object]] = None
+
+
+class MetadataFile:
     """
-    Return available model keys and friendly labels for models present in MODEL_DIR.
-    Example return: {"linear":"Linear Regression", "rf":"Random Forest", "xgb":"XGBoost Regressor"}
+    Parsed contents of one JSON metadata file, cached until the file changes.
+
+    The file is stat()ed at most once every METADATA_CHECK_INTERVAL seconds; it is
+    re-read only when its (mtime, size) signature changes or invalidate() is called.
+    get() returns (value, etag); value is None when the file is missing or unparsable.
+    The etag is a short content hash, suitable for an HTTP ETag header.
     """
+
+    def __init__(self, path_fn: Callable[[], str], parser: Callable[[object], object]):
+        self.path_fn = path_fn
+        self.parser = parser
+        self._lock = threading.Lock()
+        self._signature = None
+        self._checked_at = 0.0
+        self._value = None
+        self._etag: Optional[str] = None
+
+    def invalidate(self):
+        with self._lock:
+            self._signature = None
+            self._checked_at = 0.0
+
+    def get(self):
+        now = time.monotonic()
+        if self._signature is not None and now - self._checked_at < METADATA_CHECK_INTERVAL:
+            return self._value, self._etag
+        with self._lock:
+            path = self.path_fn()
+            try:
+                st = os.stat(path)
+                signature = (path, st.st_mtime_ns, st.st_size)
+            except OSError:
+                signature = (path, None, None)
+            if signature != self._signature:
+                self._value, self._etag = self._read(path) if signature[1] is not None else (None, None)
+                self._signature = signature
+            self._checked_at = now
+            return self._value, self._etag
+
+    def _read(self, path: str):
+        try:
+            with open(path, "rb") as fh:
+                raw = fh.read()
+            value = self.parser(json.loads(raw))
+        except Exception:
+            return None, None
+        if value is None:
+            return None, None
+        return value, hashlib.sha1(raw).hexdigest()[:16]
+
+
+def _parse_feature_order(data) -> Optional[List[str]]:
+    # If file is a dict with key "feature_order", use that
+    if isinstance(data, dict) and "feature_order" in data and isinstance(data["feature_order"], list):
+        return data["feature_order"]
+    # If file is a list itself, return it directly
+    if isinstance(data, list):
+        return data
+    return None
+
+
+def _parse_validation_rules(data) -> Optional[Dict[str, float]]:
+    if not isinstance(data, dict):
+        return None
+    return {k: float(v) for k, v in data.items() if isinstance(v, (int, float))}
+
+
+_feature_order_file = MetadataFile(lambda: os.path.join(MODEL_DIR, "feature_order.json"), _parse_feature_order)
+_validation_rules_file = MetadataFile(lambda: os.path.join(MODEL_DIR, "validation_rules.json"), _parse_validation_rules)
+
+# available_models() result, keyed on the model directory's mtime (changes when files are added/removed/renamed)
+_available_cache = {"signature": None, "checked_at": 0.0, "models": {}}
+_available_lock = threading.Lock()
+
+
+def _scan_available_models() -> Dict[str, str]:
+    try:
+        manifest = model_registry.read_manifest(MODEL_DIR)
+    except ValueError as e:
+        # a broken manifest must not take down models that are already serving
+        print(f"[models] {e}; keeping loaded models")
+        return {k: MODEL_REGISTRY.get(k, {}).get("name", k) for k in _active}
     out = {}
+    listed = manifest["models"] if manifest is not None else {}
+    for k, m in listed.items():
+        try:
+            _, entry = model_registry.resolve(manifest, k)
+        except KeyError:
+            continue
+        if os.path.exists(os.path.join(MODEL_DIR, entry["file"])):
+            out[k] = m.get("name") or MODEL_REGISTRY.get(k, {}).get("name", k)
     for k, v in MODEL_REGISTRY.items():
+        if k in listed:
+            continue
         path = os.path.join(MODEL_DIR, v["file"])
         if os.path.exists(path):
             out[k] = v["name"]
     return out
 
 
-def _load_model(key: str):
+def available_models() -> Dict[str, str]:
     """
-    Lazy-load model by key and cache it.
-    Raises:
-        KeyError if key not in registry.
-        FileNotFoundError if file missing.
+    Return available model keys and friendly labels for models present in MODEL_DIR.
+    Example return: {"linear":"Linear Regression", "rf":"Random Forest", "xgb":"XGBoost Regressor"}
+    The directory is only re-scanned when its mtime changes (checked at most once per
+    METADATA_CHECK_INTERVAL seconds) or after reload_metadata().
     """
-    global _loaded_models
+    now = time.monotonic()
+    cache = _available_cache
+    if cache["signature"] is not None and now - cache["checked_at"] < METADATA_CHECK_INTERVAL:
+        return dict(cache["models"])
+    with _available_lock:
+        try:
+            signature = (MODEL_DIR, os.stat(MODEL_DIR).st_mtime_ns)
+        except OSError:
+            signature = (MODEL_DIR, None)
+        if signature != cache["signature"]:
+            cache["models"] = _scan_available_models()
+            cache["signature"] = signature
+        cache["checked_at"] = now
+        return dict(cache["models"])
 
-    if key in _loaded_models:
-        return _loaded_models[key]
 
-    if key not in MODEL_REGISTRY:
-        raise KeyError(f"Unknown model key: {key}")
+def available_models_etag() -> str:
+    """Short content hash of available_models(), for HTTP ETag headers."""
+    payload = json.dumps(available_models(), sort_keys=True).encode()
+    return hashlib.sha1(payload).hexdigest()[:16]
 
-    path = os.path.join(MODEL_DIR, MODEL_REGISTRY[key]["file"])
-    if not os.path.exists(path):
-        raise FileNotFoundError(f"Model file not found: {path}")
 
-    model = joblib.load(path)
-    _loaded_models[key] = model
-    return model
+def reload_metadata():
+    """Drop cached feature order, validation rules and available-model listing."""
+    _feature_order_file.invalidate()
+    _validation_rules_file.invalidate()
+    with _available_lock:
+        _available_cache["signature"] = None
+        _available_cache["checked_at"] = 0.0
 
 
-def _load_scaler():
+class ModelVersion:
     """
-    Lazy-load a scaler if present (scaler.pkl in MODEL_DIR). Returns None if none.
+    One loaded model version: estimator, scaler, optional compiled engine and the
+    manifest metadata. It is built completely (loaded, compiled, warmed up) before
+    it is published in _active and is not modified afterwards, so a request that
+    took a reference keeps a consistent model/scaler/engine set even if a newer
+    version is swapped in while it runs.
     """
-    global _loaded_scaler
-    if _loaded_scaler is not None:
-        return _loaded_scaler
 
-    scaler_path = os.path.join(MODEL_DIR, "scaler.pkl")
-    if os.path.exists(scaler_path):
+    def __init__(self, key: str, version: str, model, scaler, path: str, sha256: str,
+                 scaler_sha256: Optional[str] = None, feature_order: Optional[List[str]] = None,
+                 metrics: Optional[Dict[str, object]] = None, source: str = "files"):
+        self.key = key
+        self.version = version
+        self.model = model
+        self.scaler = scaler
+        self.path = path
+        self.sha256 = sha256
+        self.scaler_sha256 = scaler_sha256
+        self.feature_order = feature_order
+        self.metrics = metrics
+        self.source = source
+        self.engine = None
+        self.compile_error: Optional[str] = None
+        self.compile_checked = False
+        self.loaded_at = time.time()
+        # model + scaler content; part of the prediction cache key
+        self.artifact_hash = hashlib.sha256(f"{sha256}:{scaler_sha256 or ''}".encode()).hexdigest()[:16]
+
+    def describe(self) -> Dict[str, object]:
+        return {
+            "version": self.version, "sha256": self.sha256, "artifact_hash": self.artifact_hash,
+            "source": self.source, "compiled": self.engine is not None, "compile_error": self.compile_error,
+            "metrics": self.metrics, "loaded_at": self.loaded_at,
+        }
+
+
+def _version_spec(key: str, version: Optional[str] = None) -> Dict[str, object]:
+    """
+    Where to load `key` from: its manifest entry (the active version, or `version`)
+    or, without a manifest, the MODEL_REGISTRY file as its only version, named
+    "file-<content hash>".
+    Raises KeyError for an unknown key / version, FileNotFoundError for a missing file.
+    """
+    manifest = model_registry.read_manifest(MODEL_DIR)
+    if manifest is not None and key in manifest["models"]:
+        vid, entry = model_registry.resolve(manifest, key, version)
+
+        def rel(p):
+            return os.path.join(MODEL_DIR, p) if p else None
+
+        spec = {"version": vid, "path": rel(entry["file"]), "sha256": entry.get("sha256"),
+                "scaler_path": rel(entry.get("scaler_file")), "scaler_sha256": entry.get("scaler_sha256"),
+                "compiled_dir": rel(entry.get("compiled_dir")), "feature_order": entry.get("feature_order"),
+                "metrics": entry.get("metrics"), "source": "manifest"}
+    else:
+        if key not in MODEL_REGISTRY:
+            raise KeyError(f"Unknown model key: {key}")
+        scaler_path = os.path.join(MODEL_DIR, "scaler.pkl")
+        spec = {"version": None, "path": os.path.join(MODEL_DIR, MODEL_REGISTRY[key]["file"]), "sha256": None,
+                "scaler_path": scaler_path if os.path.exists(scaler_path) else None, "scaler_sha256": None,
+                "compiled_dir": os.path.join(COMPILED_DIR, key), "feature_order": None, "metrics": None,
+                "source": "files"}
+
+    if not os.path.exists(spec["path"]):
+        raise FileNotFoundError(f"Model file not found: {spec['path']}")
+    if spec["sha256"] is None:
+        spec["sha256"] = model_registry.cached_file_sha256(spec["path"])
+    if spec["scaler_path"] and spec["scaler_sha256"] is None:
+        spec["scaler_sha256"] = model_registry.cached_file_sha256(spec["scaler_path"])
+    if spec["version"] is None:
+        digest = hashlib.sha256(f"{spec['sha256']}:{spec['scaler_sha256'] or ''}".encode()).hexdigest()
+        spec["version"] = f"file-{digest[:12]}"
+        if version is not None and version != spec["version"]:
+            raise KeyError(f"Unknown version {version!r} for model {key!r}")
+    return spec
+
+
+def _get_scaler(path: Optional[str], sha256: Optional[str]):
+    if not path:
+        return None
+    scaler = _scalers.get(sha256)
+    if scaler is None:
         try:
-            _loaded_scaler = joblib.load(scaler_path)
-        except Exception:
-            _loaded_scaler = None
-    return _loaded_scaler
+            scaler = joblib.load(path, mmap_mode=MODEL_MMAP_MODE)
+        except Exception as e:
+            raise RuntimeError(f"Scaler load failed ({path}): {e}")
+        _scalers[sha256] = scaler
+    return scaler
+
+
+def _attach_compiled(mv: ModelVersion, export_dir: Optional[str] = None):
+    """
+    Give `mv` its compiled engine: an up-to-date export in `export_dir` (memory-mapped)
+    if there is one, otherwise compiled from the loaded estimator and scaler. On failure
+    the error is recorded and the version is served by the library path.
+    """
+    from services import tree_engine
+
+    try:
+        meta_path = os.path.join(export_dir, "meta.json") if export_dir else None
+        if meta_path and os.path.exists(meta_path) and os.path.getmtime(meta_path) >= os.path.getmtime(mv.path):
+            mv.engine = tree_engine.load_compiled(export_dir, mmap_mode=MODEL_MMAP_MODE)
+        else:
+            mv.engine = tree_engine.compile_model(mv.model, mv.scaler)
+    except Exception as e:
+        mv.compile_error = f"{type(e).__name__}: {e}"
+        mv.engine = None
+    mv.compile_checked = True
+
+
+def _load_version(key: str, spec: Dict[str, object]) -> ModelVersion:
+    """Load (and compile, for INFERENCE_BACKEND=compiled) one version described by _version_spec()."""
+    if spec["source"] == "manifest" and spec["sha256"]:
+        actual = model_registry.file_sha256(spec["path"])
+        if actual != spec["sha256"]:
+            raise RuntimeError(f"Checksum mismatch for {spec['path']}: manifest {spec['sha256'][:12]}, file {actual[:12]}")
+    model = joblib.load(spec["path"], mmap_mode=MODEL_MMAP_MODE)
+    scaler = _get_scaler(spec["scaler_path"], spec["scaler_sha256"])
+    mv = ModelVersion(key, spec["version"], model, scaler, spec["path"], spec["sha256"],
+                      scaler_sha256=spec["scaler_sha256"], feature_order=spec["feature_order"],
+                      metrics=spec["metrics"], source=spec["source"])
+    if INFERENCE_BACKEND == "compiled":
+        _attach_compiled(mv, spec["compiled_dir"])
+    return mv
+
+
+def get_model_version(key: str, version: Optional[str] = None) -> ModelVersion:
+    """
+    Return the loaded ModelVersion serving `key`: the active one, or `version` when
+    a request pins one. Loads synchronously only the first time (preload_models()
+    normally does that at startup); later versions are swapped in by reload_models().
+    Raises KeyError for an unknown key / version, FileNotFoundError if the file is missing.
+    """
+    mv = _active.get(key)
+    if mv is not None and (version is None or version == mv.version):
+        if version is None:
+            _maybe_schedule_reload()
+        return mv
+
+    if version is None:
+        with _load_lock:
+            mv = _active.get(key)
+            if mv is None:
+                if _registry_watch["signature"] is None:
+                    _registry_watch["signature"] = _registry_signature()
+                mv = _load_version(key, _version_spec(key))
+                _active[key] = mv
+        return mv
+
+    # resolve the version before taking the lock: an unknown one is rejected without
+    # holding up other loads (file digests are cached, so this is a stat() per file)
+    spec = _version_spec(key, version) if (key, version) not in _pinned else None
+    with _load_lock:
+        mv = _pinned.get((key, version))
+        if mv is None:
+            mv = _load_version(key, spec or _version_spec(key, version))
+            _pinned[(key, version)] = mv
+            while len(_pinned) > MAX_PINNED_VERSIONS:
+                _pinned.popitem(last=False)
+            _prune_scalers()
+        _pinned.move_to_end((key, version))
+    return mv
+
+
+def resolve_version(key: str, version: Optional[str] = None) -> Dict[str, object]:
+    """
+    What loading `key` (the active version, or `version`) would load, without loading it:
+    version id, source, feature_order and metrics (None when not recorded).
+    Raises KeyError for an unknown key / version, FileNotFoundError if the file is missing.
+    """
+    spec = _version_spec(key, version)
+    return {k: spec[k] for k in ("version", "source", "feature_order", "metrics")}
+
+
+def load_model_version(key: str, version: Optional[str] = None) -> ModelVersion:
+    """
+    Load `key` (the active version, or `version`) as a private ModelVersion that is not
+    registered for serving, e.g. for offline scoring that tunes the estimator's n_jobs.
+    Raises KeyError / FileNotFoundError like get_model_version.
+    """
+    return _load_version(key, _version_spec(key, version))
+
+
+def predict_matrix(mv: ModelVersion, arr: np.ndarray) -> np.ndarray:
+    """
+    Predictions of `mv` for a 2-D feature matrix, computed in this thread: no inference
+    pool, no prediction cache. Returns one float64 per row; raises RuntimeError on failure.
+    """
+    return _predict_local(mv, arr)
+
+
+def active_version(key: str) -> Optional[str]:
+    """Version id currently serving `key`, or None if it is not loaded yet."""
+    mv = _active.get(key)
+    return mv.version if mv is not None else None
+
+
+def artifact_hash(key: str, version: Optional[str] = None) -> str:
+    """
+    Content hash identifying the serving (or pinned) version of `key` together with its scaler.
+    Loads the model if needed. Raises KeyError / FileNotFoundError like get_model_version.
+    """
+    return get_model_version(key, version).artifact_hash
+
+
+def _prune_scalers():
+    """Drop scalers no loaded version refers to (call with _load_lock held)."""
+    used = {mv.scaler_sha256 for mv in list(_active.values()) + list(_pinned.values())}
+    for sha in [s for s in _scalers if s not in used]:
+        del _scalers[sha]
+
+
+def _registry_signature():
+    """(path, mtime, size, inode) of manifest.json, every MODEL_REGISTRY file and scaler.pkl."""
+    paths = [model_registry.manifest_path(MODEL_DIR), os.path.join(MODEL_DIR, "scaler.pkl")]
+    paths.extend(os.path.join(MODEL_DIR, v["file"]) for v in MODEL_REGISTRY.values())
+    sig = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            sig.append((path, st.st_mtime_ns, st.st_size, st.st_ino))
+        except OSError:
+            sig.append((path, None, None, None))
+    return tuple(sig)
+
+
+def _maybe_schedule_reload():
+    """Start a background reload when the registry changed (checked at most once per METADATA_CHECK_INTERVAL)."""
+    if not MODEL_AUTO_RELOAD:
+        return
+    watch = _registry_watch
+    now = time.monotonic()
+    if now - watch["checked_at"] < METADATA_CHECK_INTERVAL:
+        return
+    watch["checked_at"] = now
+    signature = _registry_signature()
+    if watch["signature"] is None:
+        watch["signature"] = signature
+    elif signature != watch["signature"]:
+        watch["signature"] = signature
+        reload_models()
+
+
+def _reload_worker():
+    global _last_reload
+    started = time.perf_counter()
+    report: Dict[str, object] = {"started_at": time.time(), "models": {}}
+    _registry_watch["signature"] = _registry_signature()
+    reload_metadata()
+    available = available_models()
+
+    for key in sorted(set(available) | set(_active)):
+        entry: Dict[str, object] = {}
+        try:
+            if key not in available:
+                with _load_lock:
+                    old = _active.pop(key, None)
+                entry = {"status": "removed", "previous": old.version if old else None}
+                continue
+            spec = _version_spec(key)
+            current = _active.get(key)
+            if (current is not None and current.version == spec["version"] and current.sha256 == spec["sha256"]
+                    and current.scaler_sha256 == spec["scaler_sha256"]):
+                entry = {"status": "unchanged", "version": current.version}
+                continue
+            # load and warm up off the request path; requests keep using `current` meanwhile
+            t0 = time.perf_counter()
+            with _load_lock:
+                mv = _pinned.pop((key, spec["version"]), None)
+            if mv is None or mv.sha256 != spec["sha256"]:
+                mv = _load_version(key, spec)
+            entry["load_ms"] = round((time.perf_counter() - t0) * 1000.0, 3)
+            entry["warmup_ms"] = _warm_up(mv)
+            with _load_lock:
+                old = _active.get(key)
+                _active[key] = mv
+                _prune_scalers()
+            if old is not None:
+                _prediction_cache.invalidate_artifact(key, old.artifact_hash)
+            entry.update(status="swapped", version=mv.version, previous=old.version if old else None)
+        except Exception as e:
+            # the previous version (if any) stays active
+            entry = {"status": "error", "error": f"{type(e).__name__}: {e}"}
+        finally:
+            report["models"][key] = entry
+
+    report["total_ms"] = round((time.perf_counter() - started) * 1000.0, 3)
+    _last_reload = report
+    for key, entry in report["models"].items():
+        if entry["status"] != "unchanged":
+            print(f"[models] reload {key}: {entry}")
+
+
+def reload_models(wait: bool = False) -> Dict[str, object]:
+    """
+    Re-read the registry and load every changed active version in a background thread;
+    each one is warmed up and then swapped in with a single assignment, so requests
+    never see a partially loaded model and are never blocked by the load.
+    Only one reload runs at a time. With wait=True, blocks until it has finished and
+    returns its report; otherwise returns {"started": bool, "running": True}.
+    """
+    global _reload_thread
+    with _reload_lock:
+        started = not (_reload_thread is not None and _reload_thread.is_alive())
+        if started:
+            _reload_thread = threading.Thread(target=_reload_worker, name="model-reload", daemon=True)
+            _reload_thread.start()
+        thread = _reload_thread
+    if not wait:
+        return {"started": started, "running": thread.is_alive()}
+    thread.join()
+    if not started:
+        # a reload that was already running may have read the registry before the latest change
+        return reload_models(wait=True)
+    return dict(_last_reload or {})
+
+
+def last_reload_report() -> Optional[Dict[str, object]]:
+    return _last_reload
+
+
+def list_model_versions() -> Dict[str, object]:
+    """Published versions per model, the active one, and which versions this process has loaded."""
+    manifest = model_registry.read_manifest(MODEL_DIR)
+    listed = manifest["models"] if manifest else {}
+    out = {}
+    for key in list(listed) + [k for k in available_models() if k not in listed]:
+        if key in listed:
+            versions = model_registry.list_versions(manifest, key)
+        else:
+            mv = _active.get(key)
+            versions = [{"version": mv.version, "active": True, "sha256": mv.sha256}] if mv else []
+        out[key] = {
+            "serving": active_version(key),
+            "pinned_loaded": [v for (k, v) in list(_pinned) if k == key],
+            "versions": versions,
+        }
+    return {"manifest": manifest is not None, "models": out, "last_reload": _last_reload}
 
 
 def get_feature_order() -> Optional[List[str]]:
     """
-    Read and return feature order list from feature_order.json in MODEL_DIR.
+    Return feature order list from feature_order.json in MODEL_DIR (cached, see MetadataFile).
     Accepts either:
       - {"feature_order": [...]}  OR
       - ["col1","col2",...]
     Returns None if file missing or invalid.
     """
-    feature_file = os.path.join(MODEL_DIR, "feature_order.json")
-    if not os.path.exists(feature_file):
-        return None
-    try:
-        with open(feature_file, "r") as f:
-            data = json.load(f)
-            # If file is a dict with key "feature_order", use that
-            if isinstance(data, dict) and "feature_order" in data and isinstance(data["feature_order"], list):
-                return data["feature_order"]
-            # If file is a list itself, return it directly
-            if isinstance(data, list):
-                return data
-    except Exception:
-        return None
-    return None
+    value, _ = _feature_order_file.get()
+    return list(value) if value is not None else None
 
 
-def predict(model_key: str, features: list) -> float:
+def get_feature_order_with_etag():
+    """Return (feature_order or None, etag or None)."""
+    value, etag = _feature_order_file.get()
+    return (list(value) if value is not None else None), etag
+
+
+def get_validation_rules() -> Optional[Dict[str, float]]:
     """
-    Predict using the specified model key and the provided features list.
-    Applies scaler transformation if scaler.pkl exists in MODEL_DIR.
-    Returns float prediction.
+    Return the numeric limits from validation_rules.json in MODEL_DIR
+    (grid_p95, grid_p99, monthly_min, monthly_max, total_power_p99, ...), cached.
+    Returns None if file missing or invalid.
+    """
+    value, _ = _validation_rules_file.get()
+    return dict(value) if value is not None else None
+
+
+def get_validation_rules_with_etag():
+    """Return (validation rules or None, etag or None)."""
+    value, etag = _validation_rules_file.get()
+    return (dict(value) if value is not None else None), etag
+
+
+def _predict_matrix(model_key: str, arr: np.ndarray, version: Optional[str] = None) -> np.ndarray:
+    """
+    Run scaler + model on a 2-D feature matrix of shape (n_rows, n_features).
+    One scaler.transform call and one model.predict call for the whole matrix.
+    Returns a 1-D float64 array with one prediction per row.
     Raises FileNotFoundError, KeyError, RuntimeError on failure.
     """
-    # load model
-    model = _load_model(model_key)
+    return _predict_with(get_model_version(model_key, version), arr)
 
-    # build numpy array with shape (1, n_features)
-    arr = np.array(features).reshape(1, -1)
+
+def _predict_with(mv: ModelVersion, arr: np.ndarray) -> np.ndarray:
+    """Predict `arr` with `mv` in the inference process pool when it is enabled for the key, else in this thread."""
+    if INFERENCE_EXECUTOR == "process" and (not INFERENCE_POOL_MODELS or mv.key in INFERENCE_POOL_MODELS):
+        return _get_inference_pool().predict(mv, arr)
+    return _predict_local(mv, arr)
+
+
+def _predict_local(mv: ModelVersion, arr: np.ndarray) -> np.ndarray:
+    if INFERENCE_BACKEND == "compiled" and arr.shape[0] <= COMPILED_MAX_ROWS:
+        if not mv.compile_checked:
+            # backend switched on after this version was loaded
+            with _load_lock:
+                if not mv.compile_checked:
+                    _attach_compiled(mv)
+        if mv.engine is not None:
+            try:
+                with metrics.stage("compiled_predict", mv.key):
+                    return np.asarray(mv.engine.predict(arr), dtype=np.float64)
+            except Exception as e:
+                raise RuntimeError(f"Model prediction failed: {e}")
+
+    model = mv.model
 
     # apply scaler if available
-    scaler = _load_scaler()
+    scaler = mv.scaler
     if scaler is not None:
         try:
-            arr = scaler.transform(arr)
+            with metrics.stage("scaler_transform", mv.key):
+                arr = scaler.transform(arr)
         except Exception as e:
             # scaling failure is critical - surface clear error
             raise RuntimeError(f"Scaler transform failed: {e}")
 
     # do prediction
     try:
-        pred = model.predict(arr)
+        with metrics.stage("model_predict", mv.key):
+            pred = model.predict(arr)
     except Exception as e:
         raise RuntimeError(f"Model prediction failed: {e}")
 
-    # ensure we return a plain Python float even if prediction array is nested
+    # one value per row; multi-output models keep their first output
     try:
-        import numpy as _np
-        # squeeze everything, then take first element
-        val = _np.array(pred).squeeze()
-        # if val is scalar-like, convert to float; if it is an array, take first element
-        if _np.ndim(val) == 0:
-            return float(val)
-        else:
-            # flatten and take first element
-            return float(_np.ravel(val)[0])
+        with metrics.stage("float_coercion", mv.key):
+            return np.asarray(pred, dtype=np.float64).reshape(arr.shape[0], -1)[:, 0]
     except Exception as e:
         raise RuntimeError(f"Failed to coerce prediction to float: {e}")
 
 
+class PredictionCache:
+    """
+    Thread-safe LRU cache with optional TTL for single-vector predictions.
+
+    Keys are (model_key, artifact_hash, canonical feature bytes); see _prediction_cache_key.
+    Counters: hits, misses, evictions (LRU), expirations (TTL) and invalidations
+    (entries dropped because a model or scaler file was replaced).
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: float = 0.0):
+        self.max_size = max(0, int(max_size))
+        self.ttl = max(0.0, float(ttl_seconds))
+        self._data: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0
+
+    def get(self, key: tuple) -> Optional[float]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self._counters["misses"] += 1
+                return None
+            value, expires_at = item
+            if expires_at and time.monotonic() >= expires_at:
+                del self._data[key]
+                self._counters["expirations"] += 1
+                self._counters["misses"] += 1
+                return None
+            self._data.move_to_end(key)
+            self._counters["hits"] += 1
+            return value
+
+    def put(self, key: tuple, value: float):
+        if not self.enabled:
+            return
+        expires_at = time.monotonic() + self.ttl if self.ttl else 0.0
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self._counters["evictions"] += 1
+
+    def invalidate_model(self, model_key: str) -> int:
+        with self._lock:
+            stale = [k for k in self._data if k[0] == model_key]
+            for k in stale:
+                del self._data[k]
+            self._counters["invalidations"] += len(stale)
+        return len(stale)
+
+    def invalidate_artifact(self, model_key: str, artifact: str) -> int:
+        """Drop the entries computed by one (now replaced) version of `model_key`."""
+        with self._lock:
+            stale = [k for k in self._data if k[0] == model_key and k[1] == artifact]
+            for k in stale:
+                del self._data[k]
+            self._counters["invalidations"] += len(stale)
+        return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._counters["invalidations"] += len(self._data)
+            self._data.clear()
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            out = dict(self._counters)
+            out["size"] = len(self._data)
+        lookups = out["hits"] + out["misses"]
+        out["hit_rate"] = round(out["hits"] / lookups, 4) if lookups else 0.0
+        out["max_size"] = self.max_size
+        out["ttl_seconds"] = self.ttl
+        return out
+
+
+_prediction_cache = PredictionCache(PREDICTION_CACHE_SIZE, PREDICTION_CACHE_TTL)
+
+
+def _prediction_cache_key(mv: ModelVersion, features: list) -> tuple:
+    # canonical float64 bytes: 1 == 1.0 == "1.0" after coercion, and -0.0 is folded into 0.0
+    vec = np.asarray(features, dtype=np.float64).ravel() + 0.0
+    return (mv.key, mv.artifact_hash, vec.tobytes())
+
+
+def prediction_cache_stats() -> Dict[str, object]:
+    """Hit / miss / eviction counters and current size of the prediction cache."""
+    return _prediction_cache.stats()
+
+
+def clear_prediction_cache():
+    _prediction_cache.clear()
+
+
+def predict(model_key: str, features: list, version: Optional[str] = None) -> float:
+    """
+    Predict using the specified model key and the provided features list.
+    Applies the scaler the model version was trained with, if any.
+    `version` pins a published model version; None uses the active one.
+    Identical (model, artifact, vector) requests are answered from the prediction cache.
+    Returns float prediction.
+    Raises FileNotFoundError, KeyError, RuntimeError on failure.
+    """
+    mv = get_model_version(model_key, version)
+    cache_key = None
+    if _prediction_cache.enabled:
+        with metrics.stage("cache_lookup", model_key):
+            cache_key = _prediction_cache_key(mv, features)
+            cached = _prediction_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+    if MICROBATCH_ENABLED:
+        # coalesce with concurrent callers into one matrix prediction, scored by the `mv`
+        # resolved above so the value comes from the model the cache key names
+        value = _get_microbatcher().submit(model_key, features, mv)
+    else:
+        # build numpy array with shape (1, n_features)
+        arr = np.array(features, dtype=np.float64).reshape(1, -1)
+        value = float(_predict_with(mv, arr)[0])
+
+    if cache_key is not None:
+        _prediction_cache.put(cache_key, value)
+    return value
+
+
+def predict_batch(model_key: str, rows, version: Optional[str] = None) -> List[float]:
+    """
+    Predict many feature vectors at once.
+    `rows` is a list of feature lists (or a 2-D array) in training feature order;
+    it is turned into a single (n, n_features) matrix so the scaler and model
+    each run once per batch instead of once per row.
+    `version` pins a published model version; None uses the active one.
+    Returns a list of floats in the same order as `rows`.
+    Raises FileNotFoundError, KeyError, ValueError, RuntimeError on failure.
+    """
+    try:
+        arr = np.asarray(rows, dtype=np.float64)
+    except Exception:
+        raise ValueError("All feature rows must be numeric and of equal length.")
+    if arr.ndim != 2:
+        raise ValueError("Batch features must be a 2-D matrix of shape (n_rows, n_features).")
+    if arr.shape[0] == 0:
+        return []
+    return _predict_matrix(model_key, arr, version).tolist()
+
+
+def _warmup_width(mv: ModelVersion) -> Optional[int]:
+    """Number of input columns for a warm-up vector: the version's feature order, feature_order.json, then fitted estimators."""
+    if mv.feature_order:
+        return len(mv.feature_order)
+    feature_order = get_feature_order()
+    if feature_order:
+        return len(feature_order)
+    for obj in (mv.scaler, mv.model):
+        n = getattr(obj, "n_features_in_", None)
+        if n:
+            return int(n)
+    return None
+
+
+def _warm_up(mv: ModelVersion) -> Optional[float]:
+    """One prediction on a zero vector (first-call allocations, lazy imports). Returns ms, or None if the width is unknown."""
+    width = _warmup_width(mv)
+    if not width:
+        return None
+    dummy = np.zeros((1, width), dtype=np.float64)
+    t0 = time.perf_counter()
+    _predict_local(mv, dummy)
+    return round((time.perf_counter() - t0) * 1000.0, 3)
+
+
+def preload_models() -> Dict[str, object]:
+    """
+    Eagerly load the active version of every model that available_models() finds,
+    then run one warm-up prediction per model on a zero vector sized from its
+    feature order. Per-model load / warm-up timings (ms), the version and any error
+    are recorded and returned; the report is also kept for readiness checks.
+    A failing model does not stop the others from loading.
+    """
+    global _preload_report
+    started = time.perf_counter()
+    _registry_watch["signature"] = _registry_signature()
+    report: Dict[str, object] = {"models": {}}
+
+    for key in available_models():
+        entry: Dict[str, object] = {"loaded": False, "warmed_up": False}
+        try:
+            t0 = time.perf_counter()
+            mv = get_model_version(key)
+            entry["version"] = mv.version
+            if INFERENCE_BACKEND == "compiled":
+                entry["compiled"] = mv.engine is not None
+                if mv.compile_error:
+                    entry["compile_error"] = mv.compile_error
+            entry["load_ms"] = round((time.perf_counter() - t0) * 1000.0, 3)
+            entry["loaded"] = True
+
+            warmup_ms = _warm_up(mv)
+            if warmup_ms is not None:
+                entry["warmup_ms"] = warmup_ms
+                entry["warmed_up"] = True
+            else:
+                entry["error"] = "could not determine feature count for warm-up"
+        except Exception as e:
+            entry["error"] = f"{type(e).__name__}: {e}"
+        report["models"][key] = entry
+
+    report["scaler"] = {"loaded": bool(_scalers), "count": len(_scalers)}
+    report["total_ms"] = round((time.perf_counter() - started) * 1000.0, 3)
+    report["ready"] = bool(report["models"]) and all(m["warmed_up"] for m in report["models"].values())
+    _preload_report = report
+    return report
+
+
+def preload_report() -> Optional[Dict[str, object]]:
+    """Return the last preload_models() report, or None if preloading has not run."""
+    return _preload_report
+
+
+# queued by MicroBatcher.close(): the worker finishes what is before it and exits
+_STOP = object()
+
+
+class MicroBatcher:
+    """
+    Collects concurrent single-vector predictions per model key and runs them
+    as one matrix prediction.
+
+    Each model key gets its own queue and a daemon worker thread. The worker
+    blocks for the first request, then keeps collecting until either
+    `max_batch_size` rows are queued or `max_wait_ms` has passed since the
+    first one arrived. Rows are grouped by the `context` they were submitted
+    with (compared by identity, e.g. the ModelVersion to score with) and by
+    length; each group is one run_batch(model_key, rows, context) call. Every
+    caller blocks on its own Future and receives exactly the value (or
+    exception) for its row.
+    """
+
+    def __init__(self, run_batch: Callable[[str, list, object], List[float]],
+                 max_batch_size: int = 64, max_wait_ms: float = 2.0):
+        self.run_batch = run_batch
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self._queues: Dict[str, "queue.Queue"] = {}
+        self._threads: List[threading.Thread] = []
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def submit(self, model_key: str, features: list, context=None) -> float:
+        """Queue one feature vector and block until its prediction is ready."""
+        fut: Future = Future()
+        with self._lock:
+            if self._closed:
+                # replaced by configure_microbatching() while this caller was on its way in
+                fut = None
+            else:
+                self._queue_for(model_key).put((features, context, fut))
+        if fut is None:
+            return float(self.run_batch(model_key, [features], context)[0])
+        return fut.result()
+
+    def close(self, timeout: Optional[float] = 5.0):
+        """Finish the queued rows, then stop every worker thread. Later submits run unbatched."""
+        with self._lock:
+            self._closed = True
+            for q in self._queues.values():
+                q.put(_STOP)
+            threads = list(self._threads)
+        for t in threads:
+            t.join(timeout)
+
+    def _queue_for(self, model_key: str) -> "queue.Queue":
+        """The key's queue, started on first use (call with _lock held)."""
+        q = self._queues.get(model_key)
+        if q is None:
+            q = queue.Queue()
+            worker = threading.Thread(
+                target=self._worker, args=(model_key, q),
+                name=f"microbatch-{model_key}", daemon=True,
+            )
+            worker.start()
+            self._threads.append(worker)
+            self._queues[model_key] = q
+        return q
+
+    def _collect(self, q: "queue.Queue"):
+        """(batch, stop): the next batch, and whether close() asked the worker to stop after it."""
+        first = q.get()
+        if first is _STOP:
+            return [], True
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    # window closed: still take whatever is already queued
+                    item = q.get_nowait()
+                else:
+                    item = q.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _worker(self, model_key: str, q: "queue.Queue"):
+        stop = False
+        while not stop:
+            batch, stop = self._collect(q)
+            # rows of another version or length cannot share a matrix; run each group separately
+            groups: Dict[tuple, list] = {}
+            for features, context, fut in batch:
+                groups.setdefault((id(context), len(features)), []).append((features, context, fut))
+            for items in groups.values():
+                self._run_group(model_key, items)
+
+    def _run_group(self, model_key: str, items: list):
+        try:
+            values = self.run_batch(model_key, [features for features, _, _ in items], items[0][1])
+        except Exception as e:
+            for _, _, fut in items:
+                fut.set_exception(e)
+            return
+        for (_, _, fut), value in zip(items, values):
+            fut.set_result(float(value))
+
+
+def _run_microbatch(model_key: str, rows: list, mv: ModelVersion) -> List[float]:
+    try:
+        arr = np.asarray(rows, dtype=np.float64)
+    except Exception:
+        raise ValueError("All feature rows must be numeric and of equal length.")
+    return _predict_with(mv, arr).tolist()
+
+
+def _get_microbatcher() -> MicroBatcher:
+    global _microbatcher
+    if _microbatcher is None:
+        _microbatcher = MicroBatcher(_run_microbatch, MICROBATCH_MAX_SIZE, MICROBATCH_MAX_WAIT_MS)
+    return _microbatcher
+
+
+def configure_microbatching(enabled: bool, max_batch_size: Optional[int] = None,
+                            max_wait_ms: Optional[float] = None):
+    """
+    Turn micro-batching of predict() on or off at runtime and optionally change its window.
+    The current batcher finishes its queued rows and its worker threads exit; new ones
+    are created lazily with the new settings.
+    """
+    global MICROBATCH_ENABLED, MICROBATCH_MAX_SIZE, MICROBATCH_MAX_WAIT_MS, _microbatcher
+    if max_batch_size is not None:
+        MICROBATCH_MAX_SIZE = int(max_batch_size)
+    if max_wait_ms is not None:
+        MICROBATCH_MAX_WAIT_MS = float(max_wait_ms)
+    MICROBATCH_ENABLED = bool(enabled)
+    old, _microbatcher = _microbatcher, None
+    if old is not None:
+        old.close()
+
+
+class InferenceOverloaded(Exception):
+    """Raised when the inference pool has INFERENCE_MAX_PENDING predictions in flight and no slot freed up in time."""
+
+
+class InferencePool:
+    """
+    Process pool that runs scaler + model for _predict_with().
+
+    Workers are started with _pool_worker_init(), which applies this process's model
+    settings and runs preload_models(), so every worker has loaded and warmed up the
+    active versions before it takes a job. A job carries (key, version, matrix); the
+    worker predicts with exactly that version, the one the caller resolved (and used
+    for its prediction cache key), loading it as a pinned version if it has not swapped
+    it in yet.
+
+    At most `max_pending` jobs are in flight; a caller that cannot get a slot within
+    `queue_timeout_ms` gets InferenceOverloaded. A worker that dies breaks the
+    executor; the in-flight jobs fail with RuntimeError and the next call starts a
+    new one.
+    """
+
+    def __init__(self, workers: int = 1, max_pending: int = 4, queue_timeout_ms: float = 0.0,
+                 start_method: str = "spawn"):
+        self.workers = max(1, int(workers))
+        self.max_pending = max(1, int(max_pending))
+        self.queue_timeout = max(0.0, float(queue_timeout_ms)) / 1000.0
+        self.start_method = start_method
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._executor = None
+        self._ready = None
+        self._lock = threading.Lock()
+        self._stats = {"submitted": 0, "completed": 0, "failed": 0, "shed": 0, "restarts": 0, "in_flight": 0}
+        self._stats_lock = threading.Lock()
+
+    def _count(self, **deltas):
+        with self._stats_lock:
+            for k, v in deltas.items():
+                self._stats[k] += v
+
+    def _get_executor(self):
+        executor = self._executor
+        if executor is not None:
+            return executor
+        with self._lock:
+            if self._executor is None:
+                import multiprocessing
+                from concurrent.futures import ProcessPoolExecutor
+
+                settings = {
+                    "MODEL_DIR": MODEL_DIR, "COMPILED_DIR": COMPILED_DIR, "INFERENCE_BACKEND": INFERENCE_BACKEND,
+                    "COMPILED_MAX_ROWS": COMPILED_MAX_ROWS, "MODEL_MMAP_MODE": MODEL_MMAP_MODE,
+                    "MODEL_AUTO_RELOAD": MODEL_AUTO_RELOAD, "METADATA_CHECK_INTERVAL": METADATA_CHECK_INTERVAL,
+                }
+                ctx = multiprocessing.get_context(self.start_method)
+                # start() has every worker wait here, so each one takes exactly one ready-check
+                self._ready = ctx.Barrier(self.workers)
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=ctx,
+                    initializer=_pool_worker_init, initargs=(settings, self._ready),
+                )
+            return self._executor
+
+    def _discard(self, executor):
+        """Drop a broken executor so the next call starts a new one."""
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+                self._count(restarts=1)
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def start(self, timeout: float = 600.0) -> Dict[str, object]:
+        """
+        Start every worker and wait until each has preloaded its models; returns their
+        preload reports by pid. Each ready-check blocks on a barrier of all the workers,
+        so no worker is idle before all have started and every check runs in a different
+        one. Raises RuntimeError if they are not all ready within `timeout` seconds.
+        """
+        executor = self._get_executor()
+        futures = [executor.submit(_pool_worker_ready, timeout) for _ in range(self.workers)]
+        try:
+            return dict(f.result() for f in futures)
+        except threading.BrokenBarrierError:
+            raise RuntimeError(f"Not all {self.workers} inference workers were ready within {timeout}s")
+
+    def predict(self, mv: ModelVersion, arr: np.ndarray) -> np.ndarray:
+        from concurrent.futures.process import BrokenProcessPool
+
+        acquired = (self._slots.acquire(timeout=self.queue_timeout) if self.queue_timeout > 0
+                    else self._slots.acquire(blocking=False))
+        if not acquired:
+            self._count(shed=1)
+            metrics.INFERENCE_SHED.inc(model=mv.key)
+            raise InferenceOverloaded(f"{self.max_pending} predictions already in flight")
+        self._count(submitted=1, in_flight=1)
+        executor = None
+        try:
+            with metrics.stage("inference_pool", mv.key):
+                executor = self._get_executor()
+                value = executor.submit(_pool_predict, mv.key, mv.version, arr).result()
+            self._count(completed=1)
+            return value
+        except BrokenProcessPool as e:
+            self._count(failed=1)
+            if executor is not None:
+                self._discard(executor)
+            raise RuntimeError(f"Inference worker died: {e}")
+        except Exception:
+            self._count(failed=1)
+            raise
+        finally:
+            self._count(in_flight=-1)
+            self._slots.release()
+
+    def stats(self) -> Dict[str, object]:
+        with self._stats_lock:
+            out = dict(self._stats)
+        out.update(workers=self.workers, max_pending=self.max_pending,
+                   queue_timeout_ms=self.queue_timeout * 1000.0, running=self._executor is not None)
+        return out
+
+    def shutdown(self, wait: bool = True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+
+def _pool_worker_init(settings: Dict[str, object], ready=None):
+    """Runs once in every pool worker: adopt the parent's model settings, then load + warm up the models."""
+    global _pool_ready
+    _pool_ready = ready
+    globals().update(settings)
+    globals().update(INFERENCE_EXECUTOR="inline", MICROBATCH_ENABLED=False)
+    report = preload_models()
+    failed = {k: m.get("error") for k, m in report["models"].items() if not m["warmed_up"]}
+    print(f"[inference-pool] worker {os.getpid()} ready in {report['total_ms']}ms"
+          + (f", not warmed up: {failed}" if failed else ""))
+
+
+def _pool_worker_ready(timeout: float):
+    # holds this worker until every worker has taken a check (InferencePool.start)
+    _pool_ready.wait(timeout)
+    return os.getpid(), _preload_report
+
+
+def _pool_predict(key: str, version: str, arr: np.ndarray) -> np.ndarray:
+    # the active lookup also lets the worker notice a registry change and reload in the background
+    mv = get_model_version(key)
+    if mv.version != version:
+        mv = get_model_version(key, version)
+    return _predict_local(mv, arr)
+
+
+def _get_inference_pool() -> InferencePool:
+    global _inference_pool
+    if _inference_pool is None:
+        with _load_lock:
+            if _inference_pool is None:
+                _inference_pool = InferencePool(INFERENCE_WORKERS, INFERENCE_MAX_PENDING,
+                                                INFERENCE_QUEUE_TIMEOUT_MS, INFERENCE_START_METHOD)
+    return _inference_pool
+
+
+def start_inference_pool() -> Optional[Dict[str, object]]:
+    """With INFERENCE_EXECUTOR=process, start the workers and wait for their preloading; otherwise None."""
+    if INFERENCE_EXECUTOR != "process":
+        return None
+    return _get_inference_pool().start()
+
+
+def shutdown_inference_pool(wait: bool = True):
+    if _inference_pool is not None:
+        _inference_pool.shutdown(wait=wait)
+
+
+def inference_pool_stats() -> Dict[str, object]:
+    """Executor mode and, for the process pool, its in-flight / completed / shed counters."""
+    out: Dict[str, object] = {"executor": INFERENCE_EXECUTOR,
+                              "pool_models": sorted(INFERENCE_POOL_MODELS) or "all"}
+    if _inference_pool is not None:
+        out["pool"] = _inference_pool.stats()
+    return out
+
+
 # helpful quick-check utility (callable from REPL)
 def info():
     """
@@ -151,4 +1229,10 @@ def info():
     """
     models = available_models()
     feat = get_feature_order()
-    return {"available_models": models, "feature_order": feat, "model_dir": MODEL_DIR}
+    loaded = dict(_active)
+    return {"available_models": models, "feature_order": feat, "model_dir": MODEL_DIR,
+            "inference_backend": INFERENCE_BACKEND,
+            "compile_errors": {k: mv.compile_error for k, mv in loaded.items() if mv.compile_error},
+            "loaded_versions": {k: mv.describe() for k, mv in loaded.items()},
+            "prediction_cache": _prediction_cache.stats(), "inference_executor": inference_pool_stats(),
+            "preload": _preload_report, "last_reload": _last_reload}
@@ -0,0 +1,478 @@
+# services/drift_monitor.py
+"""
+Input and output drift of the served models against the training data.
+
+The training script writes MODEL_DIR/reference_profile.json. For every feature, and for
+every model's predictions on the test split, it stores
+  - edges:        interior decile bounds of the training values (duplicates dropped, so
+                  discrete features get fewer bins),
+  - proportions:  the share of training rows that fall into each of those bins,
+  - quantiles:    REFERENCE_QUANTILES evenly spaced quantiles (0%, 1%, ..., 100%).
+
+The /predict routes call observe() / observe_many() with every scored vector and its
+prediction. An observation copies one row (features + prediction) into the model's
+staging buffer of DRIFT_SKETCH_K rows under a lock. Nothing else happens per request.
+When the buffer is full, the whole block is processed with vectorized NumPy:
+  - rows with a non-finite value are dropped (counted as skipped);
+  - it is binned into per-column histograms over the reference edges;
+  - it is compacted into a quantile sketch. The sketch is a stack of levels of at most
+    DRIFT_SKETCH_K rows each. A full level is sorted per column, and every other row
+    (random offset) moves up one level with twice the weight, as in KLL / MRL
+    sketches. The sketch grows by one level each time the rows seen double.
+Memory per model is (levels + 1) x DRIFT_SKETCH_K x columns doubles, about 350 KB for
+a million rows with the defaults.
+
+Scores are computed when they are read:
+  - PSI per column, from the histogram and the reference proportions:
+    sum((live - ref) * ln(live / ref)), with both shares floored at PSI_EPSILON;
+  - KS per column: the largest gap between the sketch's CDF and the reference CDF
+    (a step function over its quantiles, so within 1 / (REFERENCE_QUANTILES - 1)),
+    with the two-sample critical value at DRIFT_KS_ALPHA.
+
+Windows restart every DRIFT_WINDOW_SECONDS. The last complete one is kept as
+"previous", so a fresh window does not hide yesterday's drift. A changed reference
+profile also restarts the windows, because their bins no longer match. State is per
+process: with several server workers, each reports the traffic it served.
+"""
+import math
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+import services.ai_service as ai_service
+
+# set DRIFT_MONITOR=0 to turn observe() / observe_many() into no-ops
+DRIFT_MONITOR = os.getenv("DRIFT_MONITOR", "1").lower() in ("1", "true", "yes")
+# rows per staging buffer and per sketch level; larger = more accurate quantiles, more memory
+DRIFT_SKETCH_K = max(16, int(os.getenv("DRIFT_SKETCH_K", "256")) // 2 * 2)
+# a window's statistics restart after this many seconds (the last one is kept); 0 = never
+DRIFT_WINDOW_SECONDS = float(os.getenv("DRIFT_WINDOW_SECONDS", "3600"))
+# below this many rows a window is reported with status "insufficient_data"
+DRIFT_MIN_ROWS = int(os.getenv("DRIFT_MIN_ROWS", "200"))
+# PSI thresholds for "warn" / "drift" (the usual 0.1 / 0.25 rule of thumb)
+DRIFT_PSI_WARN = float(os.getenv("DRIFT_PSI_WARN", "0.1"))
+DRIFT_PSI_ALERT = float(os.getenv("DRIFT_PSI_ALERT", "0.25"))
+# significance level of the reported KS critical value
+DRIFT_KS_ALPHA = float(os.getenv("DRIFT_KS_ALPHA", "0.05"))
+
+REFERENCE_PROFILE_FILE = "reference_profile.json"
+PROFILE_FORMAT = 1
+REFERENCE_BINS = 10
+REFERENCE_QUANTILES = 101
+PSI_EPSILON = 1e-4
+PREDICTION_COLUMN = "prediction"
+REPORT_PERCENTILES = (1, 5, 25, 50, 75, 95, 99)
+
+
+# --- reference profile (written by train_with_noise_and_save.py) ---
+def column_profile(values, bins: int = REFERENCE_BINS, quantiles: int = REFERENCE_QUANTILES) -> Dict[str, Any]:
+    """Reference statistics of one column of training data (non-finite values are ignored)."""
+    v = np.asarray(values, dtype=np.float64).ravel()
+    v = v[np.isfinite(v)]
+    if not len(v):
+        raise ValueError("column has no finite values")
+    edges = np.unique(np.quantile(v, np.arange(1, bins) / bins))
+    counts = np.bincount(np.searchsorted(edges, v, side="left"), minlength=len(edges) + 1)
+    return {
+        "rows": int(len(v)),
+        "mean": float(v.mean()),
+        "std": float(v.std()),
+        "edges": edges.tolist(),
+        "proportions": (counts / len(v)).tolist(),
+        "quantiles": np.quantile(v, np.linspace(0.0, 1.0, quantiles)).tolist(),
+    }
+
+
+def build_reference_profile(X, feature_order: Sequence[str], predictions: Optional[Dict[str, Any]] = None,
+                            bins: int = REFERENCE_BINS) -> Dict[str, Any]:
+    """
+    Reference profile of a training matrix X (rows in `feature_order`) and, optionally,
+    of each model's predictions ({model: 1-D array}). Save it as REFERENCE_PROFILE_FILE
+    in MODEL_DIR.
+    """
+    X = np.asarray(X)
+    if X.ndim != 2 or X.shape[1] != len(feature_order):
+        raise ValueError(f"X must have shape (n, {len(feature_order)})")
+    return {
+        "format": PROFILE_FORMAT,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "rows": int(X.shape[0]),
+        "bins": bins,
+        "feature_order": list(feature_order),
+        "features": {name: column_profile(X[:, j], bins) for j, name in enumerate(feature_order)},
+        "predictions": {key: column_profile(p, bins) for key, p in (predictions or {}).items()},
+    }
+
+
+class _Reference:
+    """A parsed reference profile, with its columns laid out as matrices per model."""
+
+    def __init__(self, data: Dict[str, Any]):
+        self.data = data
+        self.feature_order: List[str] = list(data["feature_order"])
+        self.features = [data["features"][name] for name in self.feature_order]
+        self.predictions: Dict[str, Dict[str, Any]] = data.get("predictions") or {}
+        self._layouts: Dict[str, Dict[str, Any]] = {}
+
+    def layout(self, model: str) -> Dict[str, Any]:
+        """
+        Edges (columns x E, padded with +inf), bin proportions (columns x E+1, padded
+        with 0), quantiles and row counts of the features plus `model`'s predictions.
+        The prediction column is None when the profile has no predictions for `model`.
+        """
+        layout = self._layouts.get(model)
+        if layout is None:
+            columns = self.features + [self.predictions.get(model)]
+            width = max(len(c["edges"]) for c in columns if c is not None)
+            edges = np.full((len(columns), width), np.inf)
+            props = np.zeros((len(columns), width + 1))
+            for i, c in enumerate(columns):
+                if c is not None:
+                    edges[i, :len(c["edges"])] = c["edges"]
+                    props[i, :len(c["proportions"])] = c["proportions"]
+            layout = self._layouts[model] = {"edges": edges, "proportions": props, "columns": columns}
+        return layout
+
+
+def _parse_profile(data) -> Optional[_Reference]:
+    try:
+        if data.get("format") != PROFILE_FORMAT:
+            return None
+        return _Reference(data)
+    except (AttributeError, KeyError, TypeError):
+        return None
+
+
+_profile_file = ai_service.MetadataFile(lambda: os.path.join(ai_service.MODEL_DIR, REFERENCE_PROFILE_FILE),
+                                        _parse_profile)
+
+
+def invalidate():
+    """Re-read the reference profile on next use (POST /predict/metadata/reload)."""
+    _profile_file.invalidate()
+
+
+# --- live windows ---
+class _Window:
+    """Histograms and quantile sketch of the rows one model scored since `started_at`."""
+
+    def __init__(self, width: int, edges: Optional[np.ndarray], etag: Optional[str]):
+        k = DRIFT_SKETCH_K
+        self.width = width
+        self.etag = etag
+        self.edges = edges
+        self.counts = np.zeros((width, edges.shape[1] + 1), dtype=np.int64) if edges is not None else None
+        self.sums = np.zeros(width)
+        self.buffer = np.empty((k, width))
+        self.filled = 0   # rows in the staging buffer (sketch level 0, weight 1)
+        self.binned = 0   # of those, rows already counted in the histograms
+        self.levels: List[list] = []  # [rows (k x width), filled]; level i has weight 2 ** (i + 1)
+        self.rows = 0
+        self.skipped = 0
+        self.started = time.monotonic()
+        self.started_at = datetime.now(timezone.utc).isoformat()
+        self._rng = np.random.default_rng()
+
+    def add(self, rows: np.ndarray):
+        """Append rows of shape (n, width)."""
+        k = DRIFT_SKETCH_K
+        start = 0
+        while start < len(rows):
+            take = min(k - self.filled, len(rows) - start)
+            self.buffer[self.filled:self.filled + take] = rows[start:start + take]
+            self.filled += take
+            start += take
+            self.rows += take
+            if self.filled == k:
+                self._block_full()
+
+    def add_one(self, features: Sequence[float], prediction: float):
+        row = self.buffer[self.filled]
+        row[:-1] = features
+        row[-1] = prediction
+        self.filled += 1
+        self.rows += 1
+        if self.filled == DRIFT_SKETCH_K:
+            self._block_full()
+
+    def _block_full(self):
+        self._bin()
+        if self.filled == DRIFT_SKETCH_K:
+            self._compact(0, self.buffer)
+            self.filled = self.binned = 0
+
+    def _bin(self):
+        """Count the buffered rows not yet in the histograms (rows with a non-finite value are dropped)."""
+        rows = self.buffer[self.binned:self.filled]
+        if not len(rows):
+            return
+        finite = np.isfinite(rows).all(axis=1)
+        if not finite.all():
+            kept = rows[finite]
+            dropped = len(rows) - len(kept)
+            self.buffer[self.binned:self.binned + len(kept)] = kept
+            self.filled -= dropped
+            self.rows -= dropped
+            self.skipped += dropped
+            rows = self.buffer[self.binned:self.filled]
+        self.sums += rows.sum(axis=0)
+        if self.counts is not None:
+            n_bins = self.counts.shape[1]
+            # bin index = number of edges below the value, the rule column_profile uses
+            idx = (rows[:, :, None] > self.edges[None, :, :]).sum(axis=2) + np.arange(self.width) * n_bins
+            self.counts += np.bincount(idx.ravel(), minlength=self.counts.size).reshape(self.counts.shape)
+        self.binned = self.filled
+
+    def _compact(self, level: int, rows: np.ndarray):
+        """Sort a full level per column and push every other row up to `level` (weight doubles)."""
+        k = DRIFT_SKETCH_K
+        half = np.sort(rows, axis=0)[self._rng.integers(2)::2]
+        if level == len(self.levels):
+            self.levels.append([np.empty((k, self.width)), 0])
+        target = self.levels[level]
+        n = target[1]
+        target[0][n:n + len(half)] = half
+        target[1] = n + len(half)
+        if target[1] == k:
+            target[1] = 0
+            self._compact(level + 1, target[0])
+
+    def sketch(self):
+        """(values sorted per column, matching cumulative weights, total weight) of all sketch levels."""
+        parts = [self.buffer[:self.filled]] + [rows[:n] for rows, n in self.levels]
+        weights = [np.ones(self.filled)] + [np.full(n, 2.0 ** (i + 1)) for i, (_, n) in enumerate(self.levels)]
+        values = np.concatenate(parts)
+        weights = np.concatenate(weights)
+        order = np.argsort(values, axis=0, kind="stable")
+        return np.take_along_axis(values, order, axis=0), np.cumsum(weights[order], axis=0), float(weights.sum())
+
+    def memory_bytes(self) -> int:
+        return self.buffer.nbytes + sum(rows.nbytes for rows, _ in self.levels) + \
+            (self.counts.nbytes if self.counts is not None else 0)
+
+
+_windows: Dict[str, Dict[str, Optional[_Window]]] = {}
+_lock = threading.Lock()
+_status = {"reference_changes": 0, "width_mismatches": 0}
+
+
+def _reference():
+    return _profile_file.get()
+
+
+def _new_window(model: str, width: int) -> _Window:
+    ref, etag = _reference()
+    if ref is not None and len(ref.feature_order) + 1 == width:
+        return _Window(width, ref.layout(model)["edges"], etag)
+    return _Window(width, None, None)
+
+
+def _expected_etag(width: int) -> Optional[str]:
+    """Etag of the reference profile a window of `width` columns should be binned with (None: no bins)."""
+    ref, etag = _reference()
+    return etag if ref is not None and len(ref.feature_order) + 1 == width else None
+
+
+def _current(model: str, width: int, check: bool = False) -> Optional[_Window]:
+    """
+    The model's current window for rows of `width` columns, None on a width mismatch.
+    An expired window is rotated; at a block boundary (or with `check`) one binned
+    with a since-replaced reference profile is restarted.
+    """
+    slot = _windows.get(model)
+    if slot is None:
+        slot = _windows[model] = {"current": _new_window(model, width), "previous": None}
+    w = slot["current"]
+    if DRIFT_WINDOW_SECONDS > 0 and time.monotonic() - w.started >= DRIFT_WINDOW_SECONDS:
+        slot["previous"], w = w, _new_window(model, width)
+        slot["current"] = w
+    elif (check or w.filled == 0) and w.etag != _expected_etag(w.width):
+        slot["current"], slot["previous"] = _new_window(model, w.width), None
+        w = slot["current"]
+        _status["reference_changes"] += 1
+    if w.width != width:
+        _status["width_mismatches"] += 1
+        return None
+    return w
+
+
+def observe(model: str, features: Sequence[float], prediction: float):
+    """Record one scored vector (cheap: a row copy into the model's staging buffer)."""
+    if not DRIFT_MONITOR:
+        return
+    with _lock:
+        w = _current(model, len(features) + 1)
+        if w is not None:
+            try:
+                w.add_one(features, prediction)
+            except (TypeError, ValueError):
+                w.skipped += 1  # never fail the request over monitoring
+
+
+def observe_many(model: str, rows, predictions):
+    """Record a batch of scored vectors: `rows` (n x n_features) and their n predictions."""
+    if not DRIFT_MONITOR:
+        return
+    try:
+        X = np.asarray(rows, dtype=np.float64)
+        y = np.asarray(predictions, dtype=np.float64)
+    except (TypeError, ValueError):
+        return
+    if X.ndim != 2 or len(X) != len(y) or not len(X):
+        return
+    block = np.empty((len(X), X.shape[1] + 1))
+    block[:, :-1] = X
+    block[:, -1] = y
+    with _lock:
+        w = _current(model, block.shape[1], check=True)
+        if w is not None:
+            w.add(block)
+
+
+# --- scores ---
+def _ref_cdf(quantiles: np.ndarray, x: np.ndarray) -> np.ndarray:
+    # share of reference rows <= x, read off the quantile grid (a step function)
+    return np.clip((np.searchsorted(quantiles, x, side="right") - 1) / (len(quantiles) - 1), 0.0, 1.0)
+
+
+def _status_of(psi: Optional[float]) -> str:
+    if psi is None:
+        return "unknown"
+    if psi >= DRIFT_PSI_ALERT:
+        return "drift"
+    return "warn" if psi >= DRIFT_PSI_WARN else "ok"
+
+
+def _ks_critical(n: int, m: int) -> Optional[float]:
+    if not n or not m:
+        return None
+    return math.sqrt(-math.log(DRIFT_KS_ALPHA / 2.0) / 2.0) * math.sqrt((n + m) / (n * m))
+
+
+def _report(model: str, w: _Window, ref: Optional[_Reference], histograms: bool) -> Dict[str, Any]:
+    w._bin()
+    out: Dict[str, Any] = {"model": model, "started_at": w.started_at, "rows": w.rows, "skipped": w.skipped,
+                           "sketch_levels": len(w.levels), "memory_bytes": w.memory_bytes()}
+    names = (ref.feature_order if ref is not None and len(ref.feature_order) + 1 == w.width
+             else [f"f{i}" for i in range(w.width - 1)]) + [PREDICTION_COLUMN]
+    layout = ref.layout(model) if w.counts is not None else None
+    columns = layout["columns"] if layout is not None else [None] * w.width
+    if w.rows:
+        values, cum, total = w.sketch()
+    pct = np.asarray(REPORT_PERCENTILES) / 100.0
+
+    scores: Dict[str, Dict[str, Any]] = {}
+    for i, name in enumerate(names):
+        col: Dict[str, Any] = {"psi": None, "ks": None, "ks_critical": None}
+        if w.rows:
+            v, c = values[:, i], cum[:, i]
+            live_q = v[np.minimum(np.searchsorted(c, pct * total, side="left"), len(v) - 1)]
+            col["live"] = {"mean": float(w.sums[i] / w.rows),
+                           **{f"p{p}": float(q) for p, q in zip(REPORT_PERCENTILES, live_q)}}
+        ref_col = columns[i]
+        if ref_col is not None:
+            ref_q = np.asarray(ref_col["quantiles"])
+            step = (len(ref_q) - 1) / 100.0
+            col["reference"] = {"mean": ref_col["mean"],
+                                **{f"p{p}": float(ref_q[int(round(p * step))]) for p in REPORT_PERCENTILES}}
+            if w.rows:
+                share = np.maximum(w.counts[i] / w.rows, PSI_EPSILON)
+                expected = np.maximum(layout["proportions"][i], PSI_EPSILON)
+                col["psi"] = float(np.sum((share - expected) * np.log(share / expected)))
+                # both CDFs are right-continuous steps, so the sup is reached at a jump of either
+                points = np.concatenate([ref_q, v])
+                pos = np.searchsorted(v, points, side="right")
+                live_cdf = np.where(pos > 0, c[np.maximum(pos - 1, 0)], 0.0) / total
+                col["ks"] = float(np.max(np.abs(live_cdf - _ref_cdf(ref_q, points))))
+                col["ks_critical"] = _ks_critical(w.rows, int(ref_col["rows"]))
+                col["ks_reject"] = col["ks"] > col["ks_critical"]
+                if histograms:
+                    n_bins = len(ref_col["edges"]) + 1
+                    col["histogram"] = {"edges": ref_col["edges"], "reference": ref_col["proportions"],
+                                        "live": (w.counts[i, :n_bins] / w.rows).tolist()}
+        col["status"] = "insufficient_data" if w.rows < DRIFT_MIN_ROWS and col["psi"] is not None \
+            else _status_of(col["psi"])
+        scores[name] = col
+
+    prediction = scores.pop(PREDICTION_COLUMN)
+    psis = {name: s["psi"] for name, s in scores.items() if s["psi"] is not None}
+    worst = max(psis, key=psis.get) if psis else None
+    out["max_psi"] = psis[worst] if worst else None
+    out["max_psi_feature"] = worst
+    out["ks_rejected"] = sorted(name for name, s in scores.items() if s.get("ks_reject"))
+    if w.rows < DRIFT_MIN_ROWS and psis:
+        out["status"] = "insufficient_data"
+    else:
+        order = ["unknown", "ok", "warn", "drift"]
+        out["status"] = max([_status_of(psis[worst]) if worst else "unknown", _status_of(prediction["psi"])],
+                            key=order.index)
+    out["features"] = scores
+    out["prediction"] = prediction
+    return out
+
+
+def model_report(model: str, window: str = "current", histograms: bool = False) -> Optional[Dict[str, Any]]:
+    """PSI / KS per feature and for the predictions of `model` in its "current" or "previous" window."""
+    with _lock:
+        slot = _windows.get(model)
+        if slot is not None:
+            _current(model, slot["current"].width, check=True)
+        w = slot.get(window) if slot is not None else None
+        if w is None:
+            return None
+        ref, _ = _reference()
+        return _report(model, w, ref if w.counts is not None else None, histograms)
+
+
+def summary() -> Dict[str, Any]:
+    """Status, row count and the largest PSI per model and window."""
+    models: Dict[str, Any] = {}
+    with _lock:
+        for model in list(_windows):
+            _current(model, _windows[model]["current"].width, check=True)
+        ref, _ = _reference()
+        for model, slot in sorted(_windows.items()):
+            models[model] = {}
+            for name, w in slot.items():
+                if w is None:
+                    continue
+                r = _report(model, w, ref if w.counts is not None else None, False)
+                models[model][name] = {k: r[k] for k in ("started_at", "rows", "status", "max_psi",
+                                                         "max_psi_feature", "ks_rejected")}
+                models[model][name]["prediction_psi"] = r["prediction"]["psi"]
+    return {"reference": reference_info(), "window_seconds": DRIFT_WINDOW_SECONDS, "models": models}
+
+
+def reference_info() -> Optional[Dict[str, Any]]:
+    """Etag, creation time, row count and columns of the loaded reference profile."""
+    ref, etag = _reference()
+    if ref is None:
+        return None
+    return {"etag": etag, "created_at": ref.data.get("created_at"), "rows": ref.data.get("rows"),
+            "bins": ref.data.get("bins"), "feature_order": ref.feature_order,
+            "prediction_models": sorted(ref.predictions)}
+
+
+def reset(model: Optional[str] = None) -> List[str]:
+    """Drop the windows of `model` (or of every model); returns the models reset."""
+    with _lock:
+        models = [model] if model is not None else list(_windows)
+        for m in models:
+            _windows.pop(m, None)
+    return models
+
+
+def stats() -> Dict[str, Any]:
+    with _lock:
+        windows = {model: {name: {"rows": w.rows, "skipped": w.skipped, "levels": len(w.levels),
+                                  "memory_bytes": w.memory_bytes()}
+                           for name, w in slot.items() if w is not None}
+                   for model, slot in _windows.items()}
+        out = dict(_status)
+    out.update({"enabled": DRIFT_MONITOR, "sketch_k": DRIFT_SKETCH_K, "window_seconds": DRIFT_WINDOW_SECONDS,
+                "windows": windows})
+    return out
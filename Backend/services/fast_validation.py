@@ -0,0 +1,165 @@
+# services/fast_validation.py
+"""
+Schema-free request validation for POST /predict/fast.
+
+The regular /predict/ route validates with pydantic (List[float]), converts the
+features a second time with float(x), copies the available_models() dict and asks
+the metadata cache for the feature order on every request. This path instead:
+
+  - parses the body with json.loads only and checks the handful of fields by hand,
+  - copies the features straight into a preallocated float64 buffer (one per thread),
+    which coerces and type-checks them in one C-level pass,
+  - validates length, finiteness and ranges against a RequestSchema: the feature
+    count, lower / upper bounds per column and the set of served models, compiled
+    from feature_order.json, validation_rules.json and the model listing, and
+    rebuilt only when one of them changes (checked at most every
+    METADATA_CHECK_INTERVAL seconds).
+
+For a 12-value vector one chained comparison per column on the buffer's values is
+cheaper than NumPy's per-call overhead for elementwise comparisons + reductions, so
+the range check runs on buf.tolist() (also the list that is predicted and stored).
+
+Out-of-range vectors are rejected before inference. Bounds per column:
+  - every column is >= 0 (as the frontend form enforces) and finite;
+  - MonthlyHours within [monthly_min, monthly_max];
+  - GridConsumption_kWh <= grid_p99 * VALIDATION_P99_TOLERANCE and
+    total_appliance_power <= total_power_p99 * VALIDATION_P99_TOLERANCE
+    (p99s are percentiles of the training data, not hard limits, hence the tolerance).
+"""
+import json
+import os
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+import services.ai_service as ai_service
+
+# multiplier on the *_p99 limits; <= 0 disables the percentile checks
+VALIDATION_P99_TOLERANCE = float(os.getenv("VALIDATION_P99_TOLERANCE", "2.0"))
+
+# upper bound of unbounded columns: finite, so inf fails the check like NaN does
+_MAX = sys.float_info.max
+
+# column -> (rule giving the lower bound, rule giving the upper bound, upper bound is a p99)
+RANGE_RULES = {
+    "MonthlyHours": ("monthly_min", "monthly_max", False),
+    "GridConsumption_kWh": (None, "grid_p99", True),
+    "total_appliance_power": (None, "total_power_p99", True),
+}
+
+
+class RequestError(ValueError):
+    """Invalid request body; the message is the 400 detail."""
+
+
+class RequestSchema:
+    """Everything a request is checked against, precomputed for one metadata state."""
+
+    def __init__(self, feature_order: Optional[List[str]], rules: Optional[Dict[str, float]], models: Dict[str, str]):
+        self.feature_order = feature_order
+        self.n_features = len(feature_order) if feature_order else None
+        self.models = frozenset(models)
+        self.model_list = list(models)
+        self.bounds: Optional[List[Tuple[float, float]]] = None
+        if feature_order:
+            self.bounds = []
+            for name in feature_order:
+                lo_key, hi_key, is_p99 = RANGE_RULES.get(name, (None, None, False))
+                lo, hi = 0.0, _MAX
+                if rules and lo_key in rules:
+                    lo = rules[lo_key]
+                if rules and hi_key in rules and not (is_p99 and VALIDATION_P99_TOLERANCE <= 0):
+                    hi = rules[hi_key] * (VALIDATION_P99_TOLERANCE if is_p99 else 1.0)
+                self.bounds.append((lo, hi))
+
+    def out_of_range(self, values: List[float]) -> List[str]:
+        """Descriptions of the values outside their column's bounds (empty if valid)."""
+        # NaN fails every comparison and inf exceeds _MAX, so both are rejected here
+        for x, (lo, hi) in zip(values, self.bounds):
+            if not lo <= x <= hi:
+                break
+        else:
+            return []
+        return [f"{name}={x} not in [{lo}, {'inf' if hi == _MAX else hi}]"
+                for name, x, (lo, hi) in zip(self.feature_order, values, self.bounds) if not lo <= x <= hi]
+
+
+_schema_cache: Dict[str, Any] = {"key": None, "schema": None, "checked_at": 0.0}
+_schema_lock = threading.Lock()
+_buffers = threading.local()
+
+
+def schema() -> RequestSchema:
+    """Current RequestSchema; the metadata signatures are re-checked at most every METADATA_CHECK_INTERVAL."""
+    cache = _schema_cache
+    now = time.monotonic()
+    if cache["schema"] is not None and now - cache["checked_at"] < ai_service.METADATA_CHECK_INTERVAL:
+        return cache["schema"]
+    with _schema_lock:
+        feature_order, order_etag = ai_service.get_feature_order_with_etag()
+        rules, rules_etag = ai_service.get_validation_rules_with_etag()
+        models_etag = ai_service.available_models_etag()
+        key = (order_etag, rules_etag, models_etag, VALIDATION_P99_TOLERANCE)
+        if key != cache["key"] or cache["schema"] is None:
+            cache["schema"] = RequestSchema(feature_order, rules, ai_service.available_models())
+            cache["key"] = key
+        cache["checked_at"] = now
+        return cache["schema"]
+
+
+def invalidate():
+    _schema_cache["schema"] = None
+
+
+def _buffer(n: int) -> np.ndarray:
+    buf = getattr(_buffers, "buf", None)
+    if buf is None or buf.shape[0] != n:
+        buf = _buffers.buf = np.empty(n, dtype=np.float64)
+    return buf
+
+
+def parse_predict(body: bytes) -> Tuple[Dict[str, Any], List[float]]:
+    """
+    Parse and validate a /predict/fast body ({"house_id", "model", "features", "meta"?, "version"?}).
+    Returns the decoded dict and the features as float64 values. Raises RequestError.
+    """
+    try:
+        payload = json.loads(body)
+    except ValueError as e:
+        raise RequestError(f"Body is not valid JSON: {e}")
+    if not isinstance(payload, dict):
+        raise RequestError("Body must be a JSON object.")
+    house_id, model, features = payload.get("house_id"), payload.get("model"), payload.get("features")
+    if not isinstance(house_id, str) or not isinstance(model, str):
+        raise RequestError("`house_id` and `model` must be strings.")
+    version = payload.get("version")
+    if version is not None and not isinstance(version, str):
+        raise RequestError("`version` must be a string.")
+    meta = payload.get("meta")
+    if meta is not None and not isinstance(meta, dict):
+        raise RequestError("`meta` must be an object.")
+    if not isinstance(features, list):
+        raise RequestError("`features` must be a list of numeric values in training feature order.")
+
+    s = schema()
+    if model not in s.models:
+        raise RequestError(f"Model '{model}' not available. Available: {s.model_list}")
+    if s.n_features is not None and len(features) != s.n_features:
+        raise RequestError(f"Feature vector length mismatch: expected {s.n_features} features in order {s.feature_order}.")
+
+    buf = _buffer(len(features))
+    try:
+        buf[:] = features
+    except (TypeError, ValueError):
+        raise RequestError("All feature values must be numeric and convertible to float.")
+    values = buf.tolist()
+    if s.bounds is not None:
+        bad = s.out_of_range(values)
+        if bad:
+            raise RequestError(f"Feature values out of range: {'; '.join(bad)}")
+    elif not np.isfinite(buf).all():
+        raise RequestError("All feature values must be finite.")
+    return payload, values
@@ -0,0 +1,359 @@
+# services/feature_builder.py
+"""
+Server-side feature construction: raw named inputs -> feature vectors in
+feature_order.json order. This is the logic of buildFeaturesArray / applyAutoFill
+in FrontEnd/js/predict.js, so API clients can send raw records instead of
+re-implementing it.
+
+A raw record names what it knows, e.g.
+
+    {"city": "City B", "company": 2, "appliances": {"Fan": 3, "AirConditioner": 1},
+     "MonthlyHours": 300, "TariffRate": 7.5, "SolarGeneration_kWh": 120,
+     "GridConsumption_kWh": 310, "EnergySold_kWh": 0, "month": 7}
+
+and the builder derives the rest:
+  - appliances: counts per appliance (x DEFAULT_WATTS); appliance_power: watts per
+    appliance (quantity 1). Both feed the per-appliance power columns,
+    total_appliance_power, appliance_count and avg_power_per_appliance.
+  - consumption_per_hour = (grid + solar - sold) / MonthlyHours, or
+    consumption_kwh / MonthlyHours when the record gives consumption_kwh.
+  - City_code, Company_code and City_<x> one-hot columns from lookup tables:
+    CITY_CODES plus the optional MODEL_DIR/feature_encoders.json
+    ({"City_code": {"City A": 1, ...}, "Company_code": {"Name": 1, ...}}).
+  - Month_num from month or date; NetBill = grid * tariff.
+A feature named directly in the record always wins over its derivation. Missing
+optional values default like the frontend form (MonthlyHours 240, or 300 with an
+air conditioner; city 1; solar / grid / sold / appliances 0). TariffRate,
+Month_num and Company_code have no default, and unknown keys are rejected so
+typos do not become zeros.
+
+A FeatureBuilder is compiled once per (feature order, encoders): every column is
+resolved to a derivation up front, and build() fills the (n, n_features) matrix
+column by column with NumPy. builder() caches it until either file changes.
+"""
+import os
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+import services.ai_service as ai_service
+
+# watts per appliance, as in FrontEnd/js/predict.js
+DEFAULT_WATTS = {
+    "Fan": 70,
+    "Refrigerator": 150,
+    "AirConditioner": 1200,
+    "Television": 100,
+    "Monitor": 30,
+    "MotorPump": 500,
+}
+APPLIANCES = list(DEFAULT_WATTS)
+
+# City A-D -> 1-4 (the frontend's City_code select)
+CITY_CODES = {"A": 1, "B": 2, "C": 3, "D": 4}
+DEFAULT_CITY_CODE = 1
+
+# frontend MonthlyHours suggestion: 8 h/day x 30, or 10 h/day with an air conditioner
+DEFAULT_MONTHLY_HOURS = 240.0
+DEFAULT_MONTHLY_HOURS_AC = 300.0
+
+# features a missing value turns into 0, as the frontend form does
+ZERO_DEFAULT_FEATURES = {"SolarGeneration_kWh", "GridConsumption_kWh", "EnergySold_kWh"}
+
+# raw input keys besides feature names
+RAW_INPUTS = {"city", "company", "appliances", "appliance_power", "month", "date", "consumption_kwh"}
+KNOWN_FEATURES = set(APPLIANCES) | {
+    "total_appliance_power", "appliance_count", "avg_power_per_appliance", "MonthlyHours", "TariffRate",
+    "consumption_per_hour", "SolarGeneration_kWh", "GridConsumption_kWh", "EnergySold_kWh", "NetBill",
+    "Month_num", "City_code", "Company_code",
+}
+
+# at most this many problems are listed in one error message
+MAX_REPORTED_ERRORS = 20
+
+
+def _city_key(value) -> str:
+    """'City B', 'city_b', 'B' -> 'B'."""
+    s = str(value).strip().upper().replace("_", "").replace(" ", "")
+    return s[4:] if s.startswith("CITY") and len(s) > 4 else s
+
+
+def _company_key(value) -> str:
+    return str(value).strip().upper()
+
+
+def _parse_encoders(data) -> Optional[Dict[str, Dict[str, float]]]:
+    if not isinstance(data, dict):
+        return None
+    out = {}
+    for feature, key_fn in (("City_code", _city_key), ("Company_code", _company_key)):
+        table = data.get(feature)
+        if isinstance(table, dict):
+            out[feature] = {key_fn(k): float(v) for k, v in table.items() if isinstance(v, (int, float))}
+    return out
+
+
+_encoders_file = ai_service.MetadataFile(lambda: os.path.join(ai_service.MODEL_DIR, "feature_encoders.json"),
+                                         _parse_encoders)
+
+
+class _Batch:
+    """Per-build() view of the records: numeric columns extracted once, shared derivations memoised."""
+
+    def __init__(self, builder: "FeatureBuilder", records: Sequence[Dict[str, Any]]):
+        self.builder = builder
+        self.records = records
+        self.n = len(records)
+        self.errors: List[str] = []
+        self._memo: Dict[str, np.ndarray] = {}
+
+    def error(self, i: int, message: str):
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(f"record {i}: {message}")
+
+    def field(self, name: str) -> np.ndarray:
+        """Float column for a top-level key; NaN where the key is missing or null."""
+        key = "field:" + name
+        if key not in self._memo:
+            out = np.full(self.n, np.nan)
+            for i, r in enumerate(self.records):
+                v = r.get(name)
+                if v is None:
+                    continue
+                try:
+                    out[i] = float(v)
+                except (TypeError, ValueError):
+                    self.error(i, f"`{name}` must be numeric")
+            self._memo[key] = out
+        return self._memo[key]
+
+    def memo(self, key: str, fn: Callable[[], np.ndarray]) -> np.ndarray:
+        if key not in self._memo:
+            self._memo[key] = fn()
+        return self._memo[key]
+
+    def appliance_watts(self) -> np.ndarray:
+        """(n, len(APPLIANCES)) watts and (n, len(APPLIANCES)) quantities, stacked on axis 0."""
+        def compute():
+            watts = np.zeros((self.n, len(APPLIANCES)))
+            qty = np.zeros((self.n, len(APPLIANCES)))
+            col = {a: j for j, a in enumerate(APPLIANCES)}
+            for i, r in enumerate(self.records):
+                for mapping, is_count in ((r.get("appliances"), True), (r.get("appliance_power"), False)):
+                    if not mapping:
+                        continue
+                    if not isinstance(mapping, dict):
+                        self.error(i, "`appliances` / `appliance_power` must map appliance names to numbers")
+                        continue
+                    for name, v in mapping.items():
+                        j = col.get(name)
+                        if j is None:
+                            self.error(i, f"unknown appliance {name!r}; known: {APPLIANCES}")
+                            continue
+                        try:
+                            v = float(v)
+                        except (TypeError, ValueError):
+                            self.error(i, f"appliance {name!r} must be numeric")
+                            continue
+                        if v < 0:
+                            self.error(i, f"appliance {name!r} must be >= 0")
+                            continue
+                        if is_count:
+                            watts[i, j] += v * DEFAULT_WATTS[name]
+                            qty[i, j] += v
+                        else:
+                            watts[i, j] += v
+                            qty[i, j] += 1.0 if v > 0 else 0.0
+            return np.stack([watts, qty])
+        return self.memo("appliances", compute)
+
+    def code(self, feature: str, raw_key: str, key_fn, default: Optional[float]) -> np.ndarray:
+        """City_code / Company_code: the feature itself, else the raw key via the lookup table."""
+        def compute():
+            table = self.builder.encoders.get(feature, {})
+            out = self.field(feature).copy()
+            for i, r in enumerate(self.records):
+                if not np.isnan(out[i]):
+                    continue
+                v = r.get(raw_key)
+                if v is None:
+                    if default is not None:
+                        out[i] = default
+                    continue
+                if isinstance(v, (int, float)) and not isinstance(v, bool):
+                    out[i] = float(v)
+                    continue
+                code = table.get(key_fn(v))
+                if code is None:
+                    try:
+                        code = float(v)
+                    except (TypeError, ValueError):
+                        self.error(i, f"unknown {raw_key} {v!r}; known: {sorted(table)}")
+                        continue
+                out[i] = code
+            return out
+        return self.memo(feature, compute)
+
+    def month(self) -> np.ndarray:
+        def compute():
+            out = self.field("Month_num").copy()
+            months = self.field("month")
+            out = np.where(np.isnan(out), months, out)
+            for i, r in enumerate(self.records):
+                if np.isnan(out[i]) and r.get("date") is not None:
+                    try:
+                        out[i] = datetime.fromisoformat(str(r["date"])).month
+                    except ValueError:
+                        self.error(i, "`date` must be ISO format (YYYY-MM-DD or full ISO)")
+            bad = ~np.isnan(out) & ((out < 1) | (out > 12))
+            for i in np.flatnonzero(bad)[:MAX_REPORTED_ERRORS]:
+                self.error(int(i), "month must be between 1 and 12")
+            return out
+        return self.memo("Month_num", compute)
+
+
+def _or(direct: np.ndarray, derived: np.ndarray) -> np.ndarray:
+    return np.where(np.isnan(direct), derived, direct)
+
+
+def _zero(b: _Batch, name: str) -> np.ndarray:
+    return np.nan_to_num(b.field(name), nan=0.0)
+
+
+def _derived(b: _Batch, name: str) -> np.ndarray:
+    return b.memo("derived:" + name, lambda: DERIVATIONS[name](b))
+
+
+def _total_power(b: _Batch) -> np.ndarray:
+    listed = np.array([bool(r.get("appliances") or r.get("appliance_power")) for r in b.records], dtype=bool)
+    # the frontend's autofill: total = avg * count when only those are given
+    from_avg = np.nan_to_num(b.field("avg_power_per_appliance") * b.field("appliance_count"), nan=0.0)
+    return _or(b.field("total_appliance_power"), np.where(listed, b.appliance_watts()[0].sum(axis=1), from_avg))
+
+
+def _count(b: _Batch) -> np.ndarray:
+    return _or(b.field("appliance_count"), b.appliance_watts()[1].sum(axis=1))
+
+
+def _avg_power(b: _Batch) -> np.ndarray:
+    total, count = _derived(b, "total_appliance_power"), _derived(b, "appliance_count")
+    with np.errstate(divide="ignore", invalid="ignore"):
+        avg = np.where(count > 0, total / count, 0.0)
+    return _or(b.field("avg_power_per_appliance"), avg)
+
+
+def _monthly_hours(b: _Batch) -> np.ndarray:
+    has_ac = b.appliance_watts()[0][:, APPLIANCES.index("AirConditioner")] > 0
+    return _or(b.field("MonthlyHours"), np.where(has_ac, DEFAULT_MONTHLY_HOURS_AC, DEFAULT_MONTHLY_HOURS))
+
+
+def _consumption_per_hour(b: _Batch) -> np.ndarray:
+    balance = _zero(b, "GridConsumption_kWh") + _zero(b, "SolarGeneration_kWh") - _zero(b, "EnergySold_kWh")
+    consumption = _or(b.field("consumption_kwh"), balance)
+    hours = _derived(b, "MonthlyHours")
+    with np.errstate(divide="ignore", invalid="ignore"):
+        per_hour = np.where(hours > 0, consumption / hours, 0.0)
+    return _or(b.field("consumption_per_hour"), per_hour)
+
+
+def _net_bill(b: _Batch) -> np.ndarray:
+    return _or(b.field("NetBill"), np.round(_zero(b, "GridConsumption_kWh") * b.field("TariffRate"), 2))
+
+
+DERIVATIONS: Dict[str, Callable[[_Batch], np.ndarray]] = {
+    "total_appliance_power": _total_power,
+    "appliance_count": _count,
+    "avg_power_per_appliance": _avg_power,
+    "MonthlyHours": _monthly_hours,
+    "consumption_per_hour": _consumption_per_hour,
+    "NetBill": _net_bill,
+    "Month_num": lambda b: b.month(),
+    "City_code": lambda b: b.code("City_code", "city", _city_key, DEFAULT_CITY_CODE),
+    "Company_code": lambda b: b.code("Company_code", "company", _company_key, None),
+}
+
+
+class FeatureBuilder:
+    """Compiled column plan for one feature order and set of lookup tables."""
+
+    def __init__(self, feature_order: List[str], encoders: Optional[Dict[str, Dict[str, float]]] = None):
+        self.feature_order = list(feature_order)
+        self.encoders = {"City_code": dict(CITY_CODES)}
+        for feature, table in (encoders or {}).items():
+            self.encoders.setdefault(feature, {}).update(table)
+        self.allowed_keys = RAW_INPUTS | KNOWN_FEATURES | set(self.feature_order)
+        self._plan = [self._compile(name) for name in self.feature_order]
+
+    def _compile(self, name: str) -> Callable[[_Batch], np.ndarray]:
+        if name in DERIVATIONS:
+            return lambda b: _derived(b, name)
+        if name in DEFAULT_WATTS:
+            j = APPLIANCES.index(name)
+            return lambda b: _or(b.field(name), b.appliance_watts()[0][:, j])
+        if name.startswith("City_"):
+            # one-hot column, e.g. City_City_B or City_B
+            code = self.encoders["City_code"].get(_city_key(name[len("City_"):]))
+            return lambda b: (_derived(b, "City_code") == code).astype(np.float64)
+        if name in ZERO_DEFAULT_FEATURES:
+            return lambda b: _zero(b, name)
+        return lambda b: b.field(name)
+
+    def build(self, records: Sequence[Dict[str, Any]]) -> np.ndarray:
+        """
+        (len(records), len(feature_order)) float64 matrix. Raises ValueError listing
+        the offending records if a value is invalid or a required feature is missing.
+        """
+        b = _Batch(self, records)
+        for i, r in enumerate(records):
+            if not isinstance(r, dict):
+                b.error(i, "must be an object of named inputs")
+                continue
+            unknown = [k for k in r if k not in self.allowed_keys]
+            if unknown:
+                b.error(i, f"unknown inputs {unknown}")
+        if b.errors:
+            raise ValueError("; ".join(b.errors))
+
+        X = np.empty((b.n, len(self.feature_order)))
+        for j, fn in enumerate(self._plan):
+            X[:, j] = fn(b)
+        if b.errors:
+            raise ValueError("; ".join(b.errors))
+        missing = np.isnan(X)
+        if missing.any():
+            for i, j in zip(*np.nonzero(missing)):
+                b.error(int(i), f"missing `{self.feature_order[j]}`")
+                if len(b.errors) >= MAX_REPORTED_ERRORS:
+                    break
+        if b.errors:
+            raise ValueError("; ".join(b.errors))
+        return X
+
+
+_builder_cache: Dict[str, Any] = {"key": None, "builder": None}
+_builder_lock = threading.Lock()
+
+
+def builder() -> FeatureBuilder:
+    """FeatureBuilder for the current feature_order.json and feature_encoders.json (cached until they change)."""
+    feature_order, order_etag = ai_service.get_feature_order_with_etag()
+    if not feature_order:
+        raise ValueError("feature_order.json is required to build features from named inputs")
+    encoders, enc_etag = _encoders_file.get()
+    key = (order_etag, enc_etag)
+    with _builder_lock:
+        if _builder_cache["key"] != key or _builder_cache["builder"] is None:
+            _builder_cache["builder"] = FeatureBuilder(feature_order, encoders)
+            _builder_cache["key"] = key
+        return _builder_cache["builder"]
+
+
+def build_features(records: Sequence[Dict[str, Any]]) -> np.ndarray:
+    """Feature matrix for raw records with the current builder. Raises ValueError."""
+    return builder().build(records)
+
+
+def reload():
+    _encoders_file.invalidate()
@@ -0,0 +1,314 @@
+# services/forecast_service.py
+"""
+Multi-month consumption forecasts from stored household history (POST /forecast/).
+
+Pipeline:
+  1. Ingest: household records are folded into per-house monthly accumulators
+     (days recorded, kWh, appliance hours, appliances used). A refresh only reads
+     records added since the previous one: the collection is scanned in _id order
+     from an id_watermark (shared with rollup_service), re-reading FORECAST_RESCAN_SECONDS of overlap (ids already
+     seen are skipped) so records a write-behind queue inserts slightly out of
+     order are not missed. The cursor is read outside the state lock and folded in
+     batches of FORECAST_SCAN_BATCH records.
+  2. Feature frame: per house, one row per recorded month with the
+     consumption-derived features (FRAME_COLUMNS). Rebuilt only when the house
+     received new records.
+  3. Horizon rows: for months t+1 .. t+H after the house's last recorded month,
+     the mean of its last FORECAST_WINDOW frame rows, Month_num of the target month
+     and the house profile (TariffRate, SolarGeneration_kWh, City_code, ...),
+     arranged in feature_order.json order.
+  4. Predict: rows of every house and horizon that need recomputing go through the
+     model as one matrix per FORECAST_BATCH_ROWS rows. Results are cached per house
+     and (model artifact, horizon, profile), so refreshing a fleet forecast only
+     recomputes houses with new data (or all of them after a model swap). The model
+     runs outside the state lock, on frames copied under it.
+
+appliance_usage values are read as hours of use per day; appliance power comes
+from DEFAULT_WATTS, the per-appliance defaults of the frontend form.
+Updated or deleted household records are not tracked incrementally; reset()
+rebuilds the state from scratch.
+"""
+import calendar
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+import services.ai_service as ai_service
+from services.feature_builder import DEFAULT_WATTS
+from services.id_watermark import IdWatermark, scan
+
+FORECAST_MAX_HORIZON = int(os.getenv("FORECAST_MAX_HORIZON", "24"))
+# months of history averaged into the features of every horizon
+FORECAST_WINDOW = int(os.getenv("FORECAST_WINDOW", "3"))
+# rows per model call when predicting a fleet
+FORECAST_BATCH_ROWS = int(os.getenv("FORECAST_BATCH_ROWS", "50000"))
+# records folded per lock acquisition by refresh()
+FORECAST_SCAN_BATCH = int(os.getenv("FORECAST_SCAN_BATCH", "5000"))
+# overlap re-read on every refresh to pick up records inserted out of _id order
+FORECAST_RESCAN_SECONDS = float(os.getenv("FORECAST_RESCAN_SECONDS", "5"))
+# cached forecasts (model / horizon / profile combinations) kept per house
+FORECAST_CACHE_PER_HOUSE = int(os.getenv("FORECAST_CACHE_PER_HOUSE", "4"))
+
+# per-month features computed from history; consumption_kwh only feeds the derived grid/sold columns
+FRAME_COLUMNS = ["total_appliance_power", "appliance_count", "avg_power_per_appliance", "MonthlyHours",
+                 "consumption_per_hour", "consumption_kwh"]
+_COL = {name: i for i, name in enumerate(FRAME_COLUMNS)}
+
+# values for features the history does not contain; overridable per request and per house
+DEFAULT_PROFILE = {
+    "TariffRate": 0.0,
+    "SolarGeneration_kWh": 0.0,
+    "City_code": 1.0,
+    "Company_code": 1.0,
+}
+
+HOUSEHOLD_PROJECTION = {"house_id": 1, "date": 1, "appliance_usage": 1, "total_consumption_kwh": 1}
+MAX_MONTHLY_HOURS = 744.0  # 31 * 24
+
+
+def month_index(value) -> int:
+    """Months since year 0 for a stored `date` (ISO string or datetime)."""
+    if isinstance(value, datetime):
+        return value.year * 12 + value.month - 1
+    s = str(value)
+    return int(s[:4]) * 12 + int(s[5:7]) - 1
+
+
+def month_label(index: int) -> str:
+    return f"{index // 12:04d}-{index % 12 + 1:02d}"
+
+
+class _House:
+    __slots__ = ("months", "data_version", "frame", "forecasts")
+
+    def __init__(self):
+        # month index -> [records, kWh, appliance hours, set of appliances used]
+        self.months: Dict[int, list] = {}
+        self.data_version = 0
+        self.frame: Optional[Tuple[np.ndarray, np.ndarray]] = None
+        self.forecasts: "OrderedDict[tuple, tuple]" = OrderedDict()
+
+    def add(self, doc: Dict[str, Any]):
+        m = month_index(doc["date"])
+        usage = doc.get("appliance_usage") or {}
+        kwh = float(doc.get("total_consumption_kwh") or 0.0)
+        hours = max((float(v) for v in usage.values()), default=0.0)
+        used = [a for a, v in usage.items() if float(v) > 0]
+        acc = self.months.get(m)
+        if acc is None:
+            acc = self.months[m] = [0, 0.0, 0.0, set()]
+        acc[0] += 1
+        acc[1] += kwh
+        acc[2] += hours
+        acc[3].update(used)
+        self.data_version += 1
+        self.frame = None
+
+    def get_frame(self) -> Tuple[np.ndarray, np.ndarray]:
+        """(month indices, rows of FRAME_COLUMNS) in month order; cached until new data arrives."""
+        if self.frame is None:
+            idx = sorted(self.months)
+            values = np.empty((len(idx), len(FRAME_COLUMNS)))
+            for r, m in enumerate(idx):
+                days, kwh, hours, used = self.months[m]
+                # scale the recorded days up to the full month
+                in_month = calendar.monthrange(m // 12, m % 12 + 1)[1]
+                monthly_kwh = kwh / days * in_month
+                monthly_hours = min(hours / days * in_month, MAX_MONTHLY_HOURS)
+                power = float(sum(DEFAULT_WATTS.get(a, 0) for a in used))
+                count = len(used)
+                values[r] = (power, count, power / count if count else 0.0, monthly_hours,
+                             monthly_kwh / monthly_hours if monthly_hours else 0.0, monthly_kwh)
+            self.frame = (np.asarray(idx, dtype=np.int64), values)
+        return self.frame
+
+
+# --- state ---
+_houses: Dict[str, _House] = {}
+_lock = threading.RLock()
+# one refresh() scan at a time (forecasts only take _lock)
+_scan_lock = threading.Lock()
+_watermark = IdWatermark(FORECAST_RESCAN_SECONDS)
+_status: Dict[str, Any] = {"refreshed_at": None}
+
+
+def _household_col():
+    from models.database import household_col
+    return household_col
+
+
+def refresh() -> Dict[str, Any]:
+    """Fold household records added since the last refresh into the monthly accumulators."""
+    col = _household_col()
+    t0 = time.perf_counter()
+    touched = set()
+
+    def fold(doc: Dict[str, Any]):
+        house_id = doc.get("house_id")
+        house = _houses.get(house_id)
+        if house is None:
+            house = _houses[house_id] = _House()
+        house.add(doc)
+        touched.add(house_id)
+
+    with _scan_lock:
+        read = scan(col, HOUSEHOLD_PROJECTION, _watermark, fold, _lock, FORECAST_SCAN_BATCH)
+        _status["refreshed_at"] = datetime.now(timezone.utc).isoformat()
+    return {"records": read, "houses_updated": len(touched), "ms": round((time.perf_counter() - t0) * 1000.0, 3)}
+
+
+def reset():
+    """Drop all accumulated history and cached forecasts; the next refresh rescans everything."""
+    global _watermark
+    with _scan_lock, _lock:
+        _houses.clear()
+        _watermark = IdWatermark(FORECAST_RESCAN_SECONDS)
+        _status["refreshed_at"] = None
+
+
+def stats() -> Dict[str, Any]:
+    with _lock:
+        return {
+            "houses": len(_houses),
+            "records": _watermark.records,
+            "months": sum(len(h.months) for h in _houses.values()),
+            "cached_forecasts": sum(len(h.forecasts) for h in _houses.values()),
+            "watermark": _watermark.time.isoformat() if _watermark.time else None,
+            "refreshed_at": _status["refreshed_at"],
+            "window": FORECAST_WINDOW,
+        }
+
+
+def _profile_for(house_id: str, profile: Optional[Dict[str, float]],
+                 profiles: Optional[Dict[str, Dict[str, float]]]) -> Dict[str, float]:
+    out = dict(DEFAULT_PROFILE)
+    if profile:
+        out.update(profile)
+    if profiles and house_id in profiles:
+        out.update(profiles[house_id])
+    return {k: float(v) for k, v in out.items()}
+
+
+def _horizon_matrix(feature_order: List[str], bases: np.ndarray, last_months: np.ndarray,
+                    house_profiles: List[Dict[str, float]], horizon: int) -> Tuple[np.ndarray, List[str]]:
+    """
+    Rows (house-major, then horizon) in feature order for houses whose rolling base
+    features are `bases` (n, len(FRAME_COLUMNS)). Returns the matrix and the features
+    that had no source (filled with 0).
+    """
+    n = len(bases)
+    target = last_months[:, None] + np.arange(1, horizon + 1)[None, :]
+    X = np.zeros((n * horizon, len(feature_order)))
+    unfilled = []
+    for j, name in enumerate(feature_order):
+        if name == "Month_num":
+            X[:, j] = (target % 12 + 1).ravel()
+            continue
+        if name in _COL and name != "consumption_kwh":
+            X[:, j] = np.repeat(bases[:, _COL[name]], horizon)
+            continue
+        given = [p.get(name) for p in house_profiles]
+        if name in ("GridConsumption_kWh", "EnergySold_kWh"):
+            # not in the history: monthly kWh minus solar, unless the profile sets it
+            solar = np.array([p.get("SolarGeneration_kWh", 0.0) for p in house_profiles])
+            kwh = bases[:, _COL["consumption_kwh"]]
+            derived = np.maximum(kwh - solar, 0.0) if name == "GridConsumption_kWh" else np.maximum(solar - kwh, 0.0)
+            column = [d if g is None else g for g, d in zip(given, derived.tolist())]
+        elif all(g is None for g in given):
+            unfilled.append(name)
+            continue
+        else:
+            column = [0.0 if g is None else g for g in given]
+        X[:, j] = np.repeat(column, horizon)
+    return X, unfilled
+
+
+def forecast(model_key: str, house_ids: Optional[List[str]] = None, horizon: int = 12,
+             version: Optional[str] = None, profile: Optional[Dict[str, float]] = None,
+             profiles: Optional[Dict[str, Dict[str, float]]] = None, refresh_history: bool = True) -> Dict[str, Any]:
+    """
+    Forecast `horizon` months after each house's last recorded month.
+    `house_ids` None means every house with history. `profile` overrides DEFAULT_PROFILE
+    for all houses, `profiles[house_id]` per house.
+    Raises ValueError for a bad horizon or a missing feature_order.json, and
+    KeyError / FileNotFoundError / RuntimeError from model loading.
+    """
+    if not 1 <= horizon <= FORECAST_MAX_HORIZON:
+        raise ValueError(f"`horizon` must be between 1 and {FORECAST_MAX_HORIZON}")
+    feature_order = ai_service.get_feature_order()
+    if not feature_order:
+        raise ValueError("feature_order.json is required for forecasting")
+    mv = ai_service.get_model_version(model_key, version)
+    ingest = refresh() if refresh_history else None
+
+    t0 = time.perf_counter()
+    # pick the houses to recompute and copy their frames under _lock; the model runs outside it
+    with _lock:
+        wanted = list(_houses) if house_ids is None else list(dict.fromkeys(house_ids))
+        missing = [h for h in wanted if h not in _houses or not _houses[h].months]
+        todo, results = [], {}
+        for house_id in wanted:
+            house = _houses.get(house_id)
+            if house is None or not house.months:
+                continue
+            p = _profile_for(house_id, profile, profiles)
+            key = (mv.artifact_hash, horizon, tuple(sorted(p.items())), tuple(feature_order))
+            hit = house.forecasts.get(key)
+            if hit is not None and hit[0] == house.data_version:
+                house.forecasts.move_to_end(key)
+                results[house_id] = hit
+            else:
+                todo.append((house_id, house, p, key, house.data_version, house.get_frame()))
+
+    unfilled = set()
+    step = max(1, FORECAST_BATCH_ROWS // horizon)
+    for start in range(0, len(todo), step):
+        chunk = todo[start:start + step]
+        frames = [frame for *_, frame in chunk]
+        bases = np.stack([values[-FORECAST_WINDOW:].mean(axis=0) for _, values in frames])
+        last_months = np.array([idx[-1] for idx, _ in frames], dtype=np.int64)
+        X, missing_features = _horizon_matrix(feature_order, bases, last_months,
+                                              [p for _, _, p, *_ in chunk], horizon)
+        unfilled.update(missing_features)
+        preds = ai_service.predict_matrix(mv, X).reshape(len(chunk), horizon)
+        with _lock:
+            for (house_id, house, _, key, data_version, _), last, row in zip(chunk, last_months.tolist(),
+                                                                              preds.tolist()):
+                # stamped with the data version the frame was built from: if records arrived
+                # meanwhile, the next forecast recomputes this house
+                entry = (data_version, last, row)
+                house.forecasts[key] = entry
+                house.forecasts.move_to_end(key)
+                while len(house.forecasts) > FORECAST_CACHE_PER_HOUSE:
+                    house.forecasts.popitem(last=False)
+                results[house_id] = entry
+
+    out = []
+    for house_id in wanted:
+        if house_id not in results:
+            continue
+        _, last, values = results[house_id]
+        out.append({
+            "house_id": house_id,
+            "last_month": month_label(last),
+            "months": [month_label(last + h) for h in range(1, horizon + 1)],
+            "predicted_kwh": values,
+        })
+    return {
+        "model": model_key,
+        "model_version": mv.version,
+        "horizon": horizon,
+        "count": len(out),
+        "recomputed": len(todo),
+        "cached": len(out) - len(todo),
+        "missing": missing,
+        "unfilled_features": sorted(unfilled),
+        "ingest": ingest,
+        "ms": round((time.perf_counter() - t0) * 1000.0, 3),
+        "forecasts": out,
+    }
@@ -0,0 +1,123 @@
+# services/id_watermark.py
+"""
+Incremental scans of a Mongo collection in _id order, shared by forecast_service and
+rollup_service.
+
+An IdWatermark remembers the generation time of the newest _id folded in and the ids
+seen within the last `rescan_seconds`. scan() re-reads that overlap on every pass, so
+records a write-behind queue (or another process) inserts slightly out of _id order
+are still picked up, and skips the remembered ids so nothing is folded in twice. Ids
+older than the window can never be read again and are forgotten.
+
+The cursor is read without the caller's lock; every `batch_size` records are folded
+in one short section under it, so readers and live inserts wait for one batch at most.
+"""
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from bson import ObjectId
+
+
+class IdWatermark:
+    """Newest id time seen in one collection and the ids inside the rescan window."""
+
+    def __init__(self, rescan_seconds: float):
+        self.window = timedelta(seconds=rescan_seconds)
+        self.time: Optional[datetime] = None
+        self.recent: Dict[ObjectId, datetime] = {}
+        self.records = 0
+        self.pruned_at: Optional[datetime] = None
+
+    def first_sight(self, oid) -> bool:
+        """Register `oid`; False if it was already counted."""
+        if not isinstance(oid, ObjectId):
+            try:
+                oid = ObjectId(oid)
+            except Exception:
+                return True  # foreign id scheme: cannot be deduplicated, count it
+        if oid in self.recent:
+            return False
+        created = oid.generation_time
+        if self.time is not None and created < self.time - self.window:
+            # older than anything a rescan reads: only live inserts get here, count them once
+            self.records += 1
+            return True
+        self.recent[oid] = created
+        if self.time is None or created > self.time:
+            self.time = created
+        self.records += 1
+        return True
+
+    def prune(self, force: bool = True):
+        """Forget ids older than the rescan window; without `force` only once the window has moved on."""
+        if self.time is None:
+            return
+        if not force and self.pruned_at is not None and self.time - self.pruned_at < self.window:
+            return
+        cutoff = self.time - self.window
+        for oid in [o for o, t in self.recent.items() if t < cutoff]:
+            del self.recent[oid]
+        self.pruned_at = self.time
+
+    def query(self) -> Dict[str, Any]:
+        if self.time is None:
+            return {}
+        return {"_id": {"$gte": ObjectId.from_datetime(self.time - self.window)}}
+
+    def to_json(self) -> Dict[str, Any]:
+        return {"time": self.time.isoformat() if self.time else None,
+                "recent": [str(o) for o in self.recent], "records": self.records}
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any], rescan_seconds: float) -> "IdWatermark":
+        mark = cls(rescan_seconds)
+        mark.time = datetime.fromisoformat(data["time"]) if data.get("time") else None
+        mark.recent = {o: o.generation_time for o in map(ObjectId, data.get("recent", []))}
+        mark.records = int(data.get("records", 0))
+        return mark
+
+
+def fold_new(mark: IdWatermark, fold: Callable[[Dict[str, Any]], None],
+             docs: List[Dict[str, Any]], ids: List[Any]) -> int:
+    """
+    fold(doc) for the docs `mark` has not counted yet; returns how many were folded.
+    Docs fold() rejects with KeyError / TypeError / ValueError are skipped. The caller
+    holds the lock guarding `mark` and the folded state.
+    """
+    added = 0
+    for doc, oid in zip(docs, ids):
+        if not mark.first_sight(oid):
+            continue
+        try:
+            fold(doc)
+        except (KeyError, TypeError, ValueError):
+            continue  # record without a usable house / date / value
+        added += 1
+    mark.prune(force=False)
+    return added
+
+
+def scan(col, projection: Dict[str, int], mark: IdWatermark, fold: Callable[[Dict[str, Any]], None],
+         lock, batch_size: int) -> int:
+    """
+    Fold the records of `col` from `mark`'s watermark on, in _id order; returns how many
+    were folded. The cursor is read without `lock`; every `batch_size` records go through
+    fold_new() in one `lock` section.
+    """
+    with lock:
+        query = mark.query()
+    cursor = col.find(query, projection).sort([("_id", 1)]).batch_size(batch_size)
+    read = 0
+    batch: List[Dict[str, Any]] = []
+    for doc in cursor:
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            with lock:
+                read += fold_new(mark, fold, batch, [d["_id"] for d in batch])
+            batch = []
+    if batch:
+        with lock:
+            read += fold_new(mark, fold, batch, [d["_id"] for d in batch])
+    with lock:
+        mark.prune()
+    return read
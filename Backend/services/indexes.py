@@ -0,0 +1,44 @@
+# services/indexes.py
+"""
+MongoDB index definitions, created on application startup.
+
+The compound indexes end with _id so they serve the keyset pagination used by
+/predict/history and /household/{house_id} (sort key + _id tie-breaker).
+"""
+import traceback
+from typing import Dict, List
+
+PREDICTION_INDEXES = [
+    # GET /predict/history?model=...  (newest first)
+    {"keys": [("model", 1), ("timestamp", -1), ("_id", -1)], "name": "model_timestamp"},
+    # GET /predict/history?house_id=...
+    {"keys": [("house_id", 1), ("timestamp", -1), ("_id", -1)], "name": "house_timestamp"},
+    # GET /predict/history without filters
+    {"keys": [("timestamp", -1), ("_id", -1)], "name": "timestamp"},
+]
+
+HOUSEHOLD_INDEXES = [
+    # GET /household/{house_id}  (chronological)
+    {"keys": [("house_id", 1), ("date", 1), ("_id", 1)], "name": "house_date"},
+    # GET /export/household without house_id (date order, streamed without an in-memory sort)
+    {"keys": [("date", 1), ("_id", 1)], "name": "date"},
+]
+
+
+def _create(collection, specs) -> List[str]:
+    created = []
+    for spec in specs:
+        try:
+            created.append(collection.create_index(spec["keys"], name=spec["name"], background=True))
+        except Exception:
+            # a missing index slows queries down but must not stop the API from starting
+            traceback.print_exc()
+    return created
+
+
+def ensure_indexes(pred_col, household_col) -> Dict[str, List[str]]:
+    """Create (idempotently) every index the routes rely on. Returns the index names per collection."""
+    return {
+        "predictions": _create(pred_col, PREDICTION_INDEXES),
+        "household": _create(household_col, HOUSEHOLD_INDEXES),
+    }
@@ -0,0 +1,269 @@
+# services/memory_store.py
+"""
+In-memory stand-in for the pymongo collections exported by models.database.
+
+Implements the subset of the Collection / Cursor API the routes use
+(insert_one, insert_many, find with sort/limit/skip/batch_size, count_documents,
+create_index, plus replace_one / bulk_write for the record migration) so handlers and services.persistence can be exercised without a
+MongoDB server. Filters support equality plus $eq/$ne/$lt/$lte/$gt/$gte/$in/$type
+and top-level $and/$or. Like MongoDB, range operators only match values of the
+operand's type, and sorting orders values of different types by BSON type.
+
+Usage:
+    import sys, types
+    from services.memory_store import InMemoryCollection
+    db = types.ModuleType("models.database")
+    db.pred_col = InMemoryCollection("predictions")
+    db.household_col = InMemoryCollection("household")
+    sys.modules["models.database"] = db
+"""
+import copy
+import threading
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Any, Dict, Iterable, List, Optional
+
+from bson import ObjectId
+
+
+def _compare(op: str, value: Any, operand: Any) -> bool:
+    if op == "$eq":
+        return value == operand
+    if op == "$ne":
+        return value != operand
+    if op == "$in":
+        return value in operand
+    if op == "$nin":
+        return value not in operand
+    if op == "$exists":
+        return (value is not _MISSING) == bool(operand)
+    if op == "$type":
+        return value is not _MISSING and _TYPE_NAMES.get(type(value)) == operand
+    if value is _MISSING or value is None:
+        return False
+    if _type_rank(value) != _type_rank(operand):
+        return False
+    try:
+        if op == "$lt":
+            return value < operand
+        if op == "$lte":
+            return value <= operand
+        if op == "$gt":
+            return value > operand
+        if op == "$gte":
+            return value >= operand
+    except TypeError:
+        return False
+    raise ValueError(f"Unsupported query operator: {op}")
+
+
+_MISSING = object()
+
+_TYPE_NAMES = {float: "double", int: "int", str: "string", dict: "object", list: "array", bytes: "binData",
+               ObjectId: "objectId", bool: "bool", datetime: "date", type(None): "null"}
+# BSON comparison order of the types above (numbers compare with each other)
+_TYPE_RANKS = {type(None): 0, int: 1, float: 1, str: 2, dict: 3, list: 4, bytes: 5, ObjectId: 6, bool: 7, datetime: 8}
+
+
+def _type_rank(value: Any) -> int:
+    return _TYPE_RANKS.get(type(value), 9)
+
+
+def _get(doc: Dict[str, Any], path: str) -> Any:
+    cur: Any = doc
+    for part in path.split("."):
+        if not isinstance(cur, dict) or part not in cur:
+            return _MISSING
+        cur = cur[part]
+    return cur
+
+
+def matches(doc: Dict[str, Any], query: Optional[Dict[str, Any]]) -> bool:
+    """Evaluate a (small subset of a) MongoDB query document against `doc`."""
+    if not query:
+        return True
+    for key, cond in query.items():
+        if key == "$and":
+            if not all(matches(doc, q) for q in cond):
+                return False
+            continue
+        if key == "$or":
+            if not any(matches(doc, q) for q in cond):
+                return False
+            continue
+        value = _get(doc, key)
+        if isinstance(cond, dict) and cond and all(k.startswith("$") for k in cond):
+            if not all(_compare(op, value, operand) for op, operand in cond.items()):
+                return False
+        elif value is _MISSING or value != cond:
+            return False
+    return True
+
+
+def _project(doc: Dict[str, Any], projection: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    if not projection:
+        return copy.deepcopy(doc)
+    include = {k for k, v in projection.items() if v and k != "_id"}
+    exclude = {k for k, v in projection.items() if not v}
+    if include:
+        out = {k: copy.deepcopy(doc[k]) for k in include if k in doc}
+        if "_id" not in exclude and "_id" in doc:
+            out["_id"] = doc["_id"]
+        return out
+    return {k: copy.deepcopy(v) for k, v in doc.items() if k not in exclude}
+
+
+class _SortKey:
+    """Orders values like MongoDB does for the simple types we store (None sorts first)."""
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = None if value is _MISSING else value
+
+    def __lt__(self, other):
+        a, b = self.value, other.value
+        if a is None or b is None:
+            return a is None and b is not None
+        ra, rb = _type_rank(a), _type_rank(b)
+        if ra != rb:
+            return ra < rb
+        try:
+            return a < b
+        except TypeError:
+            return str(a) < str(b)
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+
+class InMemoryCursor:
+    def __init__(self, docs: List[Dict[str, Any]], projection: Optional[Dict[str, Any]] = None):
+        self._docs = docs
+        self._projection = projection
+        self._sort: List[tuple] = []
+        self._skip = 0
+        self._limit = 0
+
+    def sort(self, key_or_list, direction: Optional[int] = None):
+        if isinstance(key_or_list, str):
+            self._sort = [(key_or_list, direction if direction is not None else 1)]
+        else:
+            self._sort = list(key_or_list)
+        return self
+
+    def skip(self, n: int):
+        self._skip = int(n)
+        return self
+
+    def limit(self, n: int):
+        self._limit = int(n)
+        return self
+
+    def batch_size(self, n: int):
+        # results are already in memory; accepted for API compatibility
+        return self
+
+    def hint(self, index):
+        return self
+
+    def _materialize(self) -> List[Dict[str, Any]]:
+        docs = list(self._docs)
+        # stable multi-key sort: apply keys from last to first
+        for field, direction in reversed(self._sort):
+            docs.sort(key=lambda d: _SortKey(_get(d, field)), reverse=direction < 0)
+        docs = docs[self._skip:]
+        if self._limit:
+            docs = docs[:self._limit]
+        return [_project(d, self._projection) for d in docs]
+
+    def __iter__(self):
+        return iter(self._materialize())
+
+
+class InMemoryCollection:
+    """Thread-safe list-backed collection."""
+
+    def __init__(self, name: str = "collection"):
+        self.name = name
+        self._docs: List[Dict[str, Any]] = []
+        self._ids = set()
+        self._indexes: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def _insert(self, doc: Dict[str, Any]) -> Any:
+        if "_id" not in doc:
+            doc["_id"] = ObjectId()
+        if doc["_id"] in self._ids:
+            raise ValueError(f"Duplicate key _id: {doc['_id']}")
+        self._ids.add(doc["_id"])
+        self._docs.append(copy.deepcopy(doc))
+        return doc["_id"]
+
+    def insert_one(self, doc: Dict[str, Any]):
+        with self._lock:
+            inserted_id = self._insert(doc)
+        return SimpleNamespace(inserted_id=inserted_id, acknowledged=True)
+
+    def insert_many(self, docs: Iterable[Dict[str, Any]], ordered: bool = True):
+        inserted = []
+        errors = []
+        with self._lock:
+            for i, doc in enumerate(docs):
+                try:
+                    inserted.append(self._insert(doc))
+                except ValueError as e:
+                    errors.append({"index": i, "errmsg": str(e)})
+                    if ordered:
+                        break
+        if errors:
+            err = RuntimeError(f"insert_many failed for {len(errors)} documents")
+            err.details = {"nInserted": len(inserted), "writeErrors": errors}
+            raise err
+        return SimpleNamespace(inserted_ids=inserted, acknowledged=True)
+
+    def find(self, filter: Optional[Dict[str, Any]] = None, projection: Optional[Dict[str, Any]] = None, **kwargs):
+        with self._lock:
+            docs = [d for d in self._docs if matches(d, filter)]
+        return InMemoryCursor(docs, projection)
+
+    def find_one(self, filter: Optional[Dict[str, Any]] = None, projection: Optional[Dict[str, Any]] = None):
+        for d in self.find(filter, projection).limit(1):
+            return d
+        return None
+
+    def count_documents(self, filter: Optional[Dict[str, Any]] = None) -> int:
+        with self._lock:
+            return sum(1 for d in self._docs if matches(d, filter))
+
+    def replace_one(self, filter: Dict[str, Any], replacement: Dict[str, Any]):
+        with self._lock:
+            for i, d in enumerate(self._docs):
+                if matches(d, filter):
+                    self._docs[i] = copy.deepcopy(dict(replacement, _id=d["_id"]))
+                    return SimpleNamespace(matched_count=1, modified_count=1, acknowledged=True)
+        return SimpleNamespace(matched_count=0, modified_count=0, acknowledged=True)
+
+    def bulk_write(self, requests: Iterable[Any], ordered: bool = True):
+        """ReplaceOne requests only (what scripts/migrate_prediction_records.py sends)."""
+        modified = 0
+        for req in requests:
+            modified += self.replace_one(req._filter, req._doc).modified_count
+        return SimpleNamespace(modified_count=modified, acknowledged=True)
+
+    def delete_many(self, filter: Optional[Dict[str, Any]] = None):
+        with self._lock:
+            keep = [d for d in self._docs if not matches(d, filter)]
+            deleted = len(self._docs) - len(keep)
+            self._docs = keep
+            self._ids = {d["_id"] for d in keep}
+        return SimpleNamespace(deleted_count=deleted, acknowledged=True)
+
+    def create_index(self, keys, **kwargs) -> str:
+        if isinstance(keys, str):
+            keys = [(keys, 1)]
+        name = kwargs.get("name") or "_".join(f"{k}_{d}" for k, d in keys)
+        self._indexes[name] = {"key": list(keys), **kwargs}
+        return name
+
+    def index_information(self) -> Dict[str, Dict[str, Any]]:
+        return dict(self._indexes)
@@ -0,0 +1,220 @@
+# services/metrics.py
+"""
+Prometheus-style metrics for the prediction path, rendered in the text exposition
+format (version 0.0.4) by GET /metrics. Self-contained, no client library needed.
+
+Counters and histograms are labelled; an update is a dict lookup, a bisect over the
+bucket bounds and a few additions under a per-metric lock, so instrumentation can
+stay on in production. METRICS_ENABLED=0 turns every update into a no-op.
+
+Per-request stage timings: a route calls begin_timings(); every stage() recorded
+afterwards in the same context (the route's worker thread) is also appended to that
+request's list, which server_timing() formats for a `Server-Timing` response header
+(sent when METRICS_DEBUG_TIMINGS=1). Stages run on other threads, e.g. by the
+micro-batcher, only reach the histograms.
+"""
+import bisect
+import contextvars
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Sequence, Tuple
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1").lower() in ("1", "true", "yes")
+# add a Server-Timing header with the per-stage durations to prediction responses
+DEBUG_TIMINGS = os.getenv("METRICS_DEBUG_TIMINGS", "0").lower() in ("1", "true", "yes")
+
+# seconds; stage latencies range from microseconds (float coercion) to seconds (large RF batches)
+DEFAULT_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\"")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(v: float) -> str:
+    if math.isinf(v):
+        return "+Inf" if v > 0 else "-Inf"
+    return repr(float(v)) if v != int(v) else str(int(v))
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List["_Metric"] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: "_Metric"):
+        with self._lock:
+            if any(m.name == metric.name for m in self._metrics):
+                raise ValueError(f"Duplicate metric name: {metric.name}")
+            self._metrics.append(metric)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics)
+        lines: List[str] = []
+        for m in metrics:
+            lines.append(f"# HELP {m.name} {m.help}")
+            lines.append(f"# TYPE {m.name} {m.kind}")
+            lines.extend(m.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), registry: Optional[Registry] = REGISTRY):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._data: Dict[tuple, object] = {}
+        if registry is not None:
+            registry.register(self)
+
+    def _key(self, labels: Dict[str, object]) -> tuple:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._data[key] = self._data.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._data.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._data.items())
+        return [f"{self.name}{_format_labels(self.labelnames, k)} {_format_value(v)}" for k, v in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS, registry: Optional[Registry] = REGISTRY):
+        super().__init__(name, help, labelnames, registry)
+        self.buckets = tuple(sorted(float(b) for b in buckets))
+
+    def observe(self, value: float, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        # first bucket whose upper bound is >= value; len(buckets) means +Inf
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._data.get(key)
+            if state is None:
+                state = self._data[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    def count(self, **labels) -> int:
+        state = self._data.get(self._key(labels))
+        return state[2] if state else 0
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, (list(s[0]), s[1], s[2])) for k, s in self._data.items())
+        out = []
+        for key, (counts, total, n) in items:
+            cumulative = 0
+            for bound, c in zip(self.buckets + (math.inf,), counts):
+                cumulative += c
+                le = ("le", _format_value(bound))
+                out.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            out.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            out.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {n}")
+        return out
+
+
+# --- metrics of the prediction path ---
+PREDICT_REQUESTS = Counter(
+    "aires_predict_requests_total", "Prediction requests by route, model and HTTP status.",
+    ["route", "model", "status"],
+)
+PREDICT_ERRORS = Counter(
+    "aires_predict_errors_total", "Failed prediction requests by route, model and exception type.",
+    ["route", "model", "exception"],
+)
+PREDICT_REQUEST_SECONDS = Histogram(
+    "aires_predict_request_seconds", "Prediction route handler latency in seconds.", ["route", "model"],
+)
+PREDICT_STAGE_SECONDS = Histogram(
+    "aires_predict_stage_seconds",
+    "Time per prediction stage in seconds (validate, feature_build, feature_order, cache_lookup, scaler_transform, "
+    "model_predict, compiled_predict, float_coercion, inference_pool, db_insert).",
+    ["stage", "model"],
+)
+INFERENCE_SHED = Counter(
+    "aires_inference_shed_total", "Predictions rejected because the inference pool was saturated.", ["model"],
+)
+
+
+# --- per-request stage timings ---
+_request_timings: contextvars.ContextVar = contextvars.ContextVar("aires_stage_timings", default=None)
+
+
+def begin_timings() -> List[Tuple[str, float]]:
+    """Start collecting this request's stage timings (in the current context) and return the list."""
+    timings: List[Tuple[str, float]] = []
+    _request_timings.set(timings)
+    return timings
+
+
+def end_timings():
+    """Stop collecting stage timings in the current context (worker threads are reused)."""
+    _request_timings.set(None)
+
+
+def observe_stage(stage_name: str, model: str, seconds: float):
+    PREDICT_STAGE_SECONDS.observe(seconds, stage=stage_name, model=model)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.append((stage_name, seconds))
+
+
+@contextmanager
+def stage(stage_name: str, model: str):
+    """Time the enclosed block as one prediction stage (recorded even if it raises)."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage_name, model, time.perf_counter() - t0)
+
+
+def server_timing(timings: Sequence[Tuple[str, float]]) -> str:
+    """Format stage timings as a Server-Timing header value (durations in ms)."""
+    return ", ".join(f"{name};dur={seconds * 1000.0:.3f}" for name, seconds in timings)
+
+
+def render() -> str:
+    return REGISTRY.render()
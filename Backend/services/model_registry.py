@@ -0,0 +1,201 @@
+# services/model_registry.py
+"""
+Versioned model manifest: MODEL_DIR/manifest.json.
+
+    {
+      "format": 1,
+      "models": {
+        "xgb": {
+          "name": "XGBoost Regressor",
+          "active": "20261017T010203Z-ab12cd34",
+          "versions": {
+            "20261017T010203Z-ab12cd34": {
+              "file": "versions/xgb/20261017T010203Z-ab12cd34/xgboost_regressor.pkl",
+              "sha256": "...",
+              "scaler_file": "versions/xgb/20261017T010203Z-ab12cd34/scaler.pkl",
+              "scaler_sha256": "...",
+              "compiled_dir": "versions/xgb/20261017T010203Z-ab12cd34/compiled",
+              "feature_order": ["..."],
+              "metrics": {"RMSE": 1.23, "...": "..."},
+              "created_at": "2026-10-17T01:02:03+00:00"
+            }
+          },
+          "pinned": ["..."]
+        }
+      }
+    }
+
+Paths are relative to the manifest's directory. Each version directory is written
+once and never modified; publishing a version (or rolling back with set_active)
+only rewrites manifest.json, atomically via os.replace. ai_service watches the
+manifest and swaps new active versions in without a restart.
+
+Publishing keeps the newest MODEL_KEEP_VERSIONS versions of the key, plus the active
+one and any listed under "pinned"; older entries are dropped in the same manifest
+write and their directories are deleted after it.
+"""
+import hashlib
+import json
+import os
+import shutil
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+MANIFEST_FILE = "manifest.json"
+FORMAT_VERSION = 1
+# versions of each key kept by publish_version() (active and pinned ones come on top); 0 = keep all
+KEEP_VERSIONS = int(os.getenv("MODEL_KEEP_VERSIONS", "5"))
+
+# cached_file_sha256() results: {path: (size, mtime_ns, digest)}
+_digests: Dict[str, Tuple[int, int, str]] = {}
+
+
+def manifest_path(model_dir: str) -> str:
+    return os.path.join(model_dir, MANIFEST_FILE)
+
+
+def file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def cached_file_sha256(path: str) -> str:
+    """file_sha256(path), re-hashed only when the file's size or mtime changed since the last call."""
+    st = os.stat(path)
+    key = os.path.abspath(path)
+    cached = _digests.get(key)
+    if cached is not None and cached[:2] == (st.st_size, st.st_mtime_ns):
+        return cached[2]
+    digest = file_sha256(path)
+    _digests[key] = (st.st_size, st.st_mtime_ns, digest)
+    return digest
+
+
+def read_manifest(model_dir: str) -> Optional[Dict[str, Any]]:
+    """Return the parsed manifest, or None if there is none. Raises ValueError if it is malformed."""
+    path = manifest_path(model_dir)
+    try:
+        with open(path, "r") as fh:
+            data = json.load(fh)
+    except FileNotFoundError:
+        return None
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Invalid manifest {path}: {e}")
+    if not isinstance(data, dict) or not isinstance(data.get("models"), dict):
+        raise ValueError(f"Invalid manifest {path}: missing 'models' mapping")
+    return data
+
+
+def write_manifest(model_dir: str, manifest: Dict[str, Any]):
+    """Write the manifest atomically: readers see either the old or the new file, never a partial one."""
+    path = manifest_path(model_dir)
+    tmp = f"{path}.tmp-{os.getpid()}"
+    with open(tmp, "w") as fh:
+        json.dump(manifest, fh, indent=2)
+        fh.flush()
+        os.fsync(fh.fileno())
+    os.replace(tmp, path)
+
+
+def resolve(manifest: Dict[str, Any], key: str, version: Optional[str] = None) -> Tuple[str, Dict[str, Any]]:
+    """
+    Return (version id, version entry) for `key`; the active version when `version` is None.
+    Raises KeyError for an unknown key or version.
+    """
+    model = manifest["models"].get(key)
+    if model is None:
+        raise KeyError(f"Unknown model key: {key}")
+    vid = version or model.get("active")
+    entry = model.get("versions", {}).get(vid) if vid else None
+    if entry is None:
+        raise KeyError(f"Unknown version {vid!r} for model {key!r}")
+    return vid, entry
+
+
+def list_versions(manifest: Dict[str, Any], key: str) -> List[Dict[str, Any]]:
+    """Versions of `key` oldest first, each with its id and an `active` flag."""
+    model = manifest["models"].get(key) or {}
+    out = []
+    for vid, entry in model.get("versions", {}).items():
+        item = {"version": vid, "active": vid == model.get("active")}
+        item.update({k: v for k, v in entry.items() if k != "feature_order"})
+        out.append(item)
+    return sorted(out, key=lambda v: v.get("created_at") or "")
+
+
+def prune_versions(manifest: Dict[str, Any], key: str, keep: int) -> List[str]:
+    """
+    Drop all but the newest `keep` versions of `key` from the manifest (in place); the
+    active version and those in its "pinned" list are always kept. Returns the ids dropped.
+    """
+    model = manifest["models"].get(key) or {}
+    versions = model.get("versions", {})
+    if keep <= 0 or len(versions) <= keep:
+        return []
+    protected = {model.get("active")} | set(model.get("pinned") or [])
+    newest_first = sorted(versions, key=lambda v: versions[v].get("created_at") or "", reverse=True)
+    dropped = [v for v in newest_first[keep:] if v not in protected]
+    for vid in dropped:
+        del versions[vid]
+    return dropped
+
+
+def publish_version(model_dir: str, key: str, model_file: str, name: Optional[str] = None,
+                    scaler_file: Optional[str] = None, compiled_dir: Optional[str] = None,
+                    feature_order: Optional[List[str]] = None, metrics: Optional[Dict[str, Any]] = None,
+                    activate: bool = True, keep_versions: Optional[int] = None) -> str:
+    """
+    Copy a trained model (plus its scaler and compiled export) into
+    model_dir/versions/<key>/<version>/ and register it in the manifest.
+    With activate=True it also becomes the active version. Versions beyond
+    `keep_versions` (default KEEP_VERSIONS) are pruned, see prune_versions().
+    Returns the version id.
+    """
+    sha = file_sha256(model_file)
+    now = datetime.now(timezone.utc)
+    version = f"{now:%Y%m%dT%H%M%SZ}-{sha[:8]}"
+    rel_dir = os.path.join("versions", key, version)
+    out_dir = os.path.join(model_dir, rel_dir)
+    os.makedirs(out_dir, exist_ok=True)
+
+    entry: Dict[str, Any] = {"sha256": sha, "created_at": now.isoformat()}
+    shutil.copy2(model_file, os.path.join(out_dir, os.path.basename(model_file)))
+    entry["file"] = os.path.join(rel_dir, os.path.basename(model_file)).replace(os.sep, "/")
+    if scaler_file:
+        shutil.copy2(scaler_file, os.path.join(out_dir, os.path.basename(scaler_file)))
+        entry["scaler_file"] = os.path.join(rel_dir, os.path.basename(scaler_file)).replace(os.sep, "/")
+        entry["scaler_sha256"] = file_sha256(scaler_file)
+    if compiled_dir and os.path.isdir(compiled_dir):
+        shutil.copytree(compiled_dir, os.path.join(out_dir, "compiled"), dirs_exist_ok=True)
+        entry["compiled_dir"] = os.path.join(rel_dir, "compiled").replace(os.sep, "/")
+    if feature_order is not None:
+        entry["feature_order"] = list(feature_order)
+    if metrics is not None:
+        entry["metrics"] = metrics
+
+    manifest = read_manifest(model_dir) or {"format": FORMAT_VERSION, "models": {}}
+    model = manifest["models"].setdefault(key, {"versions": {}})
+    if name:
+        model["name"] = name
+    model.setdefault("versions", {})[version] = entry
+    if activate or not model.get("active"):
+        model["active"] = version
+    dropped = prune_versions(manifest, key, KEEP_VERSIONS if keep_versions is None else keep_versions)
+    write_manifest(model_dir, manifest)
+    # directories go only after the manifest stops referring to them
+    for vid in dropped:
+        shutil.rmtree(os.path.join(model_dir, "versions", key, vid), ignore_errors=True)
+    return version
+
+
+def set_active(model_dir: str, key: str, version: str):
+    """Point `key` at an already published version (e.g. to roll back). Raises KeyError if unknown."""
+    manifest = read_manifest(model_dir)
+    if manifest is None:
+        raise KeyError(f"No manifest in {model_dir}")
+    resolve(manifest, key, version)
+    manifest["models"][key]["active"] = version
+    write_manifest(model_dir, manifest)
@@ -0,0 +1,136 @@
+# services/pagination.py
+"""
+Keyset (cursor-based) pagination and field projection helpers for Mongo queries.
+
+A cursor is an opaque URL-safe token holding the sort-key values of the last
+document on the previous page. The next page is fetched with a range filter on
+those values (see keyset_filter). With an index on the same keys, each page is a
+bounded index scan, however deep the client pages, instead of skip() + an
+in-memory sort.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from bson import ObjectId
+
+SortSpec = Sequence[Tuple[str, int]]
+
+
+def _encode_value(v: Any) -> Any:
+    if isinstance(v, ObjectId):
+        return {"$oid": str(v)}
+    if isinstance(v, datetime):
+        return {"$date": v.isoformat()}
+    return v
+
+
+def _decode_value(v: Any) -> Any:
+    if isinstance(v, dict):
+        if "$oid" in v:
+            return ObjectId(v["$oid"])
+        if "$date" in v:
+            return datetime.fromisoformat(v["$date"])
+    return v
+
+
+def encode_cursor(values: Iterable[Any]) -> str:
+    """Encode the sort-key values of the last document on a page as an opaque token."""
+    raw = json.dumps([_encode_value(v) for v in values], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token: str, n_keys: int) -> List[Any]:
+    """Decode a token from encode_cursor(). Raises ValueError if it is malformed."""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(values, list) or len(values) != n_keys:
+            raise ValueError("wrong number of cursor values")
+        return [_decode_value(v) for v in values]
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {e}")
+
+
+def _beyond(field: str, op: str, value: Any, mixed: bool) -> Dict[str, Any]:
+    """{field: {op: value}}; for a `mixed` field also every value of the other type that sorts beyond it."""
+    clause = {field: {op: value}}
+    # Mongo range operators only match values of the operand's type, while sort orders
+    # strings before dates; a page boundary on one type must admit the other type
+    if mixed and isinstance(value, datetime) and op == "$lt":
+        return {"$or": [clause, {field: {"$type": "string"}}]}
+    if mixed and isinstance(value, str) and op == "$gt":
+        return {"$or": [clause, {field: {"$type": "date"}}]}
+    return clause
+
+
+def keyset_filter(sort: SortSpec, values: Sequence[Any], mixed_types: Iterable[str] = ()) -> Dict[str, Any]:
+    """
+    Filter selecting documents strictly after `values` in `sort` order, e.g. for
+    sort [("timestamp", -1), ("_id", -1)]:
+        {"$or": [{"timestamp": {"$lt": ts}},
+                 {"timestamp": ts, "_id": {"$lt": oid}}]}
+    `mixed_types` names fields that may hold ISO strings in some documents and
+    datetimes in others (prediction timestamps while records are being migrated).
+    """
+    mixed = set(mixed_types)
+    clauses = []
+    for i, (field, direction) in enumerate(sort):
+        clause = {f: values[j] for j, (f, _) in enumerate(sort[:i])}
+        beyond = _beyond(field, "$lt" if direction < 0 else "$gt", values[i], field in mixed)
+        clauses.append({**clause, **beyond} if "$or" not in beyond or not clause else {"$and": [clause, beyond]})
+    return clauses[0] if len(clauses) == 1 else {"$or": clauses}
+
+
+def cursor_values(doc: Dict[str, Any], sort: SortSpec) -> List[Any]:
+    return [doc.get(field) for field, _ in sort]
+
+
+def build_projection(fields: Optional[str], allowed: Iterable[str], required: Iterable[str] = (),
+                     exclude: Iterable[str] = ()) -> Optional[Dict[str, int]]:
+    """
+    Turn a comma-separated `fields` query parameter into a Mongo projection.
+    `required` fields (the sort keys) are always included so the next cursor can
+    be built. Without `fields`, returns an exclusion projection for `exclude`
+    (or None when nothing is excluded).
+    Raises ValueError for fields outside `allowed`.
+    """
+    if fields:
+        wanted = [f.strip() for f in fields.split(",") if f.strip()]
+        unknown = sorted(set(wanted) - set(allowed))
+        if unknown:
+            raise ValueError(f"Unknown fields {unknown}; allowed: {sorted(allowed)}")
+        projection = {f: 1 for f in wanted}
+        for f in required:
+            projection[f] = 1
+        return projection
+    excluded = list(exclude)
+    return {f: 0 for f in excluded} if excluded else None
+
+
+def paginate(collection, query: Dict[str, Any], sort: SortSpec, limit: int,
+             cursor: Optional[str] = None, projection: Optional[Dict[str, int]] = None,
+             hidden: Iterable[str] = (), mixed_types: Iterable[str] = ()) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    Run one keyset-paginated find(). Returns (documents, next_cursor); next_cursor is
+    None on the last page. Sort-key fields that were only fetched to build the cursor
+    can be listed in `hidden` to drop them from the returned documents.
+    `mixed_types`: see keyset_filter.
+    Raises ValueError for an invalid cursor.
+    """
+    if cursor:
+        after = keyset_filter(sort, decode_cursor(cursor, len(sort)), mixed_types)
+        query = {"$and": [query, after]} if query else after
+    # one extra row tells us whether another page exists
+    docs = list(collection.find(query, projection).sort(list(sort)).limit(limit + 1))
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = encode_cursor(cursor_values(docs[-1], sort))
+    hidden = list(hidden)
+    if hidden:
+        for d in docs:
+            for f in hidden:
+                d.pop(f, None)
+    return docs, next_cursor
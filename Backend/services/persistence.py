@@ -0,0 +1,239 @@
+# services/persistence.py
+"""
+Persistence helpers for route handlers.
+
+Two modes, selected with PERSIST_MODE:
+  - "sync"  (default): insert_one inline, exactly like the routes used to do.
+  - "async": documents get a client-side ObjectId and are handed to a
+             write-behind queue; a background thread flushes them with
+             unordered insert_many. The request returns without waiting
+             on the database round trip.
+
+The writer only needs an object with `insert_many(docs, ordered=False)`, so it
+works against pymongo collections and against services.memory_store.InMemoryCollection.
+"""
+import os
+import queue
+import threading
+import time
+import traceback
+from typing import Any, Dict, List, Optional
+
+from bson import ObjectId
+
+PERSIST_MODE = os.getenv("PERSIST_MODE", "sync").lower()
+PERSIST_BATCH_SIZE = int(os.getenv("PERSIST_BATCH_SIZE", "500"))
+PERSIST_FLUSH_INTERVAL_MS = float(os.getenv("PERSIST_FLUSH_INTERVAL_MS", "200"))
+PERSIST_MAX_QUEUE = int(os.getenv("PERSIST_MAX_QUEUE", "20000"))
+# how long a request may block when the queue is full before it is rejected
+PERSIST_ENQUEUE_TIMEOUT_MS = float(os.getenv("PERSIST_ENQUEUE_TIMEOUT_MS", "50"))
+
+
+class PersistenceBackpressure(Exception):
+    """Raised when the write-behind queue is full and the enqueue timeout expired."""
+
+
+class WriteBehindWriter:
+    """
+    Bounded queue + background flusher for one collection.
+
+    A flush happens when `batch_size` documents are queued or when
+    `flush_interval_ms` has passed since the first queued document,
+    whichever comes first. `put` blocks for at most `enqueue_timeout_ms`
+    when the queue is full and then raises PersistenceBackpressure, so a slow
+    database slows producers down instead of growing memory without bound.
+    """
+
+    def __init__(self, collection, batch_size: int = PERSIST_BATCH_SIZE,
+                 flush_interval_ms: float = PERSIST_FLUSH_INTERVAL_MS,
+                 max_queue: int = PERSIST_MAX_QUEUE,
+                 enqueue_timeout_ms: float = PERSIST_ENQUEUE_TIMEOUT_MS,
+                 name: str = "writer"):
+        self.collection = collection
+        self.batch_size = max(1, int(batch_size))
+        self.flush_interval = max(0.0, float(flush_interval_ms)) / 1000.0
+        self.enqueue_timeout = max(0.0, float(enqueue_timeout_ms)) / 1000.0
+        self.name = name
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max(1, int(max_queue)))
+        self._stop = threading.Event()
+        self._stats = {"enqueued": 0, "written": 0, "failed": 0, "rejected": 0, "flushes": 0}
+        self._stats_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name=f"write-behind-{name}", daemon=True)
+        self._thread.start()
+
+    def put(self, doc: Dict[str, Any]):
+        """Queue one document for insertion. Raises PersistenceBackpressure when saturated."""
+        if self._stop.is_set():
+            raise RuntimeError(f"Writer '{self.name}' is closed")
+        try:
+            self._queue.put(doc, timeout=self.enqueue_timeout)
+        except queue.Full:
+            self._bump("rejected")
+            raise PersistenceBackpressure(
+                f"Write queue for '{self.name}' is full ({self._queue.maxsize} pending documents)"
+            )
+        self._bump("enqueued")
+
+    def put_many(self, docs: List[Dict[str, Any]]):
+        """
+        Queue several documents as one unit: either all of them are queued or, when the
+        queue has no room for all of them within the enqueue timeout, none are and
+        PersistenceBackpressure is raised.
+        """
+        if self._stop.is_set():
+            raise RuntimeError(f"Writer '{self.name}' is closed")
+        if not docs:
+            return
+        q = self._queue
+        deadline = time.monotonic() + self.enqueue_timeout
+        with q.not_full:
+            while len(docs) > q.maxsize - q._qsize():
+                remaining = deadline - time.monotonic()
+                if len(docs) > q.maxsize or remaining <= 0:
+                    self._bump("rejected", len(docs))
+                    raise PersistenceBackpressure(
+                        f"Write queue for '{self.name}' has no room for {len(docs)} documents "
+                        f"({q._qsize()} of {q.maxsize} pending)"
+                    )
+                q.not_full.wait(remaining)
+            for doc in docs:
+                q._put(doc)
+            q.unfinished_tasks += len(docs)
+            q.not_empty.notify(len(docs))
+        self._bump("enqueued", len(docs))
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Block until every queued document has been written (or failed). Returns False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.005)
+        return True
+
+    def close(self, timeout: Optional[float] = 10.0) -> bool:
+        """Stop accepting documents, flush the pending ones without waiting for the interval, stop the thread."""
+        self._stop.set()
+        flushed = self.flush(timeout)
+        self._thread.join(timeout=1.0)
+        return flushed
+
+    def stats(self) -> Dict[str, int]:
+        with self._stats_lock:
+            out = dict(self._stats)
+        out["pending"] = self._queue.qsize()
+        return out
+
+    def _bump(self, key: str, n: int = 1):
+        with self._stats_lock:
+            self._stats[key] += n
+
+    def _collect(self) -> List[Dict[str, Any]]:
+        try:
+            first = self._queue.get(timeout=0.1)
+        except queue.Empty:
+            return []
+        batch = [first]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0 or self._stop.is_set():
+                    batch.append(self._queue.get_nowait())
+                else:
+                    # short waits so close() does not sit out the rest of the interval
+                    batch.append(self._queue.get(timeout=min(remaining, 0.1)))
+            except queue.Empty:
+                if remaining <= 0 or self._stop.is_set():
+                    break
+        return batch
+
+    def _run(self):
+        while not (self._stop.is_set() and self._queue.empty()):
+            batch = self._collect()
+            if not batch:
+                continue
+            try:
+                self.collection.insert_many(batch, ordered=False)
+                self._bump("written", len(batch))
+            except Exception as e:
+                # unordered insert_many writes what it can; count the rest as failed
+                written = _written_count(e, len(batch))
+                self._bump("written", written)
+                self._bump("failed", len(batch) - written)
+                traceback.print_exc()
+            finally:
+                self._bump("flushes")
+                for _ in batch:
+                    self._queue.task_done()
+
+
+def _written_count(exc: Exception, attempted: int) -> int:
+    # pymongo BulkWriteError carries per-row details; anything else means nothing was written
+    details = getattr(exc, "details", None)
+    if isinstance(details, dict) and "nInserted" in details:
+        return int(details["nInserted"])
+    return 0
+
+
+_writers: Dict[int, WriteBehindWriter] = {}
+_writers_lock = threading.Lock()
+
+
+def get_writer(collection, name: Optional[str] = None) -> WriteBehindWriter:
+    """Return the shared write-behind writer for `collection`, creating it on first use."""
+    key = id(collection)
+    writer = _writers.get(key)
+    if writer is not None:
+        return writer
+    with _writers_lock:
+        writer = _writers.get(key)
+        if writer is None:
+            writer = WriteBehindWriter(collection, name=name or getattr(collection, "name", "collection"))
+            _writers[key] = writer
+    return writer
+
+
+def save(collection, doc: Dict[str, Any]) -> str:
+    """
+    Persist one document and return its id as a string.
+    In "sync" mode this is insert_one; in "async" mode the id is generated
+    client-side and the write is queued (may raise PersistenceBackpressure).
+    The caller's `doc` is never mutated.
+    """
+    if PERSIST_MODE == "async":
+        oid = ObjectId()
+        get_writer(collection).put(dict(doc, _id=oid))
+        return str(oid)
+    res = collection.insert_one(dict(doc))
+    return str(res.inserted_id)
+
+
+def save_many(collection, docs: List[Dict[str, Any]]) -> List[str]:
+    """
+    Persist several documents and return their ids as strings, in order.
+    "sync" mode uses one unordered insert_many; "async" mode queues all documents or,
+    on PersistenceBackpressure, none of them, so a rejected batch can be retried as a whole.
+    """
+    if PERSIST_MODE == "async":
+        queued = [dict(doc, _id=ObjectId()) for doc in docs]
+        get_writer(collection).put_many(queued)
+        return [str(d["_id"]) for d in queued]
+    if not docs:
+        return []
+    res = collection.insert_many([dict(d) for d in docs], ordered=False)
+    return [str(i) for i in res.inserted_ids]
+
+
+def stats() -> Dict[str, Dict[str, int]]:
+    """Per-writer counters (enqueued / written / failed / rejected / flushes / pending)."""
+    return {w.name: w.stats() for w in list(_writers.values())}
+
+
+def shutdown(timeout: Optional[float] = 10.0):
+    """Flush and stop every writer. Call on application shutdown."""
+    with _writers_lock:
+        writers = list(_writers.values())
+        _writers.clear()
+    for w in writers:
+        w.close(timeout)
@@ -0,0 +1,133 @@
+# services/record_codec.py
+"""
+Storage formats of prediction records (PREDICTION_RECORD_FORMAT).
+
+"full" (default) stores a record exactly as the routes return it: `features` as an
+array of doubles (BSON spends a type byte, an index key "0".."11" and 8 bytes per
+element) and `timestamp` as an ISO string.
+
+"compact" stores
+    fv         features packed as little-endian float32 bytes (BSON binary, 4 bytes each)
+    fo         feature_order version: the etag of feature_order.json when it was written
+    timestamp  native BSON datetime (8 bytes instead of a 27-byte string)
+and keeps house_id / model / model_version / predicted_value_kwh / meta as they are,
+since queries and indexes use them. float32 keeps ~7 significant digits per feature;
+the prediction itself stays a double.
+
+Readers handle both formats, so a collection can hold a mix while
+scripts/migrate_prediction_records.py converts it:
+  - decode_many() turns a page of documents into the full shape in place. All compact
+    vectors of the page are read with one np.frombuffer over their joined bytes and
+    rounded to FEATURE_DISPLAY_DIGITS significant digits (what float32 holds), so 0.1
+    comes back as 0.1 and not as 0.10000000149011612.
+  - features_array() is the zero-copy float32 view over one record's blob, for scans
+    that compute on the vectors instead of returning them.
+A compact timestamp is a datetime; the API and the exports serialize it with
+isoformat(), which gives the same string the full format stores.
+"""
+import os
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+import services.ai_service as ai_service
+
+PREDICTION_RECORD_FORMAT = os.getenv("PREDICTION_RECORD_FORMAT", "full").lower()
+FEATURE_DISPLAY_DIGITS = 7
+
+FEATURES_DTYPE = np.dtype("<f4")
+BLOB_FIELD = "fv"
+VERSION_FIELD = "fo"
+
+
+def is_compact(doc: Dict[str, Any]) -> bool:
+    return BLOB_FIELD in doc
+
+
+def feature_order_version() -> Optional[str]:
+    return ai_service.get_feature_order_with_etag()[1]
+
+
+def _timestamp(value):
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+
+def encode(record: Dict[str, Any], version: Optional[str] = None, blob: Optional[bytes] = None) -> Dict[str, Any]:
+    """Compact storage document for one full-shape record (the record is not modified)."""
+    doc = {k: v for k, v in record.items() if k != "features"}
+    doc[BLOB_FIELD] = blob if blob is not None else np.asarray(record["features"], dtype=FEATURES_DTYPE).tobytes()
+    doc[VERSION_FIELD] = version
+    doc["timestamp"] = _timestamp(record["timestamp"])
+    return doc
+
+
+def to_storage(record: Dict[str, Any]) -> Dict[str, Any]:
+    """The document to insert for `record` under PREDICTION_RECORD_FORMAT."""
+    if PREDICTION_RECORD_FORMAT != "compact":
+        return record
+    return encode(record, feature_order_version())
+
+
+def to_storage_many(records: List[Dict[str, Any]], matrix=None) -> List[Dict[str, Any]]:
+    """
+    Documents to insert for `records`. `matrix` may hold their features as one
+    (n, n_features) array (as /predict/batch already has them), so the float32
+    conversion runs once for the whole batch.
+    """
+    if PREDICTION_RECORD_FORMAT != "compact" or not records:
+        return records
+    version = feature_order_version()
+    packed = np.asarray(matrix if matrix is not None else [r["features"] for r in records], dtype=FEATURES_DTYPE)
+    return [encode(record, version, row.tobytes()) for record, row in zip(records, packed)]
+
+
+def to_full(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Full-format storage document for a stored compact one (features rounded as in decode_many, ISO timestamp)."""
+    out = {k: v for k, v in doc.items() if k not in (BLOB_FIELD, VERSION_FIELD)}
+    out["features"] = _display(features_array(doc)).tolist()
+    if isinstance(out.get("timestamp"), datetime):
+        out["timestamp"] = out["timestamp"].isoformat()
+    return out
+
+
+def features_array(doc: Dict[str, Any]) -> np.ndarray:
+    """A record's features as an array: a read-only float32 view of the blob for compact records."""
+    if BLOB_FIELD in doc:
+        return np.frombuffer(doc[BLOB_FIELD], dtype=FEATURES_DTYPE)
+    return np.asarray(doc.get("features") or [], dtype=np.float64)
+
+
+def _display(values: np.ndarray) -> np.ndarray:
+    """float32 values widened to doubles and rounded to FEATURE_DISPLAY_DIGITS significant digits."""
+    v = values.astype(np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        magnitude = np.floor(np.log10(np.abs(v)))
+    scale = 10.0 ** (FEATURE_DISPLAY_DIGITS - 1 - np.where(np.isfinite(magnitude), magnitude, 0.0))
+    return np.round(v * scale) / scale
+
+
+def decode_many(docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Rewrite compact documents of `docs` into the full shape (features list, feature_order_version), in place."""
+    by_width: Dict[int, List[Dict[str, Any]]] = {}
+    for doc in docs:
+        blob = doc.get(BLOB_FIELD)
+        if blob is not None:
+            by_width.setdefault(len(blob), []).append(doc)
+    for width, group in by_width.items():
+        matrix = np.frombuffer(b"".join(d[BLOB_FIELD] for d in group), dtype=FEATURES_DTYPE)
+        rows = _display(matrix.reshape(len(group), width // FEATURES_DTYPE.itemsize)).tolist()
+        for doc, row in zip(group, rows):
+            del doc[BLOB_FIELD]
+            doc["features"] = row
+            doc["feature_order_version"] = doc.pop(VERSION_FIELD, None)
+    return docs
+
+
+def storage_projection(projection: Optional[Dict[str, int]]) -> Optional[Dict[str, int]]:
+    """Extend a projection on `features` to the compact fields that hold them."""
+    if not projection or "features" not in projection:
+        return projection
+    out = dict(projection)
+    out[BLOB_FIELD] = out[VERSION_FIELD] = projection["features"]
+    return out
@@ -0,0 +1,391 @@
+# services/rollup_service.py
+"""
+Per-house / per-month aggregates of household readings and predictions, kept up to
+date incrementally so the analytics endpoints never scan raw records.
+
+Every accepted insert is folded in as it is written: create_record / POST
+/household/bulk call add_household(), the /predict routes call add_prediction().
+Per (house, month) the store keeps
+  - readings: count, kWh sum / min / max of the daily totals,
+  - predictions per model: count, sum / min / max of predicted_value_kwh,
+and per house running totals, so a house summary is O(1) and its monthly series
+O(months).
+
+A prediction belongs to meta["month"] ("YYYY-MM") when the client sends one,
+otherwise to the month of its timestamp. Prediction-vs-actual error compares the
+mean prediction with the month's recorded kWh scaled up to the full month (as the
+forecast history does), since predictions are monthly totals and readings daily.
+
+Inserts made by other processes (other server workers, scripts writing to Mongo)
+are picked up by refresh(): each collection is scanned from an id_watermark, re-reading
+ROLLUP_RESCAN_SECONDS of overlap, in batches of ROLLUP_SCAN_BATCH records (the same
+scans as forecast_service.refresh). Live inserts register their ids in the same
+watermarks, so nothing is folded in twice. With ROLLUP_REFRESH_SECONDS > 0 the
+analytics reads trigger it at most that often; rebuild() scans into a fresh store
+and swaps it in.
+
+When ROLLUP_SNAPSHOT_PATH is set, the state is written there every
+ROLLUP_SNAPSHOT_SECONDS (when it changed) and on shutdown; start() loads the snapshot
+and catches up from its watermarks, or rebuilds from the collections when there is
+none (always, with snapshots off). Updated or
+deleted records, and writes the write-behind queue (PERSIST_MODE=async) accepts
+but later fails to store, are not reflected until rebuild().
+"""
+import calendar
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from services.forecast_service import month_index, month_label
+from services.id_watermark import IdWatermark, fold_new, scan
+
+# snapshot file of the rollups, e.g. state/rollup_snapshot.json (kept out of MODEL_DIR);
+# empty (the default) = no snapshots, start() rebuilds from the collections
+ROLLUP_SNAPSHOT_PATH = os.getenv("ROLLUP_SNAPSHOT_PATH", "")
+# seconds between snapshots of a changed store; 0 = only on shutdown / POST /analytics/snapshot
+ROLLUP_SNAPSHOT_SECONDS = float(os.getenv("ROLLUP_SNAPSHOT_SECONDS", "60"))
+# overlap re-read by refresh() to pick up records inserted out of _id order
+ROLLUP_RESCAN_SECONDS = float(os.getenv("ROLLUP_RESCAN_SECONDS", "5"))
+# analytics reads scan for other processes' inserts at most this often; 0 = never
+ROLLUP_REFRESH_SECONDS = float(os.getenv("ROLLUP_REFRESH_SECONDS", "0"))
+# records folded per lock acquisition by refresh() / rebuild()
+ROLLUP_SCAN_BATCH = int(os.getenv("ROLLUP_SCAN_BATCH", "5000"))
+
+SNAPSHOT_FORMAT = 1
+HOUSEHOLD_PROJECTION = {"house_id": 1, "date": 1, "total_consumption_kwh": 1}
+PREDICTION_PROJECTION = {"house_id": 1, "model": 1, "predicted_value_kwh": 1, "meta": 1, "timestamp": 1}
+
+# month accumulator: [readings, kWh sum, kWh min, kWh max, {model: [count, sum, min, max]}]
+_N, _KWH, _MIN, _MAX, _PRED = range(5)
+# house totals: [readings, kWh sum, predictions, first month, last month]
+_T_N, _T_KWH, _T_PRED, _T_FIRST, _T_LAST = range(5)
+
+
+# --- state ---
+_months: Dict[str, Dict[int, list]] = {}
+_totals: Dict[str, list] = {}
+_sources = {"household": IdWatermark(ROLLUP_RESCAN_SECONDS), "predictions": IdWatermark(ROLLUP_RESCAN_SECONDS)}
+_lock = threading.RLock()
+# one refresh() / rebuild() scan at a time (live inserts only take _lock)
+_scan_lock = threading.Lock()
+_status: Dict[str, Any] = {"dirty": False, "snapshot_at": None, "loaded_from": None, "refreshed_at": 0.0}
+_snapshot_thread: Optional[threading.Thread] = None
+_stop = threading.Event()
+
+
+def _month(store: Tuple[dict, dict], house_id: str, m: int) -> list:
+    all_months, all_totals = store
+    months = all_months.get(house_id)
+    if months is None:
+        months = all_months[house_id] = {}
+        all_totals[house_id] = [0, 0.0, 0, m, m]
+    acc = months.get(m)
+    if acc is None:
+        acc = months[m] = [0, 0.0, float("inf"), float("-inf"), {}]
+        totals = all_totals[house_id]
+        totals[_T_FIRST] = min(totals[_T_FIRST], m)
+        totals[_T_LAST] = max(totals[_T_LAST], m)
+    return acc
+
+
+def _fold_household(store: Tuple[dict, dict], doc: Dict[str, Any]):
+    house_id = doc["house_id"]
+    m = month_index(doc["date"])
+    kwh = float(doc.get("total_consumption_kwh") or 0.0)
+    acc = _month(store, house_id, m)
+    acc[_N] += 1
+    acc[_KWH] += kwh
+    acc[_MIN] = min(acc[_MIN], kwh)
+    acc[_MAX] = max(acc[_MAX], kwh)
+    totals = store[1][house_id]
+    totals[_T_N] += 1
+    totals[_T_KWH] += kwh
+
+
+def _prediction_month(doc: Dict[str, Any]) -> int:
+    meta = doc.get("meta")
+    month = meta.get("month") if isinstance(meta, dict) else None
+    if month:
+        try:
+            return month_index(month)
+        except (TypeError, ValueError):
+            pass  # not "YYYY-MM": fall back to the timestamp
+    return month_index(doc["timestamp"])
+
+
+def _fold_prediction(store: Tuple[dict, dict], doc: Dict[str, Any]):
+    house_id, model = doc["house_id"], doc["model"]
+    value = float(doc["predicted_value_kwh"])
+    acc = _month(store, house_id, _prediction_month(doc))
+    stats = acc[_PRED].get(model)
+    if stats is None:
+        acc[_PRED][model] = [1, value, value, value]
+    else:
+        stats[0] += 1
+        stats[1] += value
+        stats[2] = min(stats[2], value)
+        stats[3] = max(stats[3], value)
+    store[1][house_id][_T_PRED] += 1
+
+
+def _add(source: str, fold, docs: List[Dict[str, Any]], ids: List[Any]) -> int:
+    with _lock:
+        store = (_months, _totals)
+        added = fold_new(_sources[source], lambda doc: fold(store, doc), docs, ids)
+        if added:
+            _status["dirty"] = True
+    return added
+
+
+def add_household(doc: Dict[str, Any], inserted_id):
+    """Fold one stored household reading in (call after the insert succeeded)."""
+    _add("household", _fold_household, [doc], [inserted_id])
+
+
+def add_households(docs: List[Dict[str, Any]], inserted_ids: List[Any]):
+    _add("household", _fold_household, docs, inserted_ids)
+
+
+def add_prediction(doc: Dict[str, Any], inserted_id):
+    """Fold one stored prediction record in (call after the insert succeeded)."""
+    _add("predictions", _fold_prediction, [doc], [inserted_id])
+
+
+def add_predictions(docs: List[Dict[str, Any]], inserted_ids: List[Any]):
+    _add("predictions", _fold_prediction, docs, inserted_ids)
+
+
+def _collections():
+    from models.database import household_col, pred_col
+    return {"household": (household_col, HOUSEHOLD_PROJECTION, _fold_household),
+            "predictions": (pred_col, PREDICTION_PROJECTION, _fold_prediction)}
+
+
+def _scan(col, projection, fold, src: IdWatermark, store: Optional[Tuple[dict, dict]] = None) -> int:
+    """Fold the records of `col` from `src`'s watermark on into `store` (default: the live one)."""
+    return scan(col, projection, src, lambda doc: fold(store or (_months, _totals), doc),
+                _lock, ROLLUP_SCAN_BATCH)
+
+
+def _refresh() -> Dict[str, Any]:
+    out: Dict[str, Any] = {}
+    for name, (col, projection, fold) in _collections().items():
+        read = _scan(col, projection, fold, _sources[name])
+        if read:
+            _status["dirty"] = True
+        out[name] = read
+    _status["refreshed_at"] = time.monotonic()
+    return out
+
+
+def refresh() -> Dict[str, Any]:
+    """Fold in records other processes inserted since the watermarks; returns counts per collection."""
+    t0 = time.perf_counter()
+    with _scan_lock:
+        out = _refresh()
+    out["ms"] = round((time.perf_counter() - t0) * 1000.0, 3)
+    return out
+
+
+def maybe_refresh():
+    """refresh() if ROLLUP_REFRESH_SECONDS is set and has passed since the last one."""
+    if ROLLUP_REFRESH_SECONDS > 0 and time.monotonic() - _status["refreshed_at"] >= ROLLUP_REFRESH_SECONDS:
+        refresh()
+
+
+def rebuild() -> Dict[str, Any]:
+    """
+    Rescan both collections into a fresh store and swap it in. Live inserts keep going to
+    the old store meanwhile; a catch-up refresh after the swap picks up the ones the scan
+    missed (the new watermarks re-read the rescan window).
+    """
+    global _months, _totals, _sources
+    t0 = time.perf_counter()
+    with _scan_lock:
+        store: Tuple[dict, dict] = ({}, {})
+        sources = {name: IdWatermark(ROLLUP_RESCAN_SECONDS) for name in _sources}
+        out: Dict[str, Any] = {}
+        for name, (col, projection, fold) in _collections().items():
+            out[name] = _scan(col, projection, fold, sources[name], store)
+        with _lock:
+            _months, _totals = store
+            _sources = sources
+            _status["dirty"] = True
+        caught_up = _refresh()
+    for name in sources:
+        out[name] += caught_up[name]
+    out["ms"] = round((time.perf_counter() - t0) * 1000.0, 3)
+    return out
+
+
+# --- reads ---
+def _month_out(m: int, acc: list, model: Optional[str]) -> Dict[str, Any]:
+    out: Dict[str, Any] = {"month": month_label(m), "readings": acc[_N]}
+    if acc[_N]:
+        days = calendar.monthrange(m // 12, m % 12 + 1)[1]
+        month_kwh = acc[_KWH] / acc[_N] * days
+        out.update(actual_kwh=acc[_KWH], avg_daily_kwh=acc[_KWH] / acc[_N], min_daily_kwh=acc[_MIN],
+                   max_daily_kwh=acc[_MAX], estimated_month_kwh=month_kwh, complete=acc[_N] >= days)
+    else:
+        month_kwh = None
+    predictions, errors = {}, {}
+    for key, (count, total, lo, hi) in acc[_PRED].items():
+        if model is not None and key != model:
+            continue
+        mean = total / count
+        predictions[key] = {"count": count, "mean_kwh": mean, "min_kwh": lo, "max_kwh": hi}
+        if month_kwh is not None:
+            errors[key] = {"error_kwh": mean - month_kwh, "abs_error_kwh": abs(mean - month_kwh),
+                           "pct_error": (mean - month_kwh) / month_kwh * 100.0 if month_kwh else None}
+    out["predictions"] = predictions
+    if errors:
+        out["error"] = errors
+    return out
+
+
+def house_summary(house_id: str) -> Optional[Dict[str, Any]]:
+    """Running totals of one house (O(1)); None if nothing was recorded for it."""
+    with _lock:
+        totals = _totals.get(house_id)
+        if totals is None:
+            return None
+        n, kwh, preds, first, last = totals
+        months = len(_months[house_id])
+    return {"house_id": house_id, "readings": n, "actual_kwh": kwh, "avg_daily_kwh": kwh / n if n else None,
+            "predictions": preds, "months": months, "first_month": month_label(first), "last_month": month_label(last)}
+
+
+def house_months(house_id: str, start: Optional[str] = None, end: Optional[str] = None,
+                 model: Optional[str] = None) -> Optional[List[Dict[str, Any]]]:
+    """Monthly aggregates of one house in month order, optionally limited to [start, end] ("YYYY-MM")."""
+    lo = month_index(start) if start else None
+    hi = month_index(end) if end else None
+    with _lock:
+        months = _months.get(house_id)
+        if months is None:
+            return None
+        return [_month_out(m, months[m], model) for m in sorted(months)
+                if (lo is None or m >= lo) and (hi is None or m <= hi)]
+
+
+def list_houses(offset: int = 0, limit: int = 100) -> Tuple[int, List[Dict[str, Any]]]:
+    """(number of houses, summaries of one page of them in house_id order)."""
+    with _lock:
+        ids = sorted(_totals)
+    return len(ids), [s for s in (house_summary(h) for h in ids[offset:offset + limit]) if s is not None]
+
+
+def stats() -> Dict[str, Any]:
+    with _lock:
+        return {
+            "houses": len(_totals),
+            "months": sum(len(m) for m in _months.values()),
+            "sources": {name: {"records": s.records, "watermark": s.time.isoformat() if s.time else None}
+                        for name, s in _sources.items()},
+            "dirty": _status["dirty"],
+            "snapshot_path": ROLLUP_SNAPSHOT_PATH or None,
+            "snapshot_at": _status["snapshot_at"],
+            "loaded_from": _status["loaded_from"],
+        }
+
+
+# --- snapshots ---
+def _state_json() -> Dict[str, Any]:
+    houses = {}
+    for house_id, months in _months.items():
+        houses[house_id] = {month_label(m): [acc[_N], acc[_KWH], acc[_MIN] if acc[_N] else None,
+                                             acc[_MAX] if acc[_N] else None,
+                                             {k: list(v) for k, v in acc[_PRED].items()}]
+                            for m, acc in months.items()}
+    return {"format": SNAPSHOT_FORMAT, "written_at": datetime.now(timezone.utc).isoformat(),
+            "sources": {name: s.to_json() for name, s in _sources.items()}, "houses": houses}
+
+
+def save_snapshot(path: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """Write the state to `path` (default ROLLUP_SNAPSHOT_PATH) atomically; None when snapshots are disabled."""
+    path = path or ROLLUP_SNAPSHOT_PATH
+    if not path:
+        return None
+    t0 = time.perf_counter()
+    with _lock:
+        state = _state_json()
+        _status["dirty"] = False
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as fh:
+        json.dump(state, fh, separators=(",", ":"))
+    os.replace(tmp, path)
+    _status["snapshot_at"] = state["written_at"]
+    return {"path": path, "houses": len(state["houses"]), "ms": round((time.perf_counter() - t0) * 1000.0, 3)}
+
+
+def load_snapshot(path: Optional[str] = None) -> bool:
+    """Replace the state with a snapshot; False if there is none (or it is unreadable)."""
+    path = path or ROLLUP_SNAPSHOT_PATH
+    if not path or not os.path.exists(path):
+        return False
+    try:
+        with open(path) as fh:
+            state = json.load(fh)
+        if state.get("format") != SNAPSHOT_FORMAT:
+            raise ValueError(f"unsupported snapshot format {state.get('format')!r}")
+        months_by_house: Dict[str, Dict[int, list]] = {}
+        totals: Dict[str, list] = {}
+        for house_id, months in state["houses"].items():
+            parsed = {}
+            for label, (n, kwh, lo, hi, preds) in months.items():
+                parsed[month_index(label)] = [n, kwh, float("inf") if lo is None else lo,
+                                              float("-inf") if hi is None else hi, preds]
+            months_by_house[house_id] = parsed
+            totals[house_id] = [sum(a[_N] for a in parsed.values()), sum(a[_KWH] for a in parsed.values()),
+                                sum(s[0] for a in parsed.values() for s in a[_PRED].values()),
+                                min(parsed), max(parsed)]
+        sources = {name: IdWatermark.from_json(data, ROLLUP_RESCAN_SECONDS) for name, data in state["sources"].items()}
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        print(f"[rollups] ignoring snapshot {path}: {e}")
+        return False
+    with _lock:
+        _months.clear()
+        _months.update(months_by_house)
+        _totals.clear()
+        _totals.update(totals)
+        _sources.update(sources)
+        _status.update(dirty=False, loaded_from=path, snapshot_at=state.get("written_at"))
+    return True
+
+
+def _snapshot_worker():
+    while not _stop.wait(ROLLUP_SNAPSHOT_SECONDS):
+        if _status["dirty"]:
+            try:
+                save_snapshot()
+            except Exception as e:
+                print(f"[rollups] snapshot failed: {e}")
+
+
+def start() -> Dict[str, Any]:
+    """Load the snapshot and catch up from its watermarks (or rebuild), then start periodic snapshots."""
+    global _snapshot_thread
+    if load_snapshot():
+        result = {"source": "snapshot", **refresh()}
+    else:
+        result = {"source": "rebuild", **rebuild()}
+    if ROLLUP_SNAPSHOT_PATH and ROLLUP_SNAPSHOT_SECONDS > 0 and _snapshot_thread is None:
+        _stop.clear()
+        _snapshot_thread = threading.Thread(target=_snapshot_worker, name="rollup-snapshot", daemon=True)
+        _snapshot_thread.start()
+    return result
+
+
+def shutdown():
+    """Stop periodic snapshots and write a final one if anything changed."""
+    global _snapshot_thread
+    _stop.set()
+    if _snapshot_thread is not None:
+        _snapshot_thread.join(timeout=5.0)
+        _snapshot_thread = None
+    if _status["dirty"]:
+        save_snapshot()
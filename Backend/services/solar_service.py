@@ -0,0 +1,77 @@
+# services/solar_service.py
+"""
+Vectorised solar sizing for what-if sweeps (POST /api/solar/sweep).
+
+size_grid() evaluates the full cartesian grid households x sun_hours x panel_watt
+x efficiency with NumPy broadcasting, using the same arithmetic as the single
+POST /api/solar/ route:
+
+    needed_wh       = daily_kwh * 1000
+    panel_daily_wh  = panel_watt * sun_hours * efficiency
+    panels_required = (needed_wh + panel_daily_wh - 1) // panel_daily_wh   # ceil integer
+
+so every cell matches what the single route returns for the same inputs.
+
+pareto_mask() keeps, for each (household, sun_hours) site, the panel options
+(panel_watt x efficiency) that are not dominated on (panels_required, installed
+capacity): no other option needs fewer-or-equal panels AND less-or-equal watts
+installed with at least one strictly smaller.
+"""
+import os
+from typing import Dict, Sequence
+
+import numpy as np
+
+# grid cells computed per chunk when streaming a sweep (bounds memory per request)
+SWEEP_CHUNK_CELLS = int(os.getenv("SOLAR_SWEEP_CHUNK_CELLS", "200000"))
+# upper bound on households * sun_hours * panel_watt * efficiency for one request
+SWEEP_MAX_CELLS = int(os.getenv("SOLAR_SWEEP_MAX_CELLS", "20000000"))
+
+
+def as_axis(name: str, values: Sequence[float]) -> np.ndarray:
+    """1-D float64 axis; raises ValueError if it is empty, non-finite or not > 0."""
+    arr = np.asarray(values, dtype=np.float64).ravel()
+    if arr.size == 0:
+        raise ValueError(f"`{name}` must not be empty")
+    if not np.all(np.isfinite(arr)) or np.any(arr <= 0):
+        raise ValueError(f"`{name}` values must be finite and > 0")
+    return arr
+
+
+def size_grid(daily_kwh: np.ndarray, sun_hours: np.ndarray, panel_watt: np.ndarray,
+              efficiency: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Size every combination. Inputs are 1-D axes; results have shape
+    (len(daily_kwh), len(sun_hours), len(panel_watt), len(efficiency)), except
+    panel_daily_wh which does not depend on the household: (S, W, E).
+    """
+    needed_wh = daily_kwh[:, None, None, None] * 1000.0
+    # same operand order as the single route: panel_watt * sun_hours * efficiency
+    panel_daily_wh = (panel_watt[None, :, None] * sun_hours[:, None, None]) * efficiency[None, None, :]
+    panels = np.floor_divide(needed_wh + panel_daily_wh - 1, panel_daily_wh)
+    generation_kwh = (panel_daily_wh * panels) / 1000.0
+    return {
+        "panels_required": panels.astype(np.int64),
+        "estimated_daily_generation_kwh": generation_kwh,
+        "panel_daily_wh": panel_daily_wh,
+        "installed_w": panels * panel_watt[None, None, :, None],
+    }
+
+
+def pareto_mask(panels: np.ndarray, installed_w: np.ndarray) -> np.ndarray:
+    """
+    Boolean mask over the last axis of (..., K) arrays marking the non-dominated
+    options when minimising both panels and installed watts. Exact duplicates keep
+    only their first occurrence.
+    """
+    # sort by panels, then installed watts; an option survives if its installed
+    # watts are strictly below everything sorted before it
+    order = np.lexsort((installed_w, panels), axis=-1)
+    w_sorted = np.take_along_axis(installed_w, order, axis=-1)
+    best_before = np.minimum.accumulate(w_sorted, axis=-1)
+    keep_sorted = np.empty(w_sorted.shape, dtype=bool)
+    keep_sorted[..., 0] = True
+    keep_sorted[..., 1:] = w_sorted[..., 1:] < best_before[..., :-1]
+    mask = np.empty_like(keep_sorted)
+    np.put_along_axis(mask, order, keep_sorted, axis=-1)
+    return mask
@@ -0,0 +1,318 @@
+# services/tree_engine.py
+"""
+Pickle-free inference engine for the trained models.
+
+The sklearn / xgboost estimators are exported into flat NumPy arrays and
+evaluated with vectorized NumPy, which removes most of the per-call Python and
+input-validation overhead of `model.predict` for small batches.
+
+  - Tree ensembles (RandomForestRegressor, XGBRegressor) become one set of node
+    arrays for all trees: feature, threshold, left, right, value, default_left
+    plus the root node of every tree. Leaves point to themselves, so every tree
+    can be advanced one level per step with a single gather.
+  - LinearRegression collapses into one dot product, with the StandardScaler
+    folded into its coefficients.
+
+Exported models are saved as a directory of raw .npy files plus meta.json, so
+they load with np.load(mmap_mode="r") and share pages between worker processes.
+
+Comparison semantics match the source libraries:
+  - sklearn casts inputs to float32 and goes left when x <= threshold.
+  - xgboost goes left when x < split_condition (float32). This is rewritten as
+    x <= nextafter(split, -inf), so both use the same "<=" traversal.
+"""
+import json
+import os
+import re
+from typing import Dict, List, Optional
+
+import numpy as np
+
+ENGINE_FORMAT_VERSION = 1
+
+# rows are traversed in blocks so the (rows x trees) index matrix stays small
+_ROW_BLOCK = 4096
+
+# xgboost objectives whose prediction is the raw margin (identity link)
+_IDENTITY_OBJECTIVES = ("reg:squarederror", "reg:squaredlogerror", "reg:pseudohubererror",
+                        "reg:absoluteerror", "reg:quantileerror", "reg:linear")
+
+
+def _scaler_params(scaler, n_features: int):
+    """(mean, scale) float64 vectors for a fitted StandardScaler, or (None, None) if no scaler."""
+    if scaler is None:
+        return None, None
+    mean = getattr(scaler, "mean_", None) if getattr(scaler, "with_mean", True) else None
+    scale = getattr(scaler, "scale_", None) if getattr(scaler, "with_std", True) else None
+    mean = np.zeros(n_features) if mean is None else np.asarray(mean, dtype=np.float64)
+    scale = np.ones(n_features) if scale is None else np.asarray(scale, dtype=np.float64)
+    return mean, scale
+
+
+class CompiledLinear:
+    """y = X @ coef + intercept, with any StandardScaler already folded into coef / intercept."""
+
+    kind = "linear"
+
+    def __init__(self, coef: np.ndarray, intercept: float, n_features: int):
+        self.coef = np.asarray(coef, dtype=np.float64)
+        self.intercept = float(intercept)
+        self.n_features = int(n_features)
+
+    @classmethod
+    def from_sklearn(cls, model, scaler=None) -> "CompiledLinear":
+        coef = np.asarray(model.coef_, dtype=np.float64).reshape(-1, np.shape(model.coef_)[-1])[0]
+        intercept = float(np.ravel(model.intercept_)[0]) if np.ndim(model.intercept_) else float(model.intercept_)
+        mean, scale = _scaler_params(scaler, coef.shape[0])
+        if mean is not None:
+            # coef . ((x - mean) / scale) + b  ==  (coef / scale) . x + (b - coef . (mean / scale))
+            folded = coef / scale
+            intercept = intercept - float(np.dot(folded, mean))
+            coef = folded
+        return cls(coef, intercept, coef.shape[0])
+
+    def predict(self, X) -> np.ndarray:
+        X = np.asarray(X, dtype=np.float64)
+        return X @ self.coef + self.intercept
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        return {"coef": self.coef}
+
+    def meta(self) -> Dict[str, object]:
+        return {"intercept": self.intercept, "n_features": self.n_features}
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray], meta: Dict[str, object]) -> "CompiledLinear":
+        return cls(arrays["coef"], meta["intercept"], meta["n_features"])
+
+
+class CompiledForest:
+    """
+    All trees of an ensemble in flat node arrays.
+
+    Prediction for a row is `aggregate(value[leaf_t] for every tree t) + base_score`
+    where aggregate is "mean" (random forest) or "sum" (gradient boosting).
+    """
+
+    kind = "forest"
+
+    def __init__(self, feature, threshold, left, right, value, default_left, roots,
+                 max_depth: int, aggregate: str, base_score: float, n_features: int,
+                 scaler_mean=None, scaler_scale=None):
+        self.feature = np.asarray(feature, dtype=np.int32)
+        self.threshold = np.asarray(threshold, dtype=np.float64)
+        self.left = np.asarray(left, dtype=np.int32)
+        self.right = np.asarray(right, dtype=np.int32)
+        self.value = np.asarray(value, dtype=np.float64)
+        self.default_left = np.asarray(default_left, dtype=bool)
+        self.roots = np.asarray(roots, dtype=np.int32)
+        self.max_depth = int(max_depth)
+        self.aggregate = aggregate
+        self.base_score = float(base_score)
+        self.n_features = int(n_features)
+        self.scaler_mean = None if scaler_mean is None else np.asarray(scaler_mean, dtype=np.float64)
+        self.scaler_scale = None if scaler_scale is None else np.asarray(scaler_scale, dtype=np.float64)
+
+    # ---------- export ----------
+    @classmethod
+    def from_sklearn_forest(cls, model, scaler=None) -> "CompiledForest":
+        """Export a fitted sklearn RandomForestRegressor / ExtraTreesRegressor (single output)."""
+        parts = {k: [] for k in ("feature", "threshold", "left", "right", "value")}
+        roots, offset, max_depth = [], 0, 0
+        for est in model.estimators_:
+            t = est.tree_
+            n = t.node_count
+            idx = np.arange(n, dtype=np.int64) + offset
+            is_leaf = t.children_left < 0
+            parts["feature"].append(np.where(is_leaf, -1, t.feature))
+            parts["threshold"].append(np.where(is_leaf, 0.0, t.threshold))
+            parts["left"].append(np.where(is_leaf, idx, t.children_left + offset))
+            parts["right"].append(np.where(is_leaf, idx, t.children_right + offset))
+            parts["value"].append(np.asarray(t.value, dtype=np.float64).reshape(n, -1)[:, 0])
+            roots.append(offset)
+            offset += n
+            max_depth = max(max_depth, int(t.max_depth))
+        n_features = int(model.n_features_in_)
+        mean, scale = _scaler_params(scaler, n_features)
+        return cls(
+            feature=np.concatenate(parts["feature"]),
+            threshold=np.concatenate(parts["threshold"]),
+            left=np.concatenate(parts["left"]),
+            right=np.concatenate(parts["right"]),
+            value=np.concatenate(parts["value"]),
+            default_left=np.zeros(offset, dtype=bool),
+            roots=np.asarray(roots),
+            max_depth=max_depth,
+            aggregate="mean",
+            base_score=0.0,
+            n_features=n_features,
+            scaler_mean=mean,
+            scaler_scale=scale,
+        )
+
+    @classmethod
+    def from_xgboost(cls, model, scaler=None) -> "CompiledForest":
+        """Export a fitted XGBRegressor / Booster with a gbtree booster and an identity-link objective."""
+        booster = model.get_booster() if hasattr(model, "get_booster") else model
+        config = json.loads(booster.save_config())
+        learner = config.get("learner", {})
+        objective = learner.get("objective", {}).get("name", "reg:squarederror")
+        if objective not in _IDENTITY_OBJECTIVES:
+            raise ValueError(f"Unsupported xgboost objective for compiled inference: {objective}")
+        # base_score is a string such as "5E-1" (or "[5E-1]" in newer releases)
+        base_score = float(str(learner.get("learner_model_param", {}).get("base_score", "0")).strip("[]"))
+
+        feature_names = list(booster.feature_names or [])
+        dumps = booster.get_dump(dump_format="json")
+        if not dumps:
+            raise ValueError("xgboost model has no trees (gblinear boosters are not supported)")
+
+        feature, threshold, left, right, value, default_left, roots = [], [], [], [], [], [], []
+        max_depth = 0
+        for dump in dumps:
+            root = len(feature)
+            roots.append(root)
+            # flatten the nested dump depth-first and map xgboost node ids to flat indices
+            stack = [(json.loads(dump), 0)]
+            nodes = []
+            while stack:
+                node, depth = stack.pop()
+                nodes.append(node)
+                max_depth = max(max_depth, depth)
+                for child in node.get("children", []):
+                    stack.append((child, depth + 1))
+            index_of = {n["nodeid"]: root + i for i, n in enumerate(nodes)}
+            for i, n in enumerate(nodes):
+                me = root + i
+                if "leaf" in n:
+                    feature.append(-1)
+                    threshold.append(0.0)
+                    left.append(me)
+                    right.append(me)
+                    value.append(float(n["leaf"]))
+                    default_left.append(False)
+                    continue
+                feature.append(_xgb_feature_index(n["split"], feature_names))
+                # x < split (float32)  <=>  x <= largest float32 below split
+                split32 = np.float32(n["split_condition"])
+                threshold.append(float(np.nextafter(split32, np.float32(-np.inf))))
+                left.append(index_of[n["yes"]])
+                right.append(index_of[n["no"]])
+                value.append(0.0)
+                default_left.append(n.get("missing", n["yes"]) == n["yes"])
+
+        n_features = int(getattr(model, "n_features_in_", 0) or booster.num_features())
+        mean, scale = _scaler_params(scaler, n_features)
+        return cls(feature, threshold, left, right, value, default_left, roots,
+                   max_depth=max_depth, aggregate="sum", base_score=base_score,
+                   n_features=n_features, scaler_mean=mean, scaler_scale=scale)
+
+    # ---------- inference ----------
+    def _prepare(self, X) -> np.ndarray:
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.shape[1] != self.n_features:
+            raise ValueError(f"Expected {self.n_features} features, got {X.shape[1]}")
+        if self.scaler_mean is not None:
+            X = (X - self.scaler_mean) / self.scaler_scale
+        # both libraries evaluate splits on float32 inputs
+        return X.astype(np.float32).astype(np.float64)
+
+    def _predict_block(self, X: np.ndarray) -> np.ndarray:
+        n = X.shape[0]
+        idx = np.broadcast_to(self.roots, (n, self.roots.shape[0])).copy()
+        rows = np.arange(n)[:, None]
+        has_nan = bool(np.isnan(X).any())
+        for _ in range(self.max_depth):
+            feat = self.feature[idx]
+            if (feat < 0).all():
+                break
+            xv = X[rows, np.maximum(feat, 0)]
+            go_left = xv <= self.threshold[idx]
+            if has_nan:
+                go_left = np.where(np.isnan(xv), self.default_left[idx], go_left)
+            idx = np.where(go_left, self.left[idx], self.right[idx])
+        leaf_values = self.value[idx]
+        out = leaf_values.mean(axis=1) if self.aggregate == "mean" else leaf_values.sum(axis=1)
+        return out + self.base_score
+
+    def predict(self, X) -> np.ndarray:
+        X = self._prepare(X)
+        if X.shape[0] <= _ROW_BLOCK:
+            return self._predict_block(X)
+        return np.concatenate([self._predict_block(X[i:i + _ROW_BLOCK])
+                               for i in range(0, X.shape[0], _ROW_BLOCK)])
+
+    # ---------- serialization ----------
+    def arrays(self) -> Dict[str, np.ndarray]:
+        out = {name: getattr(self, name) for name in
+               ("feature", "threshold", "left", "right", "value", "default_left", "roots")}
+        if self.scaler_mean is not None:
+            out["scaler_mean"] = self.scaler_mean
+            out["scaler_scale"] = self.scaler_scale
+        return out
+
+    def meta(self) -> Dict[str, object]:
+        return {"max_depth": self.max_depth, "aggregate": self.aggregate,
+                "base_score": self.base_score, "n_features": self.n_features}
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray], meta: Dict[str, object]) -> "CompiledForest":
+        return cls(arrays["feature"], arrays["threshold"], arrays["left"], arrays["right"],
+                   arrays["value"], arrays["default_left"], arrays["roots"],
+                   max_depth=meta["max_depth"], aggregate=meta["aggregate"],
+                   base_score=meta["base_score"], n_features=meta["n_features"],
+                   scaler_mean=arrays.get("scaler_mean"), scaler_scale=arrays.get("scaler_scale"))
+
+
+_KINDS = {"linear": CompiledLinear, "forest": CompiledForest}
+
+
+def _xgb_feature_index(split: str, feature_names: List[str]) -> int:
+    if feature_names and split in feature_names:
+        return feature_names.index(split)
+    m = re.fullmatch(r"f(\d+)", split)
+    if not m:
+        raise ValueError(f"Cannot map xgboost split feature '{split}' to a column index")
+    return int(m.group(1))
+
+
+def compile_model(model, scaler=None):
+    """
+    Export a fitted model (plus the StandardScaler applied before it) into a compiled engine.
+    Supports sklearn linear models, sklearn forests and xgboost gbtree regressors.
+    Raises ValueError for anything else.
+    """
+    if hasattr(model, "get_booster"):
+        return CompiledForest.from_xgboost(model, scaler)
+    if hasattr(model, "estimators_") and hasattr(getattr(model, "estimators_")[0], "tree_"):
+        return CompiledForest.from_sklearn_forest(model, scaler)
+    if hasattr(model, "coef_") and hasattr(model, "intercept_"):
+        return CompiledLinear.from_sklearn(model, scaler)
+    raise ValueError(f"No compiled engine for model type {type(model).__name__}")
+
+
+def save_compiled(engine, directory: str) -> str:
+    """Write `engine` as raw .npy arrays + meta.json into `directory` (created if needed)."""
+    os.makedirs(directory, exist_ok=True)
+    arrays = engine.arrays()
+    for name, arr in arrays.items():
+        np.save(os.path.join(directory, f"{name}.npy"), np.ascontiguousarray(arr), allow_pickle=False)
+    meta = dict(engine.meta(), kind=engine.kind, format_version=ENGINE_FORMAT_VERSION,
+                arrays=sorted(arrays))
+    # meta.json is written last: its presence marks a complete export
+    with open(os.path.join(directory, "meta.json"), "w") as fh:
+        json.dump(meta, fh, indent=2)
+    return directory
+
+
+def load_compiled(directory: str, mmap_mode: Optional[str] = "r"):
+    """Load an engine written by save_compiled(); arrays are memory-mapped by default."""
+    with open(os.path.join(directory, "meta.json"), "r") as fh:
+        meta = json.load(fh)
+    if meta.get("format_version") != ENGINE_FORMAT_VERSION:
+        raise ValueError(f"Unsupported compiled model format: {meta.get('format_version')}")
+    arrays = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mmap_mode, allow_pickle=False)
+              for name in meta["arrays"]}
+    return _KINDS[meta["kind"]].from_arrays(arrays, meta)
@@ -0,0 +1,166 @@
+# tests/test_persistence.py
+"""services.persistence against the in-memory collection stand-in."""
+import threading
+import time
+
+import pytest
+from bson import ObjectId
+
+from services import persistence
+from services.memory_store import InMemoryCollection
+
+
+class BlockingCollection(InMemoryCollection):
+    """insert_many waits until `release` is set, to hold the writer's queue full."""
+
+    def __init__(self, name: str = "blocking"):
+        super().__init__(name)
+        self.release = threading.Event()
+        self.started = threading.Event()
+
+    def insert_many(self, docs, ordered: bool = True):
+        self.started.set()
+        self.release.wait(5.0)
+        return super().insert_many(docs, ordered=ordered)
+
+
+@pytest.fixture
+def async_mode(monkeypatch):
+    monkeypatch.setattr(persistence, "PERSIST_MODE", "async")
+    yield
+    persistence.shutdown(timeout=5.0)
+
+
+def test_sync_save_and_save_many(monkeypatch):
+    monkeypatch.setattr(persistence, "PERSIST_MODE", "sync")
+    col = InMemoryCollection("sync")
+    doc = {"house_id": "H1"}
+    oid = persistence.save(col, doc)
+    ids = persistence.save_many(col, [{"house_id": "H2"}, {"house_id": "H3"}])
+
+    assert "_id" not in doc
+    assert persistence.save_many(col, []) == []
+    assert col.count_documents({}) == 3
+    assert [d["house_id"] for d in col.find({"_id": {"$in": [ObjectId(i) for i in [oid] + ids]}})] == ["H1", "H2", "H3"]
+
+
+def test_async_save_returns_before_the_write(async_mode):
+    col = BlockingCollection()
+    oid = persistence.save(col, {"house_id": "H1"})
+    ids = persistence.save_many(col, [{"house_id": "H2"}, {"house_id": "H3"}])
+
+    assert col.count_documents({}) == 0
+    col.release.set()
+    assert persistence.get_writer(col).flush(timeout=5.0)
+    assert {str(d["_id"]) for d in col.find()} == {oid, *ids}
+    assert persistence.stats()["blocking"]["written"] == 3
+
+
+def test_flushes_by_batch_size_and_interval():
+    col = InMemoryCollection("batched")
+    writer = persistence.WriteBehindWriter(col, batch_size=10, flush_interval_ms=50, name="batched")
+    try:
+        writer.put_many([{"n": i} for i in range(25)])
+        assert writer.flush(timeout=5.0)
+        stats = writer.stats()
+        assert stats["written"] == 25 and stats["pending"] == 0
+        assert stats["flushes"] >= 3  # two full batches, the rest after the interval
+    finally:
+        writer.close()
+
+
+def test_backpressure_rejects_single_documents():
+    col = BlockingCollection()
+    writer = persistence.WriteBehindWriter(col, batch_size=1, max_queue=2, enqueue_timeout_ms=10, name="bp")
+    try:
+        writer.put({"n": 0})
+        assert col.started.wait(5.0)  # the writer holds doc 0, the queue is empty
+        writer.put({"n": 1})
+        writer.put({"n": 2})
+        with pytest.raises(persistence.PersistenceBackpressure):
+            writer.put({"n": 3})
+        assert writer.stats()["rejected"] == 1
+    finally:
+        col.release.set()
+        writer.close()
+    assert col.count_documents({}) == 3
+
+
+def _register_writer(col, **kwargs) -> persistence.WriteBehindWriter:
+    """Make `col`'s shared writer (the one save / save_many use) one with these settings."""
+    writer = persistence.WriteBehindWriter(col, name=col.name, **kwargs)
+    persistence._writers[id(col)] = writer
+    return writer
+
+
+def test_rejected_batch_writes_nothing(async_mode):
+    col = BlockingCollection()
+    _register_writer(col, batch_size=1, max_queue=4, enqueue_timeout_ms=10)
+    persistence.save(col, {"house_id": "H0"})
+    assert col.started.wait(5.0)
+    persistence.save_many(col, [{"house_id": "H1"}, {"house_id": "H2"}])
+
+    # 2 of 4 slots are taken: a batch of 3 is rejected as a whole, none of it is queued
+    with pytest.raises(persistence.PersistenceBackpressure):
+        persistence.save_many(col, [{"house_id": f"R{i}"} for i in range(3)])
+    # larger than the queue: can never fit
+    with pytest.raises(persistence.PersistenceBackpressure):
+        persistence.save_many(col, [{"house_id": f"R{i}"} for i in range(5)])
+    stats = persistence.get_writer(col).stats()
+    assert stats["pending"] == 2 and stats["rejected"] == 8
+
+    col.release.set()
+    assert persistence.get_writer(col).flush(timeout=5.0)
+    assert sorted(d["house_id"] for d in col.find()) == ["H0", "H1", "H2"]
+
+
+def test_batch_waits_for_room_within_the_timeout():
+    col = BlockingCollection()
+    writer = persistence.WriteBehindWriter(col, batch_size=1, max_queue=2, enqueue_timeout_ms=2000, name="wait")
+    try:
+        writer.put({"n": 0})
+        assert col.started.wait(5.0)
+        writer.put({"n": 1})
+        threading.Timer(0.05, col.release.set).start()
+        writer.put_many([{"n": 2}, {"n": 3}])  # fits once the writer drains doc 1
+        assert writer.flush(timeout=5.0)
+    finally:
+        col.release.set()
+        writer.close()
+    assert sorted(d["n"] for d in col.find()) == [0, 1, 2, 3]
+
+
+def test_failed_documents_are_counted():
+    col = InMemoryCollection("dupes")
+    oid = ObjectId()
+    col.insert_one({"_id": oid})
+    writer = persistence.WriteBehindWriter(col, batch_size=10, flush_interval_ms=10, name="dupes")
+    try:
+        writer.put_many([{"_id": oid}, {"n": 1}, {"n": 2}])
+        assert writer.flush(timeout=5.0)
+    finally:
+        writer.close()
+    stats = writer.stats()
+    assert stats["written"] == 2 and stats["failed"] == 1
+    assert col.count_documents({}) == 3
+
+
+def test_shutdown_flushes_pending_documents(async_mode):
+    col = InMemoryCollection("shutdown")
+    _register_writer(col, batch_size=100, flush_interval_ms=10_000)
+    ids = persistence.save_many(col, [{"n": i} for i in range(5)])
+    time.sleep(0.05)
+    assert col.count_documents({}) == 0  # waiting for a full batch or the interval
+
+    persistence.shutdown(timeout=5.0)
+    assert sorted(str(d["_id"]) for d in col.find()) == sorted(ids)
+    assert persistence.stats() == {}
+
+
+def test_closed_writer_rejects_documents():
+    writer = persistence.WriteBehindWriter(InMemoryCollection("closed"), name="closed")
+    assert writer.close(timeout=5.0)
+    with pytest.raises(RuntimeError):
+        writer.put({"n": 1})
+    with pytest.raises(RuntimeError):
+        writer.put_many([{"n": 1}])
@@ -1,201 +1,731 @@
-"""
-Train models with small Gaussian noise added to the target (Option A).
-Saves models and scaler to OUTPUT_MODEL_DIR (set below).
-Generates evaluation metrics and plots for report.
-
-Usage:
-    python train_with_noise_and_save.py
-"""
-
-import os
-import json
-import joblib
-import numpy as np
-import pandas as pd
-import matplotlib.pyplot as plt
-from sklearn.model_selection import train_test_split
-from sklearn.preprocessing import StandardScaler
-from sklearn.linear_model import LinearRegression
-from sklearn.ensemble import RandomForestRegressor
-from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score
-from xgboost import XGBRegressor
-
-# ----------------- CONFIG -----------------
-DATA_CSV = "D:/AIRES_Project/reports/eda_v2/train_ready_v2.csv"   # path to your CSV
-FEATURE_ORDER_PATH = "AIRES_Backend/data/feature_order.json"  # path to feature_order.json
-TARGET_NAME = "HouseConsumption_kWh"   # target column name
-OUTPUT_MODEL_DIR = "D:/AIRES_Project/reports"  # where backend expects models (adjust if needed)
-REPORT_DIR = "reports/final_models"    # where metrics/plots will be saved
-NOISE_SIGMA = 5.0                      # standard deviation of Gaussian noise added to target
-RANDOM_STATE = 42
-TEST_SIZE = 0.30
-N_JOBS = -1
-# ------------------------------------------
-
-os.makedirs(OUTPUT_MODEL_DIR, exist_ok=True)
-os.makedirs(REPORT_DIR, exist_ok=True)
-
-# ---------- helpers ----------
-def safe_mape(y_true, y_pred):
-    y_true = np.asarray(y_true)
-    y_pred = np.asarray(y_pred)
-    mask = y_true != 0
-    if mask.sum() == 0:
-        return None
-    return float(np.mean(np.abs((y_true[mask] - y_pred[mask]) / y_true[mask])) * 100.0)
-
-def smape(y_true, y_pred):
-    y_true = np.asarray(y_true)
-    y_pred = np.asarray(y_pred)
-    denom = np.abs(y_true) + np.abs(y_pred)
-    mask = denom != 0
-    if mask.sum() == 0:
-        return None
-    return float(np.mean((2.0 * np.abs(y_pred - y_true)[mask] / denom[mask])) * 100.0)
-
-def eval_metrics(y_true, y_pred):
-    rmse = float(np.sqrt(mean_squared_error(y_true, y_pred)))
-    mae  = float(mean_absolute_error(y_true, y_pred))
-    r2   = float(r2_score(y_true, y_pred))
-    mape_s = safe_mape(y_true, y_pred)
-    smape_v = smape(y_true, y_pred)
-    return {"RMSE": rmse, "MAE": mae, "R2": r2, "MAPE_safe": mape_s, "SMAPE": smape_v}
-
-# ---------- load feature order ----------
-with open(FEATURE_ORDER_PATH, "r") as f:
-    fo = json.load(f)
-    feature_order = fo["feature_order"] if isinstance(fo, dict) and "feature_order" in fo else fo
-
-print("Loaded feature_order len:", len(feature_order))
-
-# ---------- load dataset ----------
-df = pd.read_csv(DATA_CSV)
-print("Loaded data shape:", df.shape)
-if TARGET_NAME not in df.columns:
-    raise RuntimeError(f"Target column '{TARGET_NAME}' not found in CSV")
-
-print("Target summary BEFORE noise:\n", df[TARGET_NAME].describe())
-print("Zeros in target BEFORE noise:", int((df[TARGET_NAME] == 0).sum()))
-
-# ---------- add gaussian noise ----------
-np.random.seed(RANDOM_STATE)
-noise = np.random.normal(loc=0.0, scale=NOISE_SIGMA, size=len(df))
-df[TARGET_NAME] = df[TARGET_NAME] + noise
-# ensure no negative energy (clip)
-df[TARGET_NAME] = df[TARGET_NAME].clip(lower=0.0)
-
-print("Target summary AFTER noise:\n", df[TARGET_NAME].describe())
-print("Zeros in target AFTER noise:", int((df[TARGET_NAME] == 0).sum()))
-
-# ---------- build X and y ----------
-X = df[feature_order].copy()
-if TARGET_NAME in X.columns:
-    print("Dropping target from features (safety):", TARGET_NAME)
-    X = X.drop(columns=[TARGET_NAME])
-y = df[TARGET_NAME].values
-
-print("X shape, y shape:", X.shape, y.shape)
-
-# ---------- split ----------
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=TEST_SIZE,
-                                                    random_state=RANDOM_STATE, shuffle=True)
-print("Train/Test shapes:", X_train.shape, X_test.shape)
-
-# ---------- scaler ----------
-scaler = StandardScaler()
-X_train_scaled = scaler.fit_transform(X_train)
-X_test_scaled = scaler.transform(X_test)
-
-# ---------- models ----------
-lr = LinearRegression()
-rf = RandomForestRegressor(n_estimators=200, random_state=RANDOM_STATE, n_jobs=N_JOBS)
-xgb = XGBRegressor(n_estimators=300, learning_rate=0.05, random_state=RANDOM_STATE, verbosity=0, n_jobs=N_JOBS)
-
-print("Training LinearRegression...")
-lr.fit(X_train_scaled, y_train)
-print("Training RandomForest...")
-rf.fit(X_train_scaled, y_train)
-print("Training XGBoost...")
-xgb.fit(X_train_scaled, y_train)
-
-# ---------- evaluate ----------
-results = {}
-for name, model in [("linear", lr), ("rf", rf), ("xgb", xgb)]:
-    preds = model.predict(X_test_scaled)
-    metrics = eval_metrics(y_test, preds)
-    results[name] = metrics
-    print(f"\n{name} metrics:", metrics)
-
-# ---------- save models & scaler ----------
-joblib.dump(lr, os.path.join(OUTPUT_MODEL_DIR, "linear_regression.pkl"))
-joblib.dump(rf, os.path.join(OUTPUT_MODEL_DIR, "random_forest.pkl"))
-joblib.dump(xgb, os.path.join(OUTPUT_MODEL_DIR, "xgboost_regressor.pkl"))
-joblib.dump(scaler, os.path.join(OUTPUT_MODEL_DIR, "scaler.pkl"))
-
-print("Saved models and scaler to:", OUTPUT_MODEL_DIR)
-
-# ---------- save metrics json ----------
-metrics_path = os.path.join(REPORT_DIR, "model_metrics.json")
-with open(metrics_path, "w") as fh:
-    json.dump(results, fh, indent=2)
-print("Saved metrics to", metrics_path)
-
-# ---------- plots: pred vs actual for each model ----------
-def plot_pred_vs_actual(y_true, y_pred, title, fpath):
-    plt.figure(figsize=(6,5))
-    plt.scatter(y_true, y_pred, s=12, alpha=0.4)
-    mn = min(y_true.min(), y_pred.min())
-    mx = max(y_true.max(), y_pred.max())
-    plt.plot([mn, mx], [mn, mx], "k--", linewidth=1)
-    plt.xlabel("Actual")
-    plt.ylabel("Predicted")
-    plt.title(title)
-    plt.tight_layout()
-    plt.savefig(fpath, dpi=150)
-    plt.close()
-
-plot_pred_vs_actual(y_test, lr.predict(X_test_scaled), "LinearPred vs Actual", os.path.join(REPORT_DIR, "pred_vs_actual_linear.png"))
-plot_pred_vs_actual(y_test, rf.predict(X_test_scaled), "RFPred vs Actual", os.path.join(REPORT_DIR, "pred_vs_actual_rf.png"))
-plot_pred_vs_actual(y_test, xgb.predict(X_test_scaled), "XGBPred vs Actual", os.path.join(REPORT_DIR, "pred_vs_actual_xgb.png"))
-
-# ---------- residuals plot for RF & XGB ----------
-def plot_residuals(y_true, y_pred, title, fpath):
-    res = y_true - y_pred
-    plt.figure(figsize=(6,4))
-    plt.scatter(y_pred, res, s=10, alpha=0.4)
-    plt.axhline(0, color="k", linestyle="--", linewidth=1)
-    plt.xlabel("Predicted")
-    plt.ylabel("Residual (Actual - Predicted)")
-    plt.title(title)
-    plt.tight_layout()
-    plt.savefig(fpath, dpi=150)
-    plt.close()
-
-plot_residuals(y_test, rf.predict(X_test_scaled), "RF Residuals", os.path.join(REPORT_DIR, "residuals_rf.png"))
-plot_residuals(y_test, xgb.predict(X_test_scaled), "XGB Residuals", os.path.join(REPORT_DIR, "residuals_xgb.png"))
-
-# ---------- feature importances (RF and XGB) ----------
-feat_names = X.columns.tolist()
-def save_feature_importances(model, name, outpath, topk=20):
-    if hasattr(model, "feature_importances_"):
-        imp = model.feature_importances_
-    else:
-        print("Model", name, "has no feature_importances_")
-        return
-    idx = np.argsort(imp)[::-1][:topk]
-    labels = [feat_names[i] for i in idx]
-    vals = imp[idx]
-    plt.figure(figsize=(6,6))
-    plt.barh(range(len(vals))[::-1], vals, align="center")
-    plt.yticks(range(len(vals))[::-1], labels)
-    plt.xlabel("Importance")
-    plt.title(f"Top {len(vals)} Feature Importances ({name})")
-    plt.tight_layout()
-    plt.savefig(outpath, dpi=150)
-    plt.close()
-
-save_feature_importances(rf, "RandomForest", os.path.join(REPORT_DIR, "rf_feature_importances.png"))
-save_feature_importances(xgb, "XGBoost", os.path.join(REPORT_DIR, "xgb_feature_importances.png"))
-
-print("Saved plots to", REPORT_DIR)
-print("Done.")
+"""
+Train models with small Gaussian noise added to the target (Option A).
+Saves models and scaler to OUTPUT_MODEL_DIR (set below).
+Generates evaluation metrics and plots for report.
+
+The data is processed out-of-core, so memory stays bounded by CHUNK_ROWS
+rather than by the dataset size:
+  1. scan:    read DATA_CSV (.csv or .parquet) in float32 chunks, add noise, split
+              train/test per row, fit the scaler with partial_fit, spill the train and
+              test chunks to REPORT_DIR/_chunks as .npy, keep a bounded reservoir sample
+              of train rows for the random forest (also the source of the
+              drift-monitoring reference profile, see Backend/services/drift_monitor.py)
+  2. linear:  accumulate X'X / X'y over the spilled chunks and solve the normal equations
+  3. rf:      fit on the reservoir sample (RF_MAX_TRAIN_ROWS rows)
+  4. xgb:     train on a QuantileDMatrix built by iterating over the spilled chunks
+  5. predict: stream the spilled test chunks through every model once; metrics are
+              accumulated over all test rows, while plots, residuals and the prediction
+              profile use a uniform sample of at most EVAL_SAMPLE_ROWS predictions
+Wall time and RSS (current and peak) per stage are printed and saved to
+REPORT_DIR/training_profile.json.
+
+With --mode search (or TRAIN_MODE = "search"), stages 2-4 are replaced by a
+hyperparameter search: every SEARCH_GRID candidate is fitted in a process pool
+of SEARCH_WORKERS processes, each limited to SEARCH_THREADS_PER_WORKER threads,
+and ranked by RMSE on a validation split (VAL_SIZE). The best candidate per
+model is saved as usual and all candidates go to REPORT_DIR/leaderboard.json.
+
+Usage:
+    python train_with_noise_and_save.py
+    python train_with_noise_and_save.py --mode search --workers 4 --threads-per-worker 2
+"""
+
+import os
+import sys
+import json
+import argparse
+import itertools
+import multiprocessing
+import time
+import shutil
+import pickle
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
+
+import joblib
+import numpy as np
+import pandas as pd
+import matplotlib.pyplot as plt
+import xgboost
+from sklearn.preprocessing import StandardScaler
+from sklearn.linear_model import LinearRegression
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score
+from xgboost import XGBRegressor
+
+# backend engine used to export pickle-free flat-array models (Backend/services/tree_engine.py)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "Backend"))
+from services.tree_engine import compile_model, save_compiled
+from services.ai_service import MODEL_REGISTRY
+from services.model_registry import publish_version
+from services.drift_monitor import REFERENCE_PROFILE_FILE, build_reference_profile, column_profile
+
+# ----------------- CONFIG -----------------
+DATA_CSV = "D:/AIRES_Project/reports/eda_v2/train_ready_v2.csv"   # path to your CSV (or .parquet)
+FEATURE_ORDER_PATH = "AIRES_Backend/data/feature_order.json"  # path to feature_order.json
+TARGET_NAME = "HouseConsumption_kWh"   # target column name
+OUTPUT_MODEL_DIR = "D:/AIRES_Project/reports"  # where backend expects models (adjust if needed)
+REPORT_DIR = "reports/final_models"    # where metrics/plots will be saved
+NOISE_SIGMA = 5.0                      # standard deviation of Gaussian noise added to target
+RANDOM_STATE = 42
+TEST_SIZE = 0.30
+N_JOBS = -1
+# joblib compression for saved artifacts. Keep 0 so numpy arrays are stored raw and the
+# backend can load them with MODEL_MMAP_MODE=r (pages shared across uvicorn workers).
+ARTIFACT_COMPRESS = 0
+# also publish each model as a new version in OUTPUT_MODEL_DIR/manifest.json; a running backend
+# pointed at that directory swaps the new versions in without a restart
+PUBLISH_VERSIONS = True
+KEEP_VERSIONS = 5                      # published versions kept per model (plus active / pinned); 0 = keep all
+CHUNK_ROWS = 50_000                    # rows read (and held as float32) per chunk
+FEATURE_DTYPE = np.float32
+RF_MAX_TRAIN_ROWS = 200_000            # RandomForest needs its train matrix in memory; larger train sets are sampled
+XGB_MAX_BIN = 256
+EVAL_SAMPLE_ROWS = 200_000             # test predictions kept (uniform sample) for plots and the drift profile
+PLOT_MAX_POINTS = 20_000               # scatter plots are drawn from a sample of the test set
+TRAIN_MODE = "single"                  # "single": MODEL_PARAMS; "search": SEARCH_GRID in a process pool
+MODEL_PARAMS = {
+    "linear": {},
+    "rf": {"n_estimators": 200},
+    "xgb": {"n_estimators": 300, "learning_rate": 0.05},
+}
+SEARCH_GRID = {                        # every combination of the listed values is one candidate
+    "linear": {},
+    "rf": {"n_estimators": [200, 400], "max_depth": [None, 16], "min_samples_leaf": [1, 5]},
+    "xgb": {"n_estimators": [300, 600], "learning_rate": [0.05, 0.1], "max_depth": [4, 6, 8]},
+}
+SEARCH_WORKERS = 0                     # pool processes; 0 = cpu_count // SEARCH_THREADS_PER_WORKER
+SEARCH_THREADS_PER_WORKER = 1          # n_jobs / nthread / BLAS threads inside each worker (no oversubscription)
+VAL_SIZE = 0.15                        # search mode: share of rows held out to rank candidates
+# ------------------------------------------
+
+os.makedirs(OUTPUT_MODEL_DIR, exist_ok=True)
+os.makedirs(REPORT_DIR, exist_ok=True)
+
+# ---------- helpers ----------
+def safe_mape(y_true, y_pred):
+    y_true = np.asarray(y_true)
+    y_pred = np.asarray(y_pred)
+    mask = y_true != 0
+    if mask.sum() == 0:
+        return None
+    return float(np.mean(np.abs((y_true[mask] - y_pred[mask]) / y_true[mask])) * 100.0)
+
+def smape(y_true, y_pred):
+    y_true = np.asarray(y_true)
+    y_pred = np.asarray(y_pred)
+    denom = np.abs(y_true) + np.abs(y_pred)
+    mask = denom != 0
+    if mask.sum() == 0:
+        return None
+    return float(np.mean((2.0 * np.abs(y_pred - y_true)[mask] / denom[mask])) * 100.0)
+
+def eval_metrics(y_true, y_pred):
+    rmse = float(np.sqrt(mean_squared_error(y_true, y_pred)))
+    mae  = float(mean_absolute_error(y_true, y_pred))
+    r2   = float(r2_score(y_true, y_pred))
+    mape_s = safe_mape(y_true, y_pred)
+    smape_v = smape(y_true, y_pred)
+    return {"RMSE": rmse, "MAE": mae, "R2": r2, "MAPE_safe": mape_s, "SMAPE": smape_v}
+
+class StreamingMetrics:
+    """eval_metrics() of a stream of (y_true, y_pred) chunks, accumulated without keeping the chunks."""
+
+    def __init__(self):
+        self.y = RunningStats()  # its m2 is R2's total sum of squares
+        self.sq, self.abs = 0.0, 0.0
+        self.ape, self.ape_n, self.sape, self.sape_n = 0.0, 0, 0.0, 0
+
+    def update(self, y_true, y_pred):
+        y_true = np.asarray(y_true, dtype=np.float64)
+        err = np.asarray(y_pred, dtype=np.float64) - y_true
+        self.y.update(y_true)
+        self.sq += float(err @ err)
+        self.abs += float(np.abs(err).sum())
+        mask = y_true != 0
+        self.ape += float(np.abs(err[mask] / y_true[mask]).sum())
+        self.ape_n += int(mask.sum())
+        denom = np.abs(y_true) + np.abs(y_true + err)
+        mask = denom != 0
+        self.sape += float((2.0 * np.abs(err[mask]) / denom[mask]).sum())
+        self.sape_n += int(mask.sum())
+
+    def summary(self):
+        n, ss_tot = self.y.n, self.y.m2
+        # r2_score's convention for a constant target: 1 for a perfect fit, else 0
+        r2 = 1.0 - self.sq / ss_tot if ss_tot > 0 else (1.0 if self.sq == 0 else 0.0)
+        return {"RMSE": float(np.sqrt(self.sq / n)), "MAE": self.abs / n, "R2": float(r2),
+                "MAPE_safe": self.ape / self.ape_n * 100.0 if self.ape_n else None,
+                "SMAPE": self.sape / self.sape_n * 100.0 if self.sape_n else None}
+
+# ---------- stage profiling ----------
+def current_rss_mb():
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / 2**20
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm") as fh:
+            return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError, AttributeError):
+        return None
+
+def peak_rss_mb():
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2**20 if sys.platform == "darwin" else peak / 2**10  # bytes on macOS, KiB on Linux
+    except ImportError:
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().peak_wset / 2**20  # Windows
+    except (ImportError, AttributeError):
+        return None
+
+def _fmt_mb(v):
+    return "n/a" if v is None else f"{v:.0f} MB"
+
+STAGE_REPORT = []
+
+@contextmanager
+def stage(name):
+    print(f"\n== {name} ==")
+    t0 = time.perf_counter()
+    yield
+    entry = {"stage": name, "seconds": round(time.perf_counter() - t0, 3),
+             "rss_mb": current_rss_mb(), "peak_rss_mb": peak_rss_mb()}
+    STAGE_REPORT.append(entry)
+    print(f"[{name}] {entry['seconds']:.2f}s  rss={_fmt_mb(entry['rss_mb'])}  peak={_fmt_mb(entry['peak_rss_mb'])}")
+
+# ---------- chunked loading ----------
+def load_feature_order(path):
+    with open(path, "r") as f:
+        fo = json.load(f)
+    feature_order = fo["feature_order"] if isinstance(fo, dict) and "feature_order" in fo else fo
+    if TARGET_NAME in feature_order:
+        print("Dropping target from features (safety):", TARGET_NAME)
+        feature_order = [c for c in feature_order if c != TARGET_NAME]
+    return feature_order
+
+def iter_chunks(path, columns):
+    """Yield DataFrames of at most CHUNK_ROWS rows with only `columns`, all float32."""
+    if path.lower().endswith((".parquet", ".pq")):
+        import pyarrow.parquet as pq
+        pf = pq.ParquetFile(path)
+        missing = [c for c in columns if c not in pf.schema_arrow.names]
+        if missing:
+            raise RuntimeError(f"Columns {missing} not found in {path}")
+        for batch in pf.iter_batches(batch_size=CHUNK_ROWS, columns=columns):
+            yield batch.to_pandas().astype(FEATURE_DTYPE, copy=False)
+    else:
+        header = pd.read_csv(path, nrows=0).columns
+        missing = [c for c in columns if c not in header]
+        if missing:
+            raise RuntimeError(f"Columns {missing} not found in {path}")
+        yield from pd.read_csv(path, usecols=columns, dtype={c: FEATURE_DTYPE for c in columns},
+                               chunksize=CHUNK_ROWS)
+
+class RunningStats:
+    """Count / mean / std / min / max / zero count of a stream of 1-D arrays (Chan's parallel update)."""
+
+    def __init__(self):
+        self.n, self.mean, self.m2 = 0, 0.0, 0.0
+        self.min, self.max, self.zeros = np.inf, -np.inf, 0
+
+    def update(self, a):
+        if len(a) == 0:
+            return
+        n_b, mean_b = len(a), float(a.mean())
+        m2_b = float(((a - mean_b) ** 2).sum())
+        n = self.n + n_b
+        delta = mean_b - self.mean
+        self.mean += delta * n_b / n
+        self.m2 += m2_b + delta ** 2 * self.n * n_b / n
+        self.n = n
+        self.min, self.max = min(self.min, float(a.min())), max(self.max, float(a.max()))
+        self.zeros += int((a == 0).sum())
+
+    def summary(self):
+        std = float(np.sqrt(self.m2 / (self.n - 1))) if self.n > 1 else 0.0
+        return {"count": self.n, "mean": self.mean, "std": std, "min": self.min, "max": self.max}
+
+class Reservoir:
+    """Uniform sample of at most `size` rows from a stream of (X, y) chunks (vectorised algorithm R)."""
+
+    def __init__(self, size, n_features, rng, dtype=FEATURE_DTYPE):
+        self.X = np.empty((size, n_features), dtype=dtype)
+        self.y = np.empty(size, dtype=np.float64)
+        self.size, self.seen, self.rng = size, 0, rng
+
+    def add(self, X, y):
+        n = len(y)
+        fill = min(max(self.size - self.seen, 0), n)
+        if fill:
+            self.X[self.seen:self.seen + fill] = X[:fill]
+            self.y[self.seen:self.seen + fill] = y[:fill]
+        if fill < n:
+            # row with global index t replaces slot j ~ U[0, t] when j < size
+            t = np.arange(self.seen + fill, self.seen + n)
+            j = self.rng.integers(0, t + 1)
+            keep = j < self.size
+            self.X[j[keep]] = X[fill:][keep]
+            self.y[j[keep]] = y[fill:][keep]
+        self.seen += n
+
+    def sample(self):
+        k = min(self.seen, self.size)
+        return self.X[:k], self.y[:k]
+
+def scan(feature_order, spill_dir, val_size=0.0):
+    """
+    Stage 1: one pass over DATA_CSV. Returns (scaler, {"train" / "val" / "test": chunk
+    files}, reservoir, target stats before/after noise); every split is spilled to
+    `spill_dir` as (X .npy, y .npy) pairs of raw features. Noise and the split come
+    from one seeded generator, so reruns over the same file are reproducible, and the
+    test rows are the same whatever `val_size` is (validation rows come out of train).
+    """
+    rng = np.random.default_rng(RANDOM_STATE)
+    scaler = StandardScaler()
+    reservoir = Reservoir(RF_MAX_TRAIN_ROWS, len(feature_order), np.random.default_rng(RANDOM_STATE + 1))
+    before, after = RunningStats(), RunningStats()
+    files = {"train": [], "val": [], "test": []}
+
+    def spill(split, i, X, y):
+        if len(y):
+            x_path = os.path.join(spill_dir, f"{split}_{i:05d}_X.npy")
+            y_path = os.path.join(spill_dir, f"{split}_{i:05d}_y.npy")
+            np.save(x_path, X)
+            np.save(y_path, y)
+            files[split].append((x_path, y_path))
+
+    for i, chunk in enumerate(iter_chunks(DATA_CSV, feature_order + [TARGET_NAME])):
+        X = chunk[feature_order].to_numpy(dtype=FEATURE_DTYPE)
+        y = chunk[TARGET_NAME].to_numpy(dtype=np.float64)
+        del chunk
+        before.update(y)
+        # gaussian noise, clipped so there is no negative energy
+        y = np.clip(y + rng.normal(loc=0.0, scale=NOISE_SIGMA, size=len(y)), 0.0, None)
+        after.update(y)
+
+        u = rng.random(len(y))
+        is_test = u < TEST_SIZE
+        is_val = ~is_test & (u < TEST_SIZE + val_size)
+        is_train = ~(is_test | is_val)
+        spill("test", i, X[is_test], y[is_test])
+        spill("val", i, X[is_val], y[is_val])
+        X_tr, y_tr = X[is_train], y[is_train]
+        if len(y_tr) == 0:
+            continue
+        scaler.partial_fit(X_tr)
+        reservoir.add(X_tr, y_tr)
+        spill("train", i, X_tr, y_tr)
+
+    if not files["train"]:
+        raise RuntimeError(f"No training rows read from {DATA_CSV}")
+    if not files["test"]:
+        raise RuntimeError(f"No test rows read from {DATA_CSV}")
+    return scaler, files, reservoir, before, after
+
+def spilled_rows(files):
+    return sum(np.load(y_path, mmap_mode="r").shape[0] for _, y_path in files)
+
+def iter_scaled_chunks(files, scaler):
+    """Scaled (float32) chunks of one split read back from the spill directory."""
+    for x_path, y_path in files:
+        X = np.load(x_path, mmap_mode="r")
+        yield scaler.transform(X).astype(FEATURE_DTYPE, copy=False), np.load(y_path)
+
+# ---------- models ----------
+def fit_linear(train_files, scaler, n_features):
+    """
+    Stage 2: ordinary least squares from the accumulated normal equations
+    [1 X]'[1 X] w = [1 X]'y, which only needs an (F+1)x(F+1) matrix in memory.
+    Equivalent to LinearRegression().fit on the full scaled train set.
+    """
+    xtx = np.zeros((n_features + 1, n_features + 1))
+    xty = np.zeros(n_features + 1)
+    for X, y in iter_scaled_chunks(train_files, scaler):
+        Z = np.empty((len(y), n_features + 1))
+        Z[:, 0] = 1.0
+        Z[:, 1:] = X
+        xtx += Z.T @ Z
+        xty += Z.T @ y
+    w = np.linalg.lstsq(xtx, xty, rcond=None)[0]
+
+    lr = LinearRegression()
+    lr.intercept_ = float(w[0])
+    lr.coef_ = w[1:]
+    lr.n_features_in_ = n_features
+    lr.rank_ = int(np.linalg.matrix_rank(xtx)) - 1
+    lr.singular_ = np.linalg.svd(xtx[1:, 1:], compute_uv=False) ** 0.5
+    return lr
+
+def fit_rf(X, y, scaler, params, n_jobs=N_JOBS):
+    """Stage 3: RandomForest on the reservoir sample (the whole train set when it fits)."""
+    rf = RandomForestRegressor(random_state=RANDOM_STATE, n_jobs=n_jobs, **params)
+    rf.fit(scaler.transform(X).astype(FEATURE_DTYPE, copy=False), y)
+    rf.set_params(n_jobs=N_JOBS)  # saved artifact predicts with the serving setting, not the training one
+    return rf
+
+class SpilledChunkIter(xgboost.DataIter):
+    """Feeds the spilled train chunks to QuantileDMatrix one at a time."""
+
+    def __init__(self, train_files, scaler):
+        self._files = train_files
+        self._scaler = scaler
+        self._pos = 0
+        super().__init__()
+
+    def next(self, input_data):
+        if self._pos == len(self._files):
+            return False
+        x_path, y_path = self._files[self._pos]
+        X = self._scaler.transform(np.load(x_path, mmap_mode="r")).astype(FEATURE_DTYPE, copy=False)
+        input_data(data=X, label=np.load(y_path))
+        self._pos += 1
+        return True
+
+    def reset(self):
+        self._pos = 0
+
+def fit_xgb(train_files, scaler, params, n_jobs=N_JOBS):
+    """
+    Stage 4: XGBoost on a QuantileDMatrix (histogram bins only, no dense copy of the
+    train set). The booster is wrapped back into an XGBRegressor so the saved artifact
+    is the same type the backend loads today.
+    """
+    params = dict(params)
+    n_estimators = params.pop("n_estimators", 100)
+    booster_params = {"objective": "reg:squarederror", "tree_method": "hist", "seed": RANDOM_STATE,
+                      "nthread": n_jobs, "verbosity": 0, **params}
+    dtrain = xgboost.QuantileDMatrix(SpilledChunkIter(train_files, scaler), max_bin=XGB_MAX_BIN, nthread=n_jobs)
+    booster = xgboost.train(booster_params, dtrain, num_boost_round=n_estimators)
+    del dtrain
+
+    xgb = XGBRegressor(n_estimators=n_estimators, random_state=RANDOM_STATE, verbosity=0,
+                       n_jobs=N_JOBS, max_bin=XGB_MAX_BIN, **params)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "xgb.json")
+        booster.save_model(path)
+        xgb.load_model(path)
+    return xgb
+
+# ---------- hyperparameter search (process pool) ----------
+def grid_candidates(grid):
+    """Expand {"model": {"param": [values]}} into [(model, {param: value}), ...]."""
+    out = []
+    for key, space in grid.items():
+        names = list(space)
+        values = [v if isinstance(v, (list, tuple)) else [v] for v in space.values()]
+        for combo in itertools.product(*values):
+            out.append((key, dict(zip(names, combo))))
+    return out
+
+_THREAD_ENV_VARS = ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS")
+
+def _init_search_worker(threads):
+    # each worker owns `threads` cores: cap BLAS/OpenMP pools so e.g. 8 workers on 8 cores
+    # do not each start 8 threads (n_jobs / nthread are capped per candidate in fit_candidate)
+    for var in _THREAD_ENV_VARS:
+        os.environ[var] = str(threads)
+    try:
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(limits=threads)
+    except ImportError:
+        pass
+
+def fit_candidate(task):
+    """Pool worker: fit one candidate, score it on the validation split, dump it to the spill dir."""
+    key, params, threads, data = task["model"], task["params"], task["threads"], task["data"]
+    scaler = data["scaler"]
+    t0 = time.perf_counter()
+    if key == "linear":
+        model = fit_linear(data["train_files"], scaler, data["n_features"])
+    elif key == "rf":
+        model = fit_rf(np.load(data["rf_X"], mmap_mode="r"), np.load(data["rf_y"]), scaler, params, n_jobs=threads)
+    elif key == "xgb":
+        model = fit_xgb(data["train_files"], scaler, params, n_jobs=threads)
+    else:
+        raise ValueError(f"Unknown model key {key!r}")
+    fit_s = time.perf_counter() - t0
+
+    val = StreamingMetrics()
+    predict_s = 0.0
+    for X_val, y_val in iter_scaled_chunks(data["val_files"], scaler):
+        t0 = time.perf_counter()
+        preds = model.predict(X_val)
+        predict_s += time.perf_counter() - t0
+        val.update(y_val, preds)
+
+    path = os.path.join(data["spill_dir"], f"candidate_{task['id']:03d}.joblib")
+    joblib.dump(model, path, compress=0, protocol=pickle.HIGHEST_PROTOCOL)
+    return {"id": task["id"], "model": key, "params": params, "fit_seconds": round(fit_s, 3),
+            "val_predict_seconds": round(predict_s, 3), "val": val.summary(),
+            "artifact": path, "worker_pid": os.getpid(), "worker_peak_rss_mb": peak_rss_mb()}
+
+def run_search(spill_dir, scaler, train_files, reservoir, val_files, n_features, workers, threads):
+    """
+    Fit every SEARCH_GRID candidate in a pool of `workers` processes with `threads` threads
+    each. Workers read the spilled chunks / reservoir / validation chunks from disk (mmap),
+    so nothing large is pickled to them. Returns ({model: best estimator}, leaderboard rows).
+    """
+    if not val_files:
+        raise RuntimeError("No validation rows: VAL_SIZE is 0 or the data set is too small")
+    rf_X, rf_y = reservoir.sample()
+    data = {"spill_dir": spill_dir, "scaler": scaler, "train_files": train_files, "val_files": val_files,
+            "n_features": n_features}
+    for name, arr in (("rf_X", rf_X), ("rf_y", rf_y)):
+        data[name] = os.path.join(spill_dir, f"{name}.npy")
+        np.save(data[name], arr)
+
+    # most expensive first, so the pool does not end waiting on one long RF fit
+    order = {"rf": 0, "xgb": 1, "linear": 2}
+    candidates = sorted(grid_candidates(SEARCH_GRID), key=lambda c: order.get(c[0], 3))
+    tasks = [{"id": i, "model": key, "params": params, "threads": threads, "data": data}
+             for i, (key, params) in enumerate(candidates)]
+    print(f"Searching {len(tasks)} candidates with {workers} workers x {threads} threads")
+
+    # spawned workers inherit the environment at start-up, before numpy/xgboost load their thread pools
+    saved_env = {var: os.environ.get(var) for var in _THREAD_ENV_VARS}
+    for var in _THREAD_ENV_VARS:
+        os.environ[var] = str(threads)
+    rows = []
+    try:
+        ctx = multiprocessing.get_context("spawn")  # same behaviour on Linux and Windows
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx,
+                                 initializer=_init_search_worker, initargs=(threads,)) as pool:
+            futures = [pool.submit(fit_candidate, t) for t in tasks]
+            for fut in as_completed(futures):
+                r = fut.result()
+                rows.append(r)
+                print(f"  [{len(rows)}/{len(tasks)}] {r['model']:<7}{json.dumps(r['params']):<60}"
+                      f"fit={r['fit_seconds']:.1f}s val RMSE={r['val']['RMSE']:.4f}")
+    finally:
+        for var, value in saved_env.items():
+            if value is None:
+                os.environ.pop(var, None)
+            else:
+                os.environ[var] = value
+
+    rows.sort(key=lambda r: (order.get(r["model"], 3), r["val"]["RMSE"]))
+    best = {}
+    for r in rows:
+        r["selected"] = r["model"] not in best
+        if r["selected"]:
+            best[r["model"]] = joblib.load(r["artifact"])
+    for r in rows:
+        del r["artifact"]
+    return best, rows
+
+# ---------- save models & scaler ----------
+def save_artifact(obj, filename):
+    # uncompressed + highest pickle protocol: arrays are written as aligned raw buffers,
+    # which is what joblib.load(..., mmap_mode="r") needs to memory-map them
+    path = os.path.join(OUTPUT_MODEL_DIR, filename)
+    joblib.dump(obj, path, compress=ARTIFACT_COMPRESS, protocol=pickle.HIGHEST_PROTOCOL)
+    return path
+
+# ---------- plots ----------
+def plot_pred_vs_actual(y_true, y_pred, title, fpath):
+    plt.figure(figsize=(6,5))
+    plt.scatter(y_true, y_pred, s=12, alpha=0.4)
+    mn = min(y_true.min(), y_pred.min())
+    mx = max(y_true.max(), y_pred.max())
+    plt.plot([mn, mx], [mn, mx], "k--", linewidth=1)
+    plt.xlabel("Actual")
+    plt.ylabel("Predicted")
+    plt.title(title)
+    plt.tight_layout()
+    plt.savefig(fpath, dpi=150)
+    plt.close()
+
+def plot_residuals(y_true, y_pred, title, fpath):
+    res = y_true - y_pred
+    plt.figure(figsize=(6,4))
+    plt.scatter(y_pred, res, s=10, alpha=0.4)
+    plt.axhline(0, color="k", linestyle="--", linewidth=1)
+    plt.xlabel("Predicted")
+    plt.ylabel("Residual (Actual - Predicted)")
+    plt.title(title)
+    plt.tight_layout()
+    plt.savefig(fpath, dpi=150)
+    plt.close()
+
+def save_feature_importances(model, name, feat_names, outpath, topk=20):
+    if hasattr(model, "feature_importances_"):
+        imp = model.feature_importances_
+    else:
+        print("Model", name, "has no feature_importances_")
+        return
+    idx = np.argsort(imp)[::-1][:topk]
+    labels = [feat_names[i] for i in idx]
+    vals = imp[idx]
+    plt.figure(figsize=(6,6))
+    plt.barh(range(len(vals))[::-1], vals, align="center")
+    plt.yticks(range(len(vals))[::-1], labels)
+    plt.xlabel("Importance")
+    plt.title(f"Top {len(vals)} Feature Importances ({name})")
+    plt.tight_layout()
+    plt.savefig(outpath, dpi=150)
+    plt.close()
+
+# ---------- pipeline ----------
+def parse_args():
+    ap = argparse.ArgumentParser(description="Train linear / RF / XGBoost models on noisy targets.")
+    ap.add_argument("--mode", choices=["single", "search"], default=TRAIN_MODE)
+    ap.add_argument("--workers", type=int, default=SEARCH_WORKERS,
+                    help="search mode: pool processes (0 = cpu_count // threads-per-worker)")
+    ap.add_argument("--threads-per-worker", type=int, default=SEARCH_THREADS_PER_WORKER,
+                    help="search mode: n_jobs / nthread / BLAS threads inside each worker")
+    return ap.parse_args()
+
+def main():
+    args = parse_args()
+    search = args.mode == "search"
+    feature_order = load_feature_order(FEATURE_ORDER_PATH)
+    print("Loaded feature_order len:", len(feature_order))
+
+    spill_dir = os.path.join(REPORT_DIR, "_chunks")
+    shutil.rmtree(spill_dir, ignore_errors=True)
+    os.makedirs(spill_dir)
+    leaderboard = None
+    try:
+        with stage("scan + scaler.partial_fit"):
+            scaler, files, reservoir, before, after = scan(
+                feature_order, spill_dir, val_size=VAL_SIZE if search else 0.0)
+            train_files = files["train"]
+            print("Target summary BEFORE noise:", before.summary())
+            print("Zeros in target BEFORE noise:", before.zeros)
+            print("Target summary AFTER noise:", after.summary())
+            print("Zeros in target AFTER noise:", after.zeros)
+            val_rows, test_rows = spilled_rows(files["val"]), spilled_rows(files["test"])
+            print(f"Train/Val/Test rows: {reservoir.seen} / {val_rows} / {test_rows} in {len(train_files)} chunks")
+            if reservoir.seen > reservoir.size:
+                print(f"RandomForest trains on a {reservoir.size}-row sample of {reservoir.seen} train rows (RF_MAX_TRAIN_ROWS)")
+            # raw (unscaled) feature distributions the backend compares live requests against
+            reference_profile = build_reference_profile(reservoir.sample()[0], feature_order)
+
+        if search:
+            threads = max(1, args.threads_per_worker)
+            workers = args.workers or max(1, (os.cpu_count() or 1) // threads)
+            with stage("hyperparameter search"):
+                t0 = time.perf_counter()
+                best, rows = run_search(spill_dir, scaler, train_files, reservoir, files["val"],
+                                        len(feature_order), workers, threads)
+                leaderboard = {"workers": workers, "threads_per_worker": threads,
+                               "wall_seconds": round(time.perf_counter() - t0, 3),
+                               "cpu_seconds_fit": round(sum(r["fit_seconds"] for r in rows), 3),
+                               "val_rows": val_rows, "candidates": rows}
+            del reservoir
+            lr, rf, xgb = best["linear"], best["rf"], best["xgb"]
+        else:
+            with stage("train linear"):
+                lr = fit_linear(train_files, scaler, len(feature_order))
+            with stage("train rf"):
+                rf = fit_rf(*reservoir.sample(), scaler, MODEL_PARAMS["rf"])
+                del reservoir
+            with stage("train xgb"):
+                xgb = fit_xgb(train_files, scaler, MODEL_PARAMS["xgb"])
+
+        models = [("linear", lr), ("rf", rf), ("xgb", xgb)]
+
+        # ---------- evaluate (each test chunk predicted once; metrics over every row,
+        # plots / residuals / prediction profile from a fixed-size sample) ----------
+        with stage("predict + evaluate"):
+            X_check = np.load(files["test"][0][0])[:1000]  # raw rows for the compiled-export check
+            streams = {name: StreamingMetrics() for name, _ in models}
+            test_sample = Reservoir(EVAL_SAMPLE_ROWS, len(models), np.random.default_rng(RANDOM_STATE + 2),
+                                    dtype=np.float64)
+            for X, y in iter_scaled_chunks(files["test"], scaler):
+                preds = np.column_stack([model.predict(X) for _, model in models])
+                for j, (name, _) in enumerate(models):
+                    streams[name].update(y, preds[:, j])
+                test_sample.add(preds, y)
+            sample_preds, sample_y = test_sample.sample()
+            results = {}
+            for j, (name, _) in enumerate(models):
+                metrics = streams[name].summary()
+                results[name] = metrics
+                print(f"\n{name} metrics:", metrics)
+                reference_profile["predictions"][name] = column_profile(sample_preds[:, j])
+            if test_sample.seen > test_sample.size:
+                print(f"Plots and prediction profile use a {test_sample.size}-row sample of {test_sample.seen} test rows (EVAL_SAMPLE_ROWS)")
+    finally:
+        shutil.rmtree(spill_dir, ignore_errors=True)
+
+    with stage("save artifacts"):
+        model_paths = {name: save_artifact(model, MODEL_REGISTRY[name]["file"]) for name, model in models}
+        scaler_path = save_artifact(scaler, "scaler.pkl")
+        print("Saved models and scaler to:", OUTPUT_MODEL_DIR)
+
+        profile_path = os.path.join(OUTPUT_MODEL_DIR, REFERENCE_PROFILE_FILE)
+        with open(profile_path, "w") as fh:
+            json.dump(reference_profile, fh)
+        print(f"Saved drift reference profile ({reference_profile['rows']} train rows) to", profile_path)
+
+        # ---------- export compiled (flat NumPy) models for INFERENCE_BACKEND=compiled ----------
+        compiled_dir = os.path.join(OUTPUT_MODEL_DIR, "compiled")
+        for name, model in models:
+            engine = compile_model(model, scaler)
+            expected = model.predict(scaler.transform(X_check).astype(FEATURE_DTYPE, copy=False))
+            diff = float(np.max(np.abs(engine.predict(X_check) - expected))) if len(X_check) else 0.0
+            save_compiled(engine, os.path.join(compiled_dir, name))
+            print(f"Exported compiled {name} (max abs diff vs library on {len(X_check)} test rows: {diff:.3g})")
+
+        # ---------- publish versions (manifest.json, see Backend/services/model_registry.py) ----------
+        if PUBLISH_VERSIONS:
+            for name, _ in models:
+                version = publish_version(
+                    OUTPUT_MODEL_DIR, name, model_paths[name], name=MODEL_REGISTRY[name]["name"],
+                    scaler_file=scaler_path, compiled_dir=os.path.join(compiled_dir, name),
+                    feature_order=feature_order, metrics=results[name], keep_versions=KEEP_VERSIONS,
+                )
+                print(f"Published {name} version {version}")
+
+        # ---------- save metrics json ----------
+        metrics_path = os.path.join(REPORT_DIR, "model_metrics.json")
+        with open(metrics_path, "w") as fh:
+            json.dump(results, fh, indent=2)
+        print("Saved metrics to", metrics_path)
+
+        if leaderboard is not None:
+            for r in leaderboard["candidates"]:
+                if r["selected"]:
+                    r["test"] = results[r["model"]]
+            leaderboard_path = os.path.join(REPORT_DIR, "leaderboard.json")
+            with open(leaderboard_path, "w") as fh:
+                json.dump(leaderboard, fh, indent=2)
+            print("Saved leaderboard to", leaderboard_path)
+
+    with stage("plots"):
+        # scatter plots of millions of points are slow and unreadable; draw from the test sample
+        idx = np.arange(len(sample_y))
+        if len(idx) > PLOT_MAX_POINTS:
+            idx = np.sort(np.random.default_rng(RANDOM_STATE).choice(len(idx), PLOT_MAX_POINTS, replace=False))
+        y_plot = sample_y[idx]
+        plot_preds = {name: sample_preds[idx, j] for j, (name, _) in enumerate(models)}
+        plot_pred_vs_actual(y_plot, plot_preds["linear"], "LinearPred vs Actual", os.path.join(REPORT_DIR, "pred_vs_actual_linear.png"))
+        plot_pred_vs_actual(y_plot, plot_preds["rf"], "RFPred vs Actual", os.path.join(REPORT_DIR, "pred_vs_actual_rf.png"))
+        plot_pred_vs_actual(y_plot, plot_preds["xgb"], "XGBPred vs Actual", os.path.join(REPORT_DIR, "pred_vs_actual_xgb.png"))
+
+        plot_residuals(y_plot, plot_preds["rf"], "RF Residuals", os.path.join(REPORT_DIR, "residuals_rf.png"))
+        plot_residuals(y_plot, plot_preds["xgb"], "XGB Residuals", os.path.join(REPORT_DIR, "residuals_xgb.png"))
+
+        save_feature_importances(rf, "RandomForest", feature_order, os.path.join(REPORT_DIR, "rf_feature_importances.png"))
+        save_feature_importances(xgb, "XGBoost", feature_order, os.path.join(REPORT_DIR, "xgb_feature_importances.png"))
+        print("Saved plots to", REPORT_DIR)
+
+    profile_path = os.path.join(REPORT_DIR, "training_profile.json")
+    with open(profile_path, "w") as fh:
+        json.dump({"chunk_rows": CHUNK_ROWS, "stages": STAGE_REPORT}, fh, indent=2)
+    print("\nStage profile (saved to", profile_path + "):")
+    for s in STAGE_REPORT:
+        print(f"  {s['stage']:<28}{s['seconds']:>9.2f}s  rss={_fmt_mb(s['rss_mb']):>8}  peak={_fmt_mb(s['peak_rss_mb']):>8}")
+    print("Done.")
+
+
+if __name__ == "__main__":
+    main()